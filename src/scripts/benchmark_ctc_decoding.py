@@ -0,0 +1,92 @@
+"""Benchmark the beam search decoding of the speech recognition model.
+
+The corpus directory should contain audio files of utterances, each with a reference
+transcription in a text file with the same name, e.g., `001.wav` and `001.txt`. This
+reports the word error rate of the greedy decoding of the speech recognition pipeline,
+and the decoding latency and word error rate of the beam search for several beam widths,
+using the language model and hotwords in the `asr_decoder` configuration. The model is
+only run once per utterance, so the latencies are of the decoding alone.
+
+Usage:
+    python src/scripts/benchmark_ctc_decoding.py [+corpus_dir=<path>]
+        [asr_decoder.kenlm_path=<path>] [asr_decoder.unigrams_path=<path>]
+"""
+
+import logging
+from pathlib import Path
+from time import perf_counter
+
+import hydra
+import numpy as np
+import torch
+from omegaconf import DictConfig
+from transformers.pipelines import pipeline
+
+from voicebot.ctc_decoding import BeamSearchTranscriber
+from voicebot.evaluation import AUDIO_SUFFIXES, load_audio, word_error_rate
+
+logger = logging.getLogger("benchmark_ctc_decoding")
+
+
+BEAM_WIDTHS = [1, 5, 10, 25, 50, 100]
+
+
+@hydra.main(config_path="../../config", config_name="config", version_base=None)
+def main(cfg: DictConfig) -> None:
+    """Benchmark the greedy and beam search decoding.
+
+    Args:
+        cfg: Hydra configuration object.
+    """
+    corpus_dir = Path(cfg.get("corpus_dir", "data/asr"))
+    paths = [
+        path
+        for path in sorted(corpus_dir.iterdir())
+        if path.suffix.lower() in AUDIO_SUFFIXES and path.with_suffix(".txt").exists()
+    ]
+    if not paths:
+        logger.error(f"No utterances with transcriptions found in {corpus_dir}.")
+        return
+    speeches = [load_audio(path=path) for path in paths]
+    references = [path.with_suffix(".txt").read_text().strip() for path in paths]
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    transcriber = pipeline(
+        model=cfg.asr_model_id, device=device, task="automatic-speech-recognition"
+    )
+    beam_search_transcriber = BeamSearchTranscriber(transcriber=transcriber, cfg=cfg)
+
+    greedy_hypotheses: list[str] = list()
+    for speech in speeches:
+        transcription_dict = transcriber(inputs=speech)
+        assert isinstance(transcription_dict, dict)
+        greedy_hypotheses.append(transcription_dict["text"])
+    logger.info(
+        "Greedy decoding: WER "
+        f"{word_error_rate(references=references, hypotheses=greedy_hypotheses):.1%}"
+    )
+
+    all_log_probabilities = [
+        beam_search_transcriber.log_probabilities(speech=speech) for speech in speeches
+    ]
+    for beam_width in BEAM_WIDTHS:
+        latencies: list[float] = list()
+        hypotheses: list[str] = list()
+        for log_probabilities in all_log_probabilities:
+            start = perf_counter()
+            hypotheses.append(
+                beam_search_transcriber.decode(
+                    log_probabilities=log_probabilities, beam_width=beam_width
+                )
+            )
+            latencies.append(perf_counter() - start)
+        logger.info(
+            f"Beam width {beam_width}: mean decoding latency "
+            f"{np.mean(latencies):.3f} seconds, p95 decoding latency "
+            f"{np.percentile(latencies, q=95):.3f} seconds, WER "
+            f"{word_error_rate(references=references, hypotheses=hypotheses):.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
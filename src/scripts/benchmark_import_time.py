@@ -0,0 +1,126 @@
+"""Benchmark the time it takes to import the entry points of the package.
+
+Every module is imported in a fresh interpreter with `python -X importtime`, and the
+cumulative import time is reported along with the slowest imports it pulled in. With
+`--max-seconds`, the script fails if any module takes longer than that to import, which
+guards against heavy dependencies creeping back into the lightweight entry points.
+
+Usage:
+    python src/scripts/benchmark_import_time.py [--module <module>]
+        [--max-seconds <float>] [--num-slowest <int>]
+"""
+
+import re
+import subprocess
+import sys
+
+import click
+
+# The entry points which should be fast to import, as they do not need any models
+DEFAULT_MODULES = [
+    "voicebot",
+    "voicebot.tools",
+    "voicebot.tools.timer",
+    "voicebot.tools.weather",
+    "voicebot.tools.web_search",
+    "voicebot.text_engine",
+]
+
+IMPORT_TIME_PATTERN = re.compile(
+    r"^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \| (?P<name>.+)$"
+)
+
+
+@click.command()
+@click.option(
+    "--module",
+    "modules",
+    multiple=True,
+    default=DEFAULT_MODULES,
+    show_default=True,
+    help="A module to benchmark. Can be given several times.",
+)
+@click.option(
+    "--max-seconds",
+    type=float,
+    default=None,
+    help="If set, fail if any module takes longer than this to import.",
+)
+@click.option(
+    "--num-slowest",
+    type=int,
+    default=5,
+    show_default=True,
+    help="The number of slowest imports to report for every module.",
+)
+def benchmark_import_time(
+    modules: tuple[str, ...], max_seconds: float | None, num_slowest: int
+) -> None:
+    """Benchmark the import time of the modules.
+
+    Args:
+        modules:
+            The modules to benchmark.
+        max_seconds:
+            If set, fail if any module takes longer than this to import.
+        num_slowest:
+            The number of slowest imports to report for every module.
+    """
+    too_slow: list[str] = list()
+    for module in modules:
+        import_times = measure_import_times(module=module)
+        total_seconds = import_times.get(module, 0.0)
+        top_level_imports = {
+            name: seconds
+            for name, seconds in import_times.items()
+            if "." not in name and name != module
+        }
+        slowest = sorted(top_level_imports.items(), key=lambda item: -item[1])
+        click.echo(f"{module}: {total_seconds:.3f} seconds")
+        for name, seconds in slowest[:num_slowest]:
+            click.echo(f"  {name}: {seconds:.3f} seconds")
+        if max_seconds is not None and total_seconds > max_seconds:
+            too_slow.append(module)
+
+    if too_slow:
+        raise click.ClickException(
+            f"The following modules took more than {max_seconds} seconds to import: "
+            f"{', '.join(too_slow)}"
+        )
+
+
+def measure_import_times(module: str) -> dict[str, float]:
+    """Measure the cumulative import times of a module and everything it imports.
+
+    Args:
+        module:
+            The module to import.
+
+    Returns:
+        A mapping from every imported module to its cumulative import time in seconds.
+
+    Raises:
+        click.ClickException:
+            If the module could not be imported.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode != 0:
+        raise click.ClickException(
+            f"Could not import {module!r}:\n{process.stderr.strip()}"
+        )
+    import_times: dict[str, float] = dict()
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match is None:
+            continue
+        name = match.group("name").strip()
+        import_times[name] = int(match.group("cumulative")) / 1e6
+    return import_times
+
+
+if __name__ == "__main__":
+    benchmark_import_time()
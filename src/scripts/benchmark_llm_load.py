@@ -0,0 +1,521 @@
+"""Load test the LLM server with many concurrent conversations.
+
+This simulates a number of bots, each running a text engine in its own thread, which
+hold conversations of a few turns with pauses in between, as the users would. The tools
+are replaced by stubs with a fixed latency, so only the LLM requests are tested. By
+default the requests are sent to a local stand-in for the Responses API, which answers
+with a tool call with some probability and otherwise with a message, after a prefill
+time proportional to the number of input tokens and at a fixed rate of output tokens,
+running at most `server_slots` requests at a time. With `+mock_server=false` the
+requests are instead sent to the server in the configuration.
+
+This reports the throughput, the 50th, 95th and 99th percentile latencies of the turns
+and of the individual requests, and the mean number of tokens and requests per turn.
+
+Usage:
+    python src/scripts/benchmark_llm_load.py [+num_bots=<int>] [+num_turns=<int>]
+        [+turns_per_conversation=<int>] [+think_seconds=<float>]
+        [+tool_call_probability=<float>] [+time_to_first_token_seconds=<float>]
+        [+prefill_tokens_per_second=<float>] [+output_tokens_per_second=<float>]
+        [+num_output_tokens=<int>] [+server_slots=<int>]
+        [+tool_latency_seconds=<float>] [+client_timeout_seconds=<float>]
+        [+mock_server=<bool>]
+"""
+
+import datetime as dt
+import json
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, sleep, time
+from uuid import uuid4
+
+import hydra
+import numpy as np
+import openai
+from omegaconf import DictConfig, OmegaConf
+from openai.types.responses import Response, ResponseInputItemParam
+
+from voicebot.text_engine import TextEngine
+
+logger = logging.getLogger("benchmark_llm_load")
+
+
+PROMPTS = [
+    "Hvordan bliver vejret i morgen?",
+    "Kan du sætte en timer på ti minutter til pastaen?",
+    "Hvad er de seneste nyheder?",
+    "Hvor lang tid er der tilbage af timeren?",
+    "Hvem vandt fodboldkampen i går?",
+    "Fortæl mig en sjov historie om en kat.",
+]
+STUB_TOOL_OUTPUTS = dict(
+    get_weather=(
+        "Vejrudsigten for København:\n"
+        "I dag: Overskyet, 12 til 15 grader, 2 mm nedbør, vind 6 m/s\n"
+        "I nat: Let regn, 9 til 11 grader, 4 mm nedbør, vind 5 m/s\n"
+        "I morgen: Delvist skyet, 11 til 16 grader, ingen nedbør, vind 4 m/s"
+    ),
+    get_news=(
+        "Nyheder: Regeringen fremlægger nyt finanslovsforslag. Vejret bliver mildt."
+    ),
+    set_timer="Timeren er sat til 10 minutter.",
+    list_timers="Der er 7 minutter og 12 sekunder tilbage af timeren.",
+    stop_timer="Timeren er stoppet.",
+    search_web="Søgeresultat: Kampen endte 2-1 til FC København.",
+    meow="Miav!",
+)
+RESPONSE_WORDS = "det bliver en dejlig dag med sol og lidt skyer i hele landet".split()
+
+# A rough estimate of the number of characters per token, used by the mock server
+CHARACTERS_PER_TOKEN = 4
+
+
+@hydra.main(config_path="../../config", config_name="config", version_base=None)
+def main(cfg: DictConfig) -> None:
+    """Run the load test.
+
+    Args:
+        cfg: Hydra configuration object.
+    """
+    num_bots = int(cfg.get("num_bots", 8))
+    num_turns = int(cfg.get("num_turns", 10))
+    turns_per_conversation = int(cfg.get("turns_per_conversation", 3))
+    think_seconds = float(cfg.get("think_seconds", 2.0))
+    tool_latency_seconds = float(cfg.get("tool_latency_seconds", 0.1))
+    client_timeout_seconds = float(cfg.get("client_timeout_seconds", 30.0))
+
+    logging.getLogger("voicebot").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    server: ThreadingHTTPServer | None = None
+    if cfg.get("mock_server", True):
+        server = start_mock_server(
+            tool_call_probability=float(cfg.get("tool_call_probability", 0.5)),
+            time_to_first_token_seconds=float(
+                cfg.get("time_to_first_token_seconds", 0.2)
+            ),
+            prefill_tokens_per_second=float(cfg.get("prefill_tokens_per_second", 2000)),
+            output_tokens_per_second=float(cfg.get("output_tokens_per_second", 30)),
+            num_output_tokens=int(cfg.get("num_output_tokens", 40)),
+            server_slots=int(cfg.get("server_slots", 4)),
+        )
+        host, port = server.server_address[:2]
+        cfg = OmegaConf.merge(cfg, dict(server=f"http://{host}:{port}/v1"))
+    cfg = OmegaConf.merge(cfg, dict(response_cache=dict(enabled=False)))
+    logger.info(
+        f"Simulating {num_bots} bots with {num_turns} turns each against "
+        f"{cfg.server}..."
+    )
+
+    text_engines = [
+        LoadTestTextEngine(
+            cfg=cfg,
+            tool_latency_seconds=tool_latency_seconds,
+            client_timeout_seconds=client_timeout_seconds,
+        )
+        for _ in range(num_bots)
+    ]
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=num_bots) as executor:
+        results = list(
+            executor.map(
+                lambda bot: run_bot(
+                    text_engine=text_engines[bot],
+                    num_turns=num_turns,
+                    turns_per_conversation=turns_per_conversation,
+                    think_seconds=think_seconds,
+                    seed=bot,
+                ),
+                range(num_bots),
+            )
+        )
+    duration = perf_counter() - start
+    if server is not None:
+        server.shutdown()
+
+    turn_latencies = [latency for latencies, _ in results for latency in latencies]
+    num_failed_turns = sum(num_failed for _, num_failed in results)
+    request_latencies = [
+        latency
+        for text_engine in text_engines
+        for latency in text_engine.request_latencies
+    ]
+    num_input_tokens = sum(text_engine.num_input_tokens for text_engine in text_engines)
+    num_output_tokens = sum(
+        text_engine.num_output_tokens for text_engine in text_engines
+    )
+    num_turns_completed = max(len(turn_latencies), 1)
+    logger.info(
+        f"Completed {len(turn_latencies):,} turns and {len(request_latencies):,} "
+        f"requests in {duration:.1f} seconds, with {num_failed_turns:,} failed turns."
+    )
+    logger.info(
+        f"Throughput: {len(turn_latencies) / duration:.2f} turns per second, "
+        f"{len(request_latencies) / duration:.2f} requests per second and "
+        f"{num_output_tokens / duration:.1f} output tokens per second."
+    )
+    for name, latencies in dict(turn=turn_latencies, request=request_latencies).items():
+        if not latencies:
+            continue
+        p50, p95, p99 = np.percentile(latencies, q=[50, 95, 99])
+        logger.info(
+            f"{name.capitalize()} latency: p50 {p50:.3f} seconds, p95 {p95:.3f} "
+            f"seconds, p99 {p99:.3f} seconds"
+        )
+    logger.info(
+        f"Per turn: {num_input_tokens / num_turns_completed:,.0f} input tokens, "
+        f"{num_output_tokens / num_turns_completed:,.0f} output tokens and "
+        f"{len(request_latencies) / num_turns_completed:.2f} requests."
+    )
+
+
+class LoadTestTextEngine(TextEngine):
+    """A text engine with stubbed tools, which records its requests."""
+
+    def __init__(
+        self,
+        cfg: DictConfig,
+        tool_latency_seconds: float,
+        client_timeout_seconds: float,
+    ) -> None:
+        """Initialise the engine.
+
+        Args:
+            cfg:
+                The Hydra configuration.
+            tool_latency_seconds:
+                The time it takes to call a tool, in seconds.
+            client_timeout_seconds:
+                The timeout of the requests, in seconds.
+        """
+        super().__init__(cfg=cfg)
+        self.client = self.client.with_options(
+            timeout=client_timeout_seconds, max_retries=0
+        )
+        self.tool_latency_seconds = tool_latency_seconds
+        self.request_latencies: list[float] = list()
+        self.num_input_tokens = 0
+        self.num_output_tokens = 0
+
+    def create_response(
+        self,
+        conversation: list[ResponseInputItemParam],
+        interrupt: threading.Event | None = None,
+    ) -> Response | None:
+        """Get a response from the LLM, recording its latency and token usage.
+
+        Args:
+            conversation:
+                The conversation to respond to.
+            interrupt (optional):
+                An event which aborts the request when set. Defaults to None.
+
+        Returns:
+            The response, or None if the engine was interrupted.
+        """
+        start = perf_counter()
+        response = super().create_response(
+            conversation=conversation, interrupt=interrupt
+        )
+        self.request_latencies.append(perf_counter() - start)
+        if response is not None and response.usage is not None:
+            self.num_input_tokens += response.usage.input_tokens
+            self.num_output_tokens += response.usage.output_tokens
+        return response
+
+    def call_tool(self, name: str, arguments: dict) -> str:
+        """Call a stub of a tool.
+
+        Args:
+            name:
+                The name of the tool.
+            arguments:
+                The arguments to call the tool with, which are ignored.
+
+        Returns:
+            The canned response of the tool.
+        """
+        sleep(self.tool_latency_seconds)
+        return STUB_TOOL_OUTPUTS.get(name, f"Værktøjet {name} blev kaldt.")
+
+
+def run_bot(
+    text_engine: LoadTestTextEngine,
+    num_turns: int,
+    turns_per_conversation: int,
+    think_seconds: float,
+    seed: int,
+) -> tuple[list[float], int]:
+    """Simulate the turns of a single bot.
+
+    Args:
+        text_engine:
+            The text engine of the bot.
+        num_turns:
+            The number of turns to simulate.
+        turns_per_conversation:
+            The number of turns in a conversation, after which a new one is started.
+        think_seconds:
+            The mean pause between the turns, in seconds.
+        seed:
+            The seed of the random prompts and pauses.
+
+    Returns:
+        The latencies of the successful turns, in seconds, and the number of failed
+        turns.
+    """
+    rng = random.Random(seed)
+    latencies: list[float] = list()
+    num_failed_turns = 0
+    for turn in range(num_turns):
+        # The pauses are spread out, so that the bots do not send their requests in
+        # lockstep
+        sleep(rng.uniform(0, 2 * think_seconds))
+
+        now = dt.datetime.now()
+        if turn % turns_per_conversation == 0:
+            last_response_time = dt.datetime(year=1900, month=1, day=1)
+        else:
+            last_response_time = now
+        start = perf_counter()
+        try:
+            text_engine.generate_response(
+                prompt=rng.choice(PROMPTS),
+                last_response_time=last_response_time,
+                current_response_time=now,
+            )
+            latencies.append(perf_counter() - start)
+        except openai.OpenAIError as e:
+            logger.warning(f"The turn failed: {e}")
+            num_failed_turns += 1
+    return latencies, num_failed_turns
+
+
+def start_mock_server(
+    tool_call_probability: float,
+    time_to_first_token_seconds: float,
+    prefill_tokens_per_second: float,
+    output_tokens_per_second: float,
+    num_output_tokens: int,
+    server_slots: int,
+) -> ThreadingHTTPServer:
+    """Start a local stand-in for the Responses API in a background thread.
+
+    Args:
+        tool_call_probability:
+            The probability of answering a user message with a tool call.
+        time_to_first_token_seconds:
+            The fixed latency of every request, in seconds.
+        prefill_tokens_per_second:
+            The rate at which the input tokens are processed.
+        output_tokens_per_second:
+            The rate at which the output tokens are generated, per request.
+        num_output_tokens:
+            The number of tokens in the messages.
+        server_slots:
+            The number of requests processed at a time, after which the requests are
+            queued.
+
+    Returns:
+        The running server.
+    """
+    slots = threading.BoundedSemaphore(value=server_slots)
+    rng = random.Random(4242)
+    rng_lock = threading.Lock()
+
+    class MockResponsesHandler(BaseHTTPRequestHandler):
+        """Handles requests to the Responses API."""
+
+        def do_POST(self) -> None:
+            """Respond to a request, streaming the response if requested."""
+            if not self.path.rstrip("/").endswith("/responses"):
+                self.send_error(404)
+                return
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with rng_lock:
+                output = build_output(
+                    request=request,
+                    use_tool=rng.random() < tool_call_probability,
+                    num_output_tokens=num_output_tokens,
+                    rng=rng,
+                )
+            num_input_tokens = len(json.dumps(request)) // CHARACTERS_PER_TOKEN
+
+            # The text of every output item, split into the streamed tokens
+            output_tokens: list[list[str]] = list()
+            for item in output:
+                text = (
+                    item["content"][0]["text"]
+                    if item["type"] == "message"
+                    else item["arguments"]
+                )
+                output_tokens.append(
+                    [
+                        text[index : index + CHARACTERS_PER_TOKEN]
+                        for index in range(0, len(text), CHARACTERS_PER_TOKEN)
+                    ]
+                )
+            num_tokens = sum(len(tokens) for tokens in output_tokens)
+            response = dict(
+                id=f"resp_{uuid4().hex}",
+                object="response",
+                created_at=time(),
+                model=request.get("model", "mock"),
+                status="completed",
+                output=output,
+                parallel_tool_calls=True,
+                tool_choice="auto",
+                tools=request.get("tools", list()),
+                temperature=request.get("temperature"),
+                usage=dict(
+                    input_tokens=num_input_tokens,
+                    input_tokens_details=dict(cached_tokens=0),
+                    output_tokens=num_tokens,
+                    output_tokens_details=dict(reasoning_tokens=0),
+                    total_tokens=num_input_tokens + num_tokens,
+                ),
+            )
+
+            with slots:
+                sleep(
+                    time_to_first_token_seconds
+                    + num_input_tokens / prefill_tokens_per_second
+                )
+                if not request.get("stream", False):
+                    sleep(num_tokens / output_tokens_per_second)
+                    body = json.dumps(response).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                sequence_number = 0
+                for output_index, (item, tokens) in enumerate(
+                    zip(output, output_tokens)
+                ):
+                    for token in tokens:
+                        sleep(1 / output_tokens_per_second)
+                        self.send_event(
+                            event=dict(
+                                type="response.output_text.delta"
+                                if item["type"] == "message"
+                                else "response.function_call_arguments.delta",
+                                item_id=item["id"],
+                                output_index=output_index,
+                                content_index=0,
+                                delta=token,
+                                logprobs=list(),
+                                sequence_number=sequence_number,
+                            )
+                        )
+                        sequence_number += 1
+                self.send_event(
+                    event=dict(
+                        type="response.completed",
+                        response=response,
+                        sequence_number=sequence_number,
+                    )
+                )
+
+        def send_event(self, event: dict) -> None:
+            """Send a server-sent event.
+
+            Args:
+                event:
+                    The event to send.
+            """
+            self.wfile.write(
+                f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8")
+            )
+            self.wfile.flush()
+
+        def log_message(self, format: str, *args) -> None:
+            """Do not log the requests."""
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockResponsesHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-llm", daemon=True).start()
+    return server
+
+
+def build_output(
+    request: dict, use_tool: bool, num_output_tokens: int, rng: random.Random
+) -> list[dict]:
+    """Build the output of the mock server.
+
+    A user message is answered with a call to one of the tools if `use_tool` is set,
+    and the outputs of the tools are always answered with a message.
+
+    Args:
+        request:
+            The request to the server.
+        use_tool:
+            Whether to answer a user message with a tool call.
+        num_output_tokens:
+            The number of tokens in the message.
+        rng:
+            The random number generator used to pick the tool.
+
+    Returns:
+        The output items.
+    """
+    input_items = request.get("input", list())
+    last_user_index = max(
+        (index for index, item in enumerate(input_items) if item.get("role") == "user"),
+        default=-1,
+    )
+    has_tool_outputs = any(
+        item.get("type") == "function_call_output"
+        for item in input_items[last_user_index + 1 :]
+    )
+    tools = request.get("tools", list())
+    if use_tool and tools and not has_tool_outputs:
+        tool = rng.choice(tools)
+        properties = tool.get("parameters", dict()).get("properties", dict())
+        arguments = {
+            name: 600 if schema.get("type") in {"number", "integer"} else ""
+            for name, schema in properties.items()
+        }
+        return [
+            dict(
+                id=f"fc_{uuid4().hex}",
+                type="function_call",
+                call_id=f"call_{uuid4().hex}",
+                name=tool["name"],
+                arguments=json.dumps(arguments),
+                status="completed",
+            )
+        ]
+
+    # The words are repeated until the message has the requested number of tokens
+    words: list[str] = list()
+    while len(" ".join(words)) < num_output_tokens * CHARACTERS_PER_TOKEN:
+        words.append(RESPONSE_WORDS[len(words) % len(RESPONSE_WORDS)])
+    return [
+        dict(
+            id=f"msg_{uuid4().hex}",
+            type="message",
+            role="assistant",
+            status="completed",
+            content=[
+                dict(
+                    type="output_text",
+                    text=" ".join(words).capitalize() + ".",
+                    annotations=list(),
+                    logprobs=list(),
+                )
+            ],
+        )
+    ]
+
+
+if __name__ == "__main__":
+    main()
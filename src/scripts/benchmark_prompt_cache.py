@@ -0,0 +1,106 @@
+"""Benchmark the time-to-first-token with and without a prefix-cache-friendly prompt.
+
+The legacy prompt puts the current date and time inside the system prompt, so the
+prompt prefix changes every minute. The split prompt keeps the system prompt static and
+sends the date and time in a separate message afterwards.
+
+Usage:
+    python src/scripts/benchmark_prompt_cache.py [+num_benchmark_runs=<int>]
+"""
+
+import datetime as dt
+import logging
+from time import perf_counter
+
+import hydra
+import numpy as np
+from omegaconf import DictConfig
+
+from voicebot.text_engine import TextEngine
+
+logger = logging.getLogger("benchmark_prompt_cache")
+
+
+PROMPT = "Hvad er hovedstaden i Danmark?"
+
+
+@hydra.main(config_path="../../config", config_name="config", version_base=None)
+def main(cfg: DictConfig) -> None:
+    """Benchmark the time-to-first-token of the two prompt layouts.
+
+    Args:
+        cfg: Hydra configuration object.
+    """
+    num_runs = int(cfg.get("num_benchmark_runs", 10))
+    text_engine = TextEngine(cfg=cfg)
+    start = dt.datetime.now()
+
+    # The server and the connection are warmed up before any run is timed, and the
+    # layouts are interleaved, so that only the layout differs between them
+    text_engine.warm_up()
+
+    # Every run simulates a new conversation starting one minute after the previous
+    # one, which is what invalidates the prefix in the legacy layout
+    legacy_ttfts: list[float] = list()
+    split_ttfts: list[float] = list()
+    for run in range(num_runs):
+        system_messages = text_engine.build_system_messages(
+            now=start + dt.timedelta(minutes=run)
+        )
+        legacy_system_message = dict(
+            role="system",
+            content="\n\n".join(message["content"] for message in system_messages),
+        )
+        legacy_ttfts.append(
+            time_to_first_token(
+                text_engine=text_engine, system_messages=[legacy_system_message]
+            )
+        )
+        split_ttfts.append(
+            time_to_first_token(
+                text_engine=text_engine, system_messages=system_messages
+            )
+        )
+
+    for name, ttfts in [("Legacy", legacy_ttfts), ("Split", split_ttfts)]:
+        logger.info(
+            f"{name} prompt: mean TTFT {np.mean(ttfts):.3f}s, median TTFT "
+            f"{np.median(ttfts):.3f}s over {num_runs} runs"
+        )
+
+
+def time_to_first_token(text_engine: TextEngine, system_messages: list) -> float:
+    """Measure the time until the first output token is streamed back.
+
+    Args:
+        text_engine:
+            The text engine to use.
+        system_messages:
+            The system messages starting the conversation.
+
+    Returns:
+        The time-to-first-token, in seconds.
+    """
+    start = perf_counter()
+    stream = text_engine.client.responses.create(  # pyrefly: ignore
+        model=str(text_engine.cfg.text_model_id),
+        input=system_messages + [dict(role="user", content=PROMPT)],
+        temperature=float(text_engine.cfg.temperature),
+        tools=text_engine.tools,
+        stream=True,
+    )
+    ttft = float("nan")
+    for event in stream:
+        if event.type in {
+            "response.output_text.delta",
+            "response.reasoning_text.delta",
+            "response.function_call_arguments.delta",
+        }:
+            ttft = perf_counter() - start
+            break
+    stream.close()
+    return ttft
+
+
+if __name__ == "__main__":
+    main()
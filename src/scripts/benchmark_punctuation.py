@@ -0,0 +1,198 @@
+"""Benchmark the latency and quality of the punctuation strategies.
+
+The corpus directory should contain audio files of utterances, each with a punctuated
+reference transcription in a text file with the same name, e.g., `001.wav` and
+`001.txt`. For every strategy, this reports the mean and 95th percentile latency of the
+transcription, the word error rate and the F1-score of the punctuation marks. The
+latency of the asynchronous strategy is the time until the punctuated prompt is
+available to the text engine, after preparing the rest of the prompt.
+
+An ASR model which punctuates itself, such as Whisper, can be included with the
+`punctuating_asr_model_id` argument.
+
+Usage:
+    python src/scripts/benchmark_punctuation.py [+corpus_dir=<path>]
+        [+min_words=<int>] [+punctuating_asr_model_id=<model-id>]
+"""
+
+import difflib
+import logging
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from time import perf_counter
+
+import hydra
+import numpy as np
+import torch
+from omegaconf import DictConfig
+from punctfix.inference import PunctFixer
+from transformers.pipelines import Pipeline, pipeline
+
+from voicebot.evaluation import AUDIO_SUFFIXES, load_samples, word_error_rate
+from voicebot.response_cache import normalise_prompt
+from voicebot.speech_recognition import punctuate, transcribe_speech
+from voicebot.text_engine import TextEngine
+
+logger = logging.getLogger("benchmark_punctuation")
+
+
+PUNCTUATION_MARKS = ".,?!:;"
+
+
+@hydra.main(config_path="../../config", config_name="config", version_base=None)
+def main(cfg: DictConfig) -> None:
+    """Benchmark the punctuation strategies.
+
+    Args:
+        cfg: Hydra configuration object.
+    """
+    corpus_dir = Path(cfg.get("corpus_dir", "data/punctuation"))
+    min_words = int(cfg.get("min_words", 4))
+    punctuating_asr_model_id = cfg.get("punctuating_asr_model_id", None)
+
+    utterances = [
+        (load_samples(path=path), path.with_suffix(".txt").read_text().strip())
+        for path in sorted(corpus_dir.iterdir())
+        if path.suffix.lower() in AUDIO_SUFFIXES and path.with_suffix(".txt").exists()
+    ]
+    if not utterances:
+        logger.error(f"No utterances with transcriptions found in {corpus_dir}.")
+        return
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    transcriber = pipeline(
+        model=cfg.asr_model_id, device=device, task="automatic-speech-recognition"
+    )
+    punct_fixer = PunctFixer(language="da", device=device)
+    text_engine = TextEngine(cfg=cfg)
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    def transcribe(
+        speech: np.ndarray,
+        asr: Pipeline = transcriber,
+        fixer: PunctFixer | None = punct_fixer,
+        min_punctuation_words: int = 0,
+    ) -> str:
+        return transcribe_speech(
+            speech=speech,
+            transcriber=asr,
+            punct_fixer=fixer,
+            manual_fixes=cfg.manual_fixes,
+            min_punctuation_words=min_punctuation_words,
+        )
+
+    def transcribe_async(speech: np.ndarray) -> str:
+        text = transcribe(speech=speech, fixer=None)
+        future = executor.submit(
+            punctuate, text=text, punct_fixer=punct_fixer, min_words=min_words
+        )
+        text_engine.build_system_messages()
+        return future.result()
+
+    strategies: dict[str, Callable[[np.ndarray], str]] = {
+        "none": lambda speech: transcribe(speech=speech, fixer=None),
+        "sync": lambda speech: transcribe(speech=speech),
+        f"sync, min_words={min_words}": lambda speech: transcribe(
+            speech=speech, min_punctuation_words=min_words
+        ),
+        f"async, min_words={min_words}": transcribe_async,
+    }
+    if punctuating_asr_model_id is not None:
+        punctuating_transcriber = pipeline(
+            model=punctuating_asr_model_id,
+            device=device,
+            task="automatic-speech-recognition",
+        )
+        strategies[f"none, {punctuating_asr_model_id}"] = lambda speech: transcribe(
+            speech=speech, asr=punctuating_transcriber, fixer=None
+        )
+
+    for name, strategy in strategies.items():
+        # Warm up the models, so that the lazy initialisation is not measured
+        strategy(utterances[0][0])
+
+        latencies: list[float] = list()
+        hypotheses: list[str] = list()
+        for speech, _ in utterances:
+            start = perf_counter()
+            hypotheses.append(strategy(speech))
+            latencies.append(perf_counter() - start)
+        references = [reference for _, reference in utterances]
+
+        logger.info(
+            f"Strategy {name!r}: mean latency {np.mean(latencies):.3f} seconds, p95 "
+            f"latency {np.percentile(latencies, q=95):.3f} seconds, WER "
+            f"{word_error_rate(references=references, hypotheses=hypotheses):.1%}, "
+            "punctuation F1 "
+            f"{punctuation_f1(references=references, hypotheses=hypotheses):.1%}"
+        )
+
+
+def punctuation_f1(references: list[str], hypotheses: list[str]) -> float:
+    """Compute the F1-score of the punctuation marks following each word.
+
+    The words of the hypothesis are aligned with the words of the reference, and a
+    punctuation mark is a true positive if the aligned reference word is followed by the
+    same mark.
+
+    Args:
+        references:
+            The reference transcriptions.
+        hypotheses:
+            The predicted transcriptions.
+
+    Returns:
+        The F1-score.
+    """
+    true_positives = false_positives = false_negatives = 0
+    for reference, hypothesis in zip(references, hypotheses):
+        reference_words, reference_marks = split_punctuation(text=reference)
+        hypothesis_words, hypothesis_marks = split_punctuation(text=hypothesis)
+        aligned_marks = {
+            block.a + offset: hypothesis_marks[block.b + offset]
+            for block in difflib.SequenceMatcher(
+                a=reference_words, b=hypothesis_words, autojunk=False
+            ).get_matching_blocks()
+            for offset in range(block.size)
+        }
+        for index, reference_mark in enumerate(reference_marks):
+            hypothesis_mark = aligned_marks.get(index, "")
+            if reference_mark and reference_mark == hypothesis_mark:
+                true_positives += 1
+                continue
+            false_negatives += bool(reference_mark)
+            false_positives += bool(hypothesis_mark)
+        num_aligned_marks = sum(bool(mark) for mark in aligned_marks.values())
+        false_positives += sum(bool(mark) for mark in hypothesis_marks)
+        false_positives -= num_aligned_marks
+    precision = true_positives / max(true_positives + false_positives, 1)
+    recall = true_positives / max(true_positives + false_negatives, 1)
+    return 2 * precision * recall / max(precision + recall, 1e-9)
+
+
+def split_punctuation(text: str) -> tuple[list[str], list[str]]:
+    """Split a text into its normalised words and the punctuation mark after each word.
+
+    Args:
+        text:
+            The text.
+
+    Returns:
+        The normalised words and the punctuation marks, where a word without a
+        punctuation mark has an empty string as its mark.
+    """
+    words: list[str] = list()
+    marks: list[str] = list()
+    for token in text.split():
+        word = normalise_prompt(prompt=token)
+        if not word:
+            continue
+        words.append(word)
+        stripped = token.rstrip("\"')")
+        marks.append(stripped[-1] if stripped[-1:] in PUNCTUATION_MARKS else "")
+    return words, marks
+
+
+if __name__ == "__main__":
+    main()
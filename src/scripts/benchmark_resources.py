@@ -0,0 +1,150 @@
+"""Benchmark the turn latency for several allocations of the CPU threads.
+
+Every allocation is benchmarked in a fresh process, as the torch thread pools can only
+be configured once per process. In each of them, the wake word detection runs
+continuously in a background thread, as it does while the bot is listening, while a
+recording is transcribed and punctuated a number of times. The allocations are reported
+sorted by their 95th percentile turn latency.
+
+Usage:
+    python src/scripts/benchmark_resources.py [+speech_path=<path>]
+        [+num_benchmark_turns=<int>]
+"""
+
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from time import perf_counter
+
+import hydra
+import numpy as np
+from omegaconf import DictConfig, OmegaConf
+
+from voicebot.evaluation import load_samples
+from voicebot.resources import apply_resources
+from voicebot.speech_recognition import (
+    get_device,
+    load_punct_fixer,
+    load_transcriber,
+    transcribe_speech,
+)
+from voicebot.speech_recording import SAMPLE_RATE
+from voicebot.wake_word import WakeWordDetector
+
+logger = logging.getLogger("benchmark_resources")
+
+
+NUM_WAKE_WORD_THREADS = [1, 2]
+NUM_INTEROP_THREADS = [1, 2]
+
+
+@hydra.main(config_path="../../config", config_name="config", version_base=None)
+def main(cfg: DictConfig) -> None:
+    """Benchmark the allocations of the CPU threads.
+
+    Args:
+        cfg: Hydra configuration object.
+    """
+    num_cores = os.cpu_count() or 1
+    candidate_torch_threads = [1, 2, 4, 8, num_cores // 2, num_cores]
+    num_torch_threads = sorted(
+        {num for num in candidate_torch_threads if 1 <= num <= num_cores}
+    )
+
+    results: list[tuple[dict, float, float]] = list()
+    for torch_threads, interop_threads, wake_word_threads in itertools.product(
+        num_torch_threads, NUM_INTEROP_THREADS, NUM_WAKE_WORD_THREADS
+    ):
+        allocation = dict(
+            torch_num_threads=torch_threads,
+            torch_num_interop_threads=interop_threads,
+            wake_word_num_threads=wake_word_threads,
+        )
+        benchmark_cfg = OmegaConf.merge(
+            cfg,
+            dict(
+                resources=dict(
+                    main=dict(
+                        torch_num_threads=torch_threads,
+                        torch_num_interop_threads=interop_threads,
+                    ),
+                    wake_word=dict(num_threads=wake_word_threads),
+                )
+            ),
+        )
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=mp.get_context(method="spawn")
+        ) as executor:
+            latencies = executor.submit(benchmark_allocation, benchmark_cfg).result()
+        mean_latency = float(np.mean(latencies))
+        p95_latency = float(np.percentile(latencies, q=95))
+        logger.info(
+            f"{allocation}: mean turn latency {mean_latency:.3f} seconds, p95 turn "
+            f"latency {p95_latency:.3f} seconds"
+        )
+        results.append((allocation, mean_latency, p95_latency))
+
+    logger.info("Allocations sorted by p95 turn latency:")
+    for allocation, mean_latency, p95_latency in sorted(
+        results, key=lambda result: result[2]
+    ):
+        logger.info(f"  {allocation}: p95 {p95_latency:.3f}, mean {mean_latency:.3f}")
+
+
+def benchmark_allocation(cfg: DictConfig) -> list[float]:
+    """Measure the turn latencies with the resources in the configuration.
+
+    Args:
+        cfg:
+            Hydra configuration object.
+
+    Returns:
+        The latencies of the turns, in seconds.
+    """
+    num_turns = int(cfg.get("num_benchmark_turns", 20))
+    speech = load_samples(path=Path(cfg.get("speech_path", "mic.wav")))
+
+    apply_resources(resources=cfg.resources.main)
+    device = get_device()
+    transcriber = load_transcriber(cfg=cfg, device=device)
+    punct_fixer = load_punct_fixer(cfg=cfg, device=device)
+    detector = WakeWordDetector(cfg=cfg)
+
+    # Run the wake word detection on noise in real time while transcribing
+    stop = threading.Event()
+
+    def detect_wake_words() -> None:
+        rng = np.random.default_rng(seed=4242)
+        chunk_size = int(SAMPLE_RATE * cfg.num_seconds_per_chunk)
+        while not stop.wait(timeout=cfg.num_seconds_per_chunk):
+            frame = rng.normal(scale=300, size=chunk_size).astype(np.int16)
+            detector.process(frame=frame)
+
+    wake_word_thread = threading.Thread(target=detect_wake_words, daemon=True)
+    wake_word_thread.start()
+
+    latencies: list[float] = list()
+    try:
+        for turn in range(num_turns + 1):
+            start = perf_counter()
+            transcribe_speech(
+                speech=speech,
+                transcriber=transcriber,
+                punct_fixer=punct_fixer,
+                manual_fixes=cfg.manual_fixes,
+            )
+            # The first turn is a warm-up
+            if turn > 0:
+                latencies.append(perf_counter() - start)
+    finally:
+        stop.set()
+        wake_word_thread.join()
+    return latencies
+
+
+if __name__ == "__main__":
+    main()
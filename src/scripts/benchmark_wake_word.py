@@ -0,0 +1,109 @@
+"""Benchmark the CPU usage of the wake word detection while idle.
+
+This feeds low-level noise through the wake word detector, as when listening in a quiet
+room, and reports the CPU time used per hour of listening for several frame strides,
+with and without the energy gate.
+
+If a corpus directory is given, the recall of the wake word detection is also reported
+with and without the energy gate. The corpus directory should contain recordings of the
+wake words in subdirectories named after the wake word, e.g.,
+`positive/hey_jarvis/001.wav`, as with `evaluate_thresholds.py`. Every recording is
+preceded by a few seconds of the idle noise, so that the gate is closed when the wake
+word starts.
+
+Usage:
+    python src/scripts/benchmark_wake_word.py [+num_benchmark_seconds=<int>]
+        [+corpus_dir=<path>]
+"""
+
+import logging
+from pathlib import Path
+from time import perf_counter, process_time
+
+import hydra
+import numpy as np
+from omegaconf import DictConfig, OmegaConf
+
+from voicebot.evaluation import list_audio_files, load_frames
+from voicebot.speech_recording import SAMPLE_RATE
+from voicebot.wake_word import WakeWordDetector
+
+logger = logging.getLogger("benchmark_wake_word")
+
+
+FRAME_STRIDES = [1, 2, 4, 8]
+NUM_LEADING_NOISE_SECONDS = 3
+
+
+@hydra.main(config_path="../../config", config_name="config", version_base=None)
+def main(cfg: DictConfig) -> None:
+    """Benchmark the CPU usage and recall of the wake word detection.
+
+    Args:
+        cfg: Hydra configuration object.
+    """
+    num_seconds = int(cfg.get("num_benchmark_seconds", 60))
+    corpus_dir = cfg.get("corpus_dir", None)
+    chunk_size = int(SAMPLE_RATE * cfg.num_seconds_per_chunk)
+    num_frames = int(num_seconds / cfg.num_seconds_per_chunk)
+
+    rng = np.random.default_rng(seed=4242)
+    frames = rng.normal(scale=30, size=(num_frames, chunk_size)).astype(np.int16)
+
+    for gate_enabled in [False, True]:
+        for frame_stride in FRAME_STRIDES:
+            benchmark_cfg = OmegaConf.merge(
+                cfg,
+                dict(
+                    wake_word_frame_stride=frame_stride,
+                    wake_word_gate=dict(enabled=gate_enabled),
+                ),
+            )
+            assert isinstance(benchmark_cfg, DictConfig)
+            detector = WakeWordDetector(cfg=benchmark_cfg)
+
+            wall_start = perf_counter()
+            cpu_start = process_time()
+            for frame in frames:
+                detector.process(frame=frame)
+            cpu_seconds = process_time() - cpu_start
+            wall_seconds = perf_counter() - wall_start
+
+            cpu_seconds_per_hour = cpu_seconds * 3600 / num_seconds
+            logger.info(
+                f"Frame stride {frame_stride}, gate {'on' if gate_enabled else 'off'}: "
+                f"{cpu_seconds_per_hour:.1f} CPU seconds per hour of listening "
+                f"({100 * cpu_seconds / num_seconds:.2f}% of a core), processed "
+                f"{num_seconds} seconds of audio in {wall_seconds:.2f} seconds"
+            )
+
+    if corpus_dir is None:
+        return
+
+    leading_noise = frames[: int(NUM_LEADING_NOISE_SECONDS / cfg.num_seconds_per_chunk)]
+    for gate_enabled in [False, True]:
+        gate_cfg = OmegaConf.merge(cfg, dict(wake_word_gate=dict(enabled=gate_enabled)))
+        assert isinstance(gate_cfg, DictConfig)
+        detector = WakeWordDetector(cfg=gate_cfg)
+        for wake_word in detector.wake_words:
+            paths = list_audio_files(directory=Path(corpus_dir, "positive", wake_word))
+            if not paths:
+                logger.info(f"No positive recordings of {wake_word!r}, skipping it.")
+                continue
+            num_detected = 0
+            for path in paths:
+                detector.reset()
+                recording = load_frames(path=path, chunk_size=chunk_size)
+                detections = {
+                    detector.process(frame=frame)
+                    for frame in np.concatenate([leading_noise, recording])
+                }
+                num_detected += wake_word in detections
+            logger.info(
+                f"Wake word {wake_word!r}, gate {'on' if gate_enabled else 'off'}: "
+                f"recall {num_detected / len(paths):.1%} on {len(paths)} recordings"
+            )
+
+
+if __name__ == "__main__":
+    main()
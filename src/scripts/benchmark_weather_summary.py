@@ -0,0 +1,115 @@
+"""Benchmark the size and LLM latency of the weather summary against the hourly format.
+
+The hourly format lists every hourly value of every variable, as the weather tool used
+to, while the summary has a single line per period of the day. For both formats, this
+reports the size of the tool output and the number of input tokens and latency of the
+follow-up request to the text engine which answers based on the forecast.
+
+Usage:
+    python src/scripts/benchmark_weather_summary.py [+latitude=<float>]
+        [+longitude=<float>] [+num_benchmark_runs=<int>]
+"""
+
+import logging
+from time import perf_counter
+
+import hydra
+import numpy as np
+from omegaconf import DictConfig
+
+from voicebot.text_engine import TextEngine
+from voicebot.tools.weather import (
+    FORECAST_PERIODS,
+    HOURS_PER_PERIOD,
+    WEATHER_CODES,
+    fetch_forecast,
+    summarise_forecast,
+)
+
+logger = logging.getLogger("benchmark_weather_summary")
+
+
+LOCATION = "København"
+PROMPT = "Hvordan bliver vejret i morgen?"
+HOURLY_VARIABLE_NAMES = dict(
+    weather_code="Vejrtype",
+    temperature_2m="Temperatur (i celcius)",
+    precipitation="Nedbør (i millimeter)",
+    wind_speed_10m="Vindhastighed (i meter per sekund)",
+)
+
+
+@hydra.main(config_path="../../config", config_name="config", version_base=None)
+def main(cfg: DictConfig) -> None:
+    """Benchmark the two formats of the weather forecast.
+
+    Args:
+        cfg: Hydra configuration object.
+    """
+    latitude = float(cfg.get("latitude", 55.68))
+    longitude = float(cfg.get("longitude", 12.57))
+    num_runs = int(cfg.get("num_benchmark_runs", 5))
+
+    forecast = fetch_forecast(latitude=latitude, longitude=longitude)
+    if forecast is None:
+        logger.error("No forecast available.")
+        return
+
+    text_engine = TextEngine(cfg=cfg)
+    formats = dict(
+        hourly=format_hourly(location=LOCATION, forecast=forecast),
+        summary=summarise_forecast(location=LOCATION, forecast=forecast),
+    )
+    for name, tool_output in formats.items():
+        conversation = text_engine.build_system_messages() + [
+            dict(role="user", content=PROMPT),
+            dict(role="system", content=f"Vejrudsigten:\n{tool_output}"),
+            dict(role="system", content=cfg.follow_up_instructions.strip()),
+        ]
+        latencies: list[float] = list()
+        input_tokens = 0
+        for _ in range(num_runs):
+            start = perf_counter()
+            response = text_engine.create_response(conversation=conversation)
+            latencies.append(perf_counter() - start)
+            if response is not None and response.usage is not None:
+                input_tokens = response.usage.input_tokens
+        logger.info(
+            f"{name.capitalize()} format: {len(tool_output):,} characters, "
+            f"{input_tokens:,} input tokens, mean latency {np.mean(latencies):.3f} "
+            f"seconds, p95 latency {np.percentile(latencies, q=95):.3f} seconds"
+        )
+
+
+def format_hourly(location: str, forecast: dict[str, np.ndarray | None]) -> str:
+    """Format the forecast with every hourly value, as the weather tool used to.
+
+    Args:
+        location:
+            The name of the location.
+        forecast:
+            The hourly forecast.
+
+    Returns:
+        The formatted forecast.
+    """
+    out = f"Vejrdata for {location}:\n\n"
+    for variable_name, values_arr in forecast.items():
+        out += f"{HOURLY_VARIABLE_NAMES[variable_name]}:\n"
+        if values_arr is None:
+            out += "Ingen data tilgængelig.\n\n"
+            continue
+        if variable_name == "weather_code":
+            values = [WEATHER_CODES.get(value, "Ukendt vejr") for value in values_arr]
+        else:
+            values = [str(int(round(value, 0))) for value in values_arr]
+        for index, period_name in enumerate(FORECAST_PERIODS):
+            start = index * HOURS_PER_PERIOD
+            period_values = ", ".join(values[start : start + HOURS_PER_PERIOD])
+            out += f"{period_name}: {period_values}\n"
+        out += "\n"
+    return out
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Evaluate the wake word and speech detection thresholds on labelled recordings.
+
+The corpus directory should contain the following subdirectories of audio files:
+
+- `positive`: Recordings containing a wake word, where the name of the subdirectory of
+  `positive` is the wake word, e.g., `positive/hey_jarvis/001.wav`.
+- `negative`: Recordings without any wake words, such as background noise, talk and
+  TV, used to compute false accepts per hour.
+- `speech`: Recordings of speech, used for the speech detection threshold.
+- `silence`: Recordings of the room without speech, used for the speech detection
+  threshold.
+
+The calibrated thresholds are written to the calibration profile, which the bot loads
+at startup.
+
+Usage:
+    python src/scripts/evaluate_thresholds.py [+corpus_dir=<path>]
+"""
+
+import logging
+from pathlib import Path
+
+import hydra
+import numpy as np
+from omegaconf import DictConfig
+
+from voicebot.calibration import CalibrationProfile
+from voicebot.evaluation import list_audio_files, load_frames
+from voicebot.speech_recording import SAMPLE_RATE
+from voicebot.wake_word import WakeWordDetector
+
+logger = logging.getLogger("evaluate_thresholds")
+
+
+WAKE_WORD_THRESHOLDS = np.round(np.arange(0.05, 1.0, 0.05), 2)
+
+
+@hydra.main(config_path="../../config", config_name="config", version_base=None)
+def main(cfg: DictConfig) -> None:
+    """Evaluate the thresholds and write a calibration profile.
+
+    Args:
+        cfg: Hydra configuration object.
+    """
+    corpus_dir = Path(cfg.get("corpus_dir", "data/calibration"))
+    max_false_accepts_per_hour = float(cfg.get("max_false_accepts_per_hour", 0.5))
+    chunk_size = int(SAMPLE_RATE * cfg.num_seconds_per_chunk)
+    detector = WakeWordDetector(cfg=cfg)
+
+    # Compute the frame-wise wake word probabilities of all the negative recordings
+    negative_probabilities: list[np.ndarray] = list()
+    num_negative_frames = 0
+    for path in list_audio_files(directory=corpus_dir / "negative"):
+        frames = load_frames(path=path, chunk_size=chunk_size)
+        negative_probabilities.append(
+            frame_probabilities(detector=detector, frames=frames)
+        )
+        num_negative_frames += len(frames)
+    negative_hours = num_negative_frames * cfg.num_seconds_per_chunk / 3600
+
+    wake_word_thresholds: dict[str, float] = dict()
+    for wake_word_index, wake_word in enumerate(detector.wake_words):
+        positive_paths = list_audio_files(directory=corpus_dir / "positive" / wake_word)
+        if not positive_paths:
+            logger.info(f"No positive recordings of {wake_word!r}, skipping it.")
+            continue
+
+        # A positive recording is detected at a threshold if its maximum probability
+        # reaches the threshold. Empty recordings have no frames and are skipped
+        positive_frames = [
+            load_frames(path=path, chunk_size=chunk_size) for path in positive_paths
+        ]
+        max_positive_probabilities = np.array(
+            [
+                frame_probabilities(detector=detector, frames=frames)[
+                    :, wake_word_index
+                ].max()
+                for frames in positive_frames
+                if len(frames) > 0
+            ]
+        )
+        if len(max_positive_probabilities) == 0:
+            logger.info(f"All positive recordings of {wake_word!r} are empty.")
+            continue
+        false_reject_rates = 1 - np.mean(
+            max_positive_probabilities[:, None] >= WAKE_WORD_THRESHOLDS[None, :], axis=0
+        )
+
+        # A false accept is every time the probability rises above the threshold
+        num_false_accepts = np.zeros_like(WAKE_WORD_THRESHOLDS)
+        for probabilities in negative_probabilities:
+            above = probabilities[:, wake_word_index, None] >= WAKE_WORD_THRESHOLDS
+            onsets = above[1:] & ~above[:-1]
+            num_false_accepts += above[:1].sum(axis=0) + onsets.sum(axis=0)
+        false_accepts_per_hour = num_false_accepts / max(negative_hours, 1e-9)
+
+        logger.info(f"Wake word {wake_word!r}:")
+        for threshold, frr, fa_per_hour in zip(
+            WAKE_WORD_THRESHOLDS, false_reject_rates, false_accepts_per_hour
+        ):
+            logger.info(
+                f"  Threshold {threshold:.2f}: false reject rate {frr:.1%}, "
+                f"{fa_per_hour:.2f} false accepts per hour"
+            )
+
+        # Pick the threshold with the lowest false reject rate among the ones with an
+        # acceptable false accept rate, preferring higher thresholds on ties
+        acceptable = false_accepts_per_hour <= max_false_accepts_per_hour
+        if not acceptable.any():
+            best_index = len(WAKE_WORD_THRESHOLDS) - 1
+        else:
+            candidate_frrs = np.where(acceptable, false_reject_rates, np.inf)
+            best_indices = np.flatnonzero(candidate_frrs == candidate_frrs.min())
+            best_index = int(best_indices.max())
+        wake_word_thresholds[wake_word] = float(WAKE_WORD_THRESHOLDS[best_index])
+        logger.info(
+            f"Calibrated threshold for {wake_word!r}: "
+            f"{wake_word_thresholds[wake_word]:.2f}"
+        )
+
+    audio_threshold = evaluate_audio_threshold(
+        speech_paths=list_audio_files(directory=corpus_dir / "speech"),
+        silence_paths=list_audio_files(directory=corpus_dir / "silence"),
+        chunk_size=chunk_size,
+        default=int(cfg.audio_threshold),
+    )
+
+    CalibrationProfile(
+        audio_threshold=audio_threshold, wake_word_thresholds=wake_word_thresholds
+    ).save(path=cfg.calibration_profile)
+
+
+def evaluate_audio_threshold(
+    speech_paths: list[Path], silence_paths: list[Path], chunk_size: int, default: int
+) -> int:
+    """Find the speech detection threshold best separating speech from silence.
+
+    The threshold is applied to the maximum value of each frame, as in the bot, and is
+    chosen to maximise the difference between the true and false positive rates.
+
+    Args:
+        speech_paths:
+            Recordings of speech.
+        silence_paths:
+            Recordings without speech.
+        chunk_size:
+            The number of samples per frame.
+        default:
+            The threshold to use if there are no recordings.
+
+    Returns:
+        The calibrated threshold.
+    """
+    if not speech_paths or not silence_paths:
+        logger.info("No speech or silence recordings, keeping the audio threshold.")
+        return default
+
+    speech_maxima = np.concatenate(
+        [
+            load_frames(path=path, chunk_size=chunk_size).max(axis=1)
+            for path in speech_paths
+        ]
+    )
+    silence_maxima = np.concatenate(
+        [
+            load_frames(path=path, chunk_size=chunk_size).max(axis=1)
+            for path in silence_paths
+        ]
+    )
+    thresholds = np.unique(
+        np.percentile(np.concatenate([speech_maxima, silence_maxima]), q=range(101))
+    ).astype(int)
+    true_positive_rates = np.mean(speech_maxima[:, None] >= thresholds, axis=0)
+    false_positive_rates = np.mean(silence_maxima[:, None] >= thresholds, axis=0)
+    best_index = int(np.argmax(true_positive_rates - false_positive_rates))
+    logger.info(
+        f"Calibrated audio threshold: {thresholds[best_index]}, detecting "
+        f"{true_positive_rates[best_index]:.1%} of speech frames and "
+        f"{false_positive_rates[best_index]:.1%} of silent frames"
+    )
+    return int(thresholds[best_index])
+
+
+def frame_probabilities(detector: WakeWordDetector, frames: np.ndarray) -> np.ndarray:
+    """Compute the wake word probabilities of every frame of a recording.
+
+    Args:
+        detector:
+            The wake word detector.
+        frames:
+            The int16 frames of the recording, of shape (num_frames, chunk_size).
+
+    Returns:
+        The probabilities, of shape (num_frames, num_wake_words).
+    """
+    detector.reset()
+
+    # The prediction is streaming, so every frame is fed to the detector exactly once
+    probabilities: list[list[float]] = list()
+    for frame in frames:
+        scores = detector.predict(audio=frame)
+        probabilities.append([scores[wake_word] for wake_word in detector.wake_words])
+    detector.reset()
+    return np.array(probabilities).reshape(len(frames), len(detector.wake_words))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,121 @@
-"""Run a TTS example."""
+"""Run a TTS example and benchmark the precisions of the speech synthesis model.
 
+For every precision of the autoregressive T3 stage, this synthesises a few Danish
+sentences and reports the real-time factor, being the synthesis time divided by the
+duration of the generated speech, so that values below 1 are faster than real time. The
+quality is reported as the word error rate of the speech recognition model on the
+generated speech and the cosine similarity between the voice of the generated speech
+and that of the audio prompt, along with their differences from float32. The first
+sentence is saved as `test_<precision>.wav` for every precision.
+
+Usage:
+    python src/scripts/tts_example.py [+num_benchmark_runs=<int>]
+        [speech_synthesis.audio_prompt_path=<path>]
+"""
+
+import logging
 from pathlib import Path
+from time import perf_counter
 
+import hydra
+import numpy as np
+import torch
 import torchaudio as ta
-from chatterbox.mtl_tts import ChatterboxMultilingualTTS
-from huggingface_hub import hf_hub_download
-
-REPO_ID = "CoRal-project/tts-base-compatible"
-
-
-def main() -> None:
-    """Run the TTS example."""
-    local_path = ""
-    for fpath in [
-        "ve.pt",
-        "t3_23lang.safetensors",
-        "mtl_tokenizer.json",
-        "s3gen.pt",
-        "grapheme_mtl_merged_expanded_v1.json",
-        "conds.pt",
-    ]:
-        local_path = hf_hub_download(repo_id=REPO_ID, filename=fpath)
-
-    # Load the model
-    checkpoint_dir = Path(local_path).parent  # Same for all files
-    model = ChatterboxMultilingualTTS.from_local(ckpt_dir=checkpoint_dir, device="cuda")
-
-    # Generate speech to a wav file
-    text = "Dette er en test!"
-    wav = model.generate(
-        text=text, language_id="da", exaggeration=1.0, cfg_weight=0.5, temperature=0.4
-    )
-    ta.save(uri="test.wav", src=wav, sample_rate=model.sr)
+from omegaconf import DictConfig, OmegaConf
+
+from voicebot.evaluation import load_audio, word_error_rate
+from voicebot.speech_recognition import get_device, load_transcriber, transcribe_speech
+from voicebot.speech_recording import SAMPLE_RATE
+from voicebot.speech_synthesis import load_synthesiser
+
+logger = logging.getLogger("tts_example")
+
+
+TEXTS = [
+    "Dette er en test!",
+    "I morgen bliver det overskyet med let regn og omkring tolv grader.",
+    "Jeg har sat en timer på fem minutter.",
+]
+PRECISIONS = ["float32", "bfloat16", "int8"]
+
+
+@hydra.main(config_path="../../config", config_name="config", version_base=None)
+def main(cfg: DictConfig) -> None:
+    """Run the TTS example and benchmark.
+
+    Args:
+        cfg: Hydra configuration object.
+    """
+    num_runs = int(cfg.get("num_benchmark_runs", 3))
+    device = get_device()
+    transcriber = load_transcriber(cfg=cfg, device=device)
+    prompt = load_audio(path=Path(cfg.speech_synthesis.audio_prompt_path))
+
+    results: dict[str, tuple[float, float, float]] = dict()
+    for precision in PRECISIONS:
+        synthesiser = load_synthesiser(
+            cfg=OmegaConf.merge(cfg, dict(speech_synthesis=dict(precision=precision))),
+            device=device,
+        )
+        prompt_embedding = synthesiser.ve.embeds_from_wavs(
+            [prompt], sample_rate=SAMPLE_RATE
+        ).mean(axis=0)
+
+        # The first generation is a warm-up, which is not timed
+        synthesiser.generate(text=TEXTS[0], language_id="da")
+
+        torch.manual_seed(4242)
+        real_time_factors: list[float] = list()
+        similarities: list[float] = list()
+        references: list[str] = list()
+        hypotheses: list[str] = list()
+        for _ in range(num_runs):
+            for index, text in enumerate(TEXTS):
+                start = perf_counter()
+                wav = synthesiser.generate(text=text, language_id="da").cpu()
+                duration = perf_counter() - start
+                real_time_factors.append(duration / (wav.shape[-1] / synthesiser.sr))
+                if index == 0:
+                    ta.save(
+                        uri=f"test_{precision}.wav", src=wav, sample_rate=synthesiser.sr
+                    )
+
+                speech = ta.functional.resample(
+                    wav, orig_freq=synthesiser.sr, new_freq=SAMPLE_RATE
+                )[0].numpy()
+                references.append(text)
+                hypotheses.append(
+                    transcribe_speech(
+                        speech=speech,
+                        transcriber=transcriber,
+                        punct_fixer=None,
+                        manual_fixes=cfg.manual_fixes,
+                    )
+                )
+                embedding = synthesiser.ve.embeds_from_wavs(
+                    [speech], sample_rate=SAMPLE_RATE
+                ).mean(axis=0)
+                similarities.append(
+                    float(
+                        np.dot(embedding, prompt_embedding)
+                        / (np.linalg.norm(embedding) * np.linalg.norm(prompt_embedding))
+                    )
+                )
+
+        results[precision] = (
+            float(np.mean(real_time_factors)),
+            word_error_rate(references=references, hypotheses=hypotheses),
+            float(np.mean(similarities)),
+        )
+        del synthesiser
+
+    baseline_wer, baseline_similarity = results["float32"][1:]
+    for precision, (real_time_factor, wer, similarity) in results.items():
+        logger.info(
+            f"{precision}: real-time factor {real_time_factor:.2f}, WER {wer:.1%} "
+            f"({wer - baseline_wer:+.1%}), voice similarity {similarity:.3f} "
+            f"({similarity - baseline_similarity:+.3f})"
+        )
 
 
 if __name__ == "__main__":
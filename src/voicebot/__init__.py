@@ -11,7 +11,26 @@ warnings.filterwarnings("ignore", category=UserWarning)
 warnings.filterwarnings("ignore", category=FutureWarning)
 logging.getLogger("httpx").setLevel(logging.WARNING)
 
-from .bot import VoiceBot  # noqa: E402
-
 # Fetches the version of the package as defined in pyproject.toml
 __version__ = importlib.metadata.version(__package__ or "voicebot")
+
+
+def __getattr__(name: str) -> object:
+    """Import the bot lazily, as it pulls in all the models and their dependencies.
+
+    Args:
+        name:
+            The name of the attribute.
+
+    Returns:
+        The attribute.
+
+    Raises:
+        AttributeError:
+            If the package has no such attribute.
+    """
+    if name == "VoiceBot":
+        from .bot import VoiceBot
+
+        return VoiceBot
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,362 @@
+"""Shared audio output, mixing speech and sound effects."""
+
+import importlib.resources
+import logging
+import math
+import threading
+from functools import cache
+from pathlib import Path
+
+import httpx
+import numpy as np
+import sounddevice
+from pydub import AudioSegment
+
+from .utils import report_request_outcome
+
+logger = logging.getLogger(__name__)
+
+
+OUTPUT_SAMPLE_RATE = 48_000
+OUTPUT_BLOCK_SIZE = 480
+
+# The played audio is kept at this sample rate, as a reference for echo cancellation
+REFERENCE_SAMPLE_RATE = 16_000
+REFERENCE_SECONDS = 2
+MEOW_URL = "https://filedn.com/lRBwPhPxgV74tO0rDoe8SpH/cat-meow.mp3"
+MEOW_PATH = Path(".cache", "cat", "cat-sound.mp3")
+
+
+class Voice:
+    """A sound being played by the audio output."""
+
+    def __init__(self, samples: np.ndarray) -> None:
+        """Initialise the voice.
+
+        Args:
+            samples:
+                The mono float32 samples to play, at the output sample rate.
+        """
+        self.samples = samples
+        self.position: int = 0
+        self.done = threading.Event()
+
+    def stop(self) -> None:
+        """Stop playing the voice."""
+        self.done.set()
+
+
+class AudioOutput:
+    """A single low-latency output stream which mixes all sounds being played."""
+
+    def __init__(
+        self, sample_rate: int = OUTPUT_SAMPLE_RATE, block_size: int = OUTPUT_BLOCK_SIZE
+    ) -> None:
+        """Initialise the audio output.
+
+        Args:
+            sample_rate (optional):
+                The sample rate of the output stream. Defaults to 48,000.
+            block_size (optional):
+                The number of samples per block of the output stream. Defaults to 480,
+                i.e., 10 ms.
+        """
+        self.sample_rate = sample_rate
+        self.voices: list[Voice] = list()
+        self.lock = threading.Lock()
+        self.interrupted = threading.Event()
+
+        # Ring buffer of the most recently played audio, downsampled to the reference
+        # sample rate
+        self.reference = np.zeros(
+            REFERENCE_SAMPLE_RATE * REFERENCE_SECONDS, dtype=np.float32
+        )
+        self.num_reference_samples: int = 0
+        self.stream = sounddevice.OutputStream(
+            samplerate=sample_rate,
+            blocksize=block_size,
+            channels=1,
+            dtype="float32",
+            callback=self._callback,
+        )
+        self.stream.start()
+
+    def play(self, samples: np.ndarray, sample_rate: int) -> Voice:
+        """Start playing a sound, without blocking.
+
+        Args:
+            samples:
+                The mono float32 samples to play.
+            sample_rate:
+                The sample rate of the samples.
+
+        Returns:
+            The voice playing the sound, which can be waited on or stopped.
+        """
+        voice = Voice(samples=resample(samples=samples, source_rate=sample_rate))
+        return self.play_voice(voice=voice)
+
+    def play_voice(self, voice: Voice) -> Voice:
+        """Start playing a voice which is already at the output sample rate.
+
+        Args:
+            voice:
+                The voice to play.
+
+        Returns:
+            The voice. If the output is interrupted then the voice is not played, and
+            is immediately marked as done.
+        """
+        if self.interrupted.is_set():
+            voice.stop()
+            return voice
+        with self.lock:
+            self.voices.append(voice)
+        return voice
+
+    def stop_all(self) -> None:
+        """Stop all sounds currently being played."""
+        with self.lock:
+            for voice in self.voices:
+                voice.stop()
+            self.voices.clear()
+
+    def interrupt(self) -> None:
+        """Stop all sounds and mute the output until `resume` is called."""
+        self.interrupted.set()
+        self.stop_all()
+
+    def resume(self) -> None:
+        """Allow sounds to be played again after an interruption."""
+        self.interrupted.clear()
+
+    def get_reference(self, num_samples: int, delay_seconds: float = 0.0) -> np.ndarray:
+        """Get the most recently played audio, at the reference sample rate.
+
+        Args:
+            num_samples:
+                The number of samples to get.
+            delay_seconds (optional):
+                The number of seconds before the end of the played audio at which the
+                returned audio should end. The output latency of the stream is always
+                added to this. Defaults to 0.
+
+        Returns:
+            The played audio, with zeros where nothing was played.
+        """
+        delay_samples = int(
+            (delay_seconds + self.stream.latency) * REFERENCE_SAMPLE_RATE
+        )
+        buffer_size = len(self.reference)
+        num_samples = min(num_samples, buffer_size - delay_samples)
+        end = self.num_reference_samples - delay_samples
+        indices = np.arange(end - num_samples, end)
+        reference = self.reference[indices % buffer_size]
+        reference[indices < 0] = 0.0
+        return reference
+
+    def _callback(
+        self,
+        outdata: np.ndarray,
+        frames: int,
+        time_info: object,
+        status: sounddevice.CallbackFlags,
+    ) -> None:
+        """Mix the active voices into the output buffer.
+
+        Args:
+            outdata:
+                The output buffer.
+            frames:
+                The number of frames to write.
+            time_info:
+                Timing information from PortAudio.
+            status:
+                Status flags from PortAudio.
+        """
+        mixed = np.zeros(frames, dtype=np.float32)
+        with self.lock:
+            for voice in self.voices:
+                if voice.done.is_set():
+                    continue
+                chunk = voice.samples[voice.position : voice.position + frames]
+                mixed[: len(chunk)] += chunk
+                voice.position += len(chunk)
+                if voice.position >= len(voice.samples):
+                    voice.done.set()
+            self.voices = [voice for voice in self.voices if not voice.done.is_set()]
+        np.clip(mixed, -1.0, 1.0, out=mixed)
+        outdata[:, 0] = mixed
+
+        # Store the played audio as a reference for echo cancellation
+        factor = self.sample_rate // REFERENCE_SAMPLE_RATE
+        downsampled = mixed[: frames - frames % factor].reshape(-1, factor).mean(axis=1)
+        indices = np.arange(
+            self.num_reference_samples, self.num_reference_samples + len(downsampled)
+        )
+        self.reference[indices % len(self.reference)] = downsampled
+        self.num_reference_samples += len(downsampled)
+
+
+class SoundBank:
+    """Sound effects decoded into memory once, ready to be played instantly."""
+
+    def __init__(self, audio_output: AudioOutput) -> None:
+        """Initialise the sound bank, decoding all the sound effects.
+
+        Args:
+            audio_output:
+                The audio output to play the sound effects through.
+        """
+        self.audio_output = audio_output
+        self.sounds: dict[str, np.ndarray] = dict()
+        self.add_file(name="news", path=chime_path(theme="pokemon", event="info"))
+        self.add_file(name="timer", path=chime_path(theme="material", event="info"))
+        self.sounds["wake_word"] = beep(frequency=880.0, duration_seconds=0.12)
+        if download_meow():
+            self.add_file(name="meow", path=MEOW_PATH)
+
+    def add_file(self, name: str, path: str | Path) -> None:
+        """Decode a sound file and add it to the sound bank.
+
+        Args:
+            name:
+                The name of the sound effect.
+            path:
+                The path to the sound file.
+        """
+        audio = AudioSegment.from_file(str(path))
+        self.sounds[name] = resample(
+            samples=audio_segment_to_array(audio=audio), source_rate=audio.frame_rate
+        )
+
+    def play(self, name: str) -> Voice | None:
+        """Play a sound effect, without blocking.
+
+        Args:
+            name:
+                The name of the sound effect.
+
+        Returns:
+            The voice playing the sound effect, or None if there is no such effect.
+        """
+        samples = self.sounds.get(name)
+        if samples is None:
+            logger.error(f"There is no sound effect named {name!r}.")
+            return None
+        return self.audio_output.play_voice(voice=Voice(samples=samples))
+
+
+@cache
+def get_audio_output() -> AudioOutput:
+    """Get the audio output, shared across the whole bot.
+
+    Returns:
+        The audio output.
+    """
+    return AudioOutput()
+
+
+@cache
+def get_sound_bank() -> SoundBank:
+    """Get the sound bank, shared across the whole bot.
+
+    Returns:
+        The sound bank.
+    """
+    return SoundBank(audio_output=get_audio_output())
+
+
+def audio_segment_to_array(audio: AudioSegment) -> np.ndarray:
+    """Convert a pydub audio segment to mono float32 samples.
+
+    Args:
+        audio:
+            The audio segment.
+
+    Returns:
+        The samples, with values in [-1, 1].
+    """
+    samples = np.asarray(audio.get_array_of_samples(), dtype=np.float32)
+    samples = samples.reshape(-1, audio.channels).mean(axis=1)
+    return samples / float(2 ** (8 * audio.sample_width - 1))
+
+
+def resample(
+    samples: np.ndarray, source_rate: int, target_rate: int = OUTPUT_SAMPLE_RATE
+) -> np.ndarray:
+    """Resample audio using linear interpolation.
+
+    Args:
+        samples:
+            The samples to resample.
+        source_rate:
+            The sample rate of the samples.
+        target_rate (optional):
+            The sample rate to resample to. Defaults to the output sample rate.
+
+    Returns:
+        The resampled float32 samples.
+    """
+    samples = samples.astype(np.float32, copy=False)
+    if source_rate == target_rate or len(samples) == 0:
+        return samples
+    num_target_samples = math.ceil(len(samples) * target_rate / source_rate)
+    source_times = np.arange(len(samples)) / source_rate
+    target_times = np.arange(num_target_samples) / target_rate
+    return np.interp(target_times, source_times, samples).astype(np.float32)
+
+
+def beep(frequency: float, duration_seconds: float) -> np.ndarray:
+    """Generate a short beep with a smooth fade in and out.
+
+    Args:
+        frequency:
+            The frequency of the beep, in Hz.
+        duration_seconds:
+            The duration of the beep, in seconds.
+
+    Returns:
+        The samples of the beep, at the output sample rate.
+    """
+    times = np.arange(int(OUTPUT_SAMPLE_RATE * duration_seconds)) / OUTPUT_SAMPLE_RATE
+    envelope = np.sin(np.pi * times / duration_seconds)
+    return (0.3 * envelope * np.sin(2 * np.pi * frequency * times)).astype(np.float32)
+
+
+def chime_path(theme: str, event: str) -> Path:
+    """Get the path to a sound file bundled with the `chime` package.
+
+    Args:
+        theme:
+            The chime theme.
+        event:
+            The chime event, such as "info".
+
+    Returns:
+        The path to the sound file.
+    """
+    themes_dir = importlib.resources.files("chime").joinpath("themes")
+    return Path(str(themes_dir.joinpath(theme, f"{event}.wav")))
+
+
+def download_meow() -> bool:
+    """Download the meow sound, if it has not already been downloaded.
+
+    Returns:
+        Whether the meow sound is available.
+    """
+    if MEOW_PATH.exists():
+        return True
+    try:
+        response = httpx.get(MEOW_URL, timeout=10)
+    except httpx.HTTPError as e:
+        logger.error(f"Could not download the meow sound: {e}")
+        report_request_outcome(success=False)
+        return False
+    report_request_outcome(success=True)
+    if response.status_code != 200:
+        return False
+    MEOW_PATH.parent.mkdir(exist_ok=True, parents=True)
+    MEOW_PATH.write_bytes(response.content)
+    return True
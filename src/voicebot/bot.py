@@ -2,21 +2,48 @@
 
 import datetime as dt
 import logging
-from functools import cached_property
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import cached_property, partial
+from time import perf_counter
 
-import onnxruntime as ort
-import openwakeword as oww
+import numpy as np
 import torch
 import transformers.utils.logging as hf_logging
 from omegaconf import DictConfig
-from openwakeword.utils import download_models as download_wakeword_models
 from punctfix.inference import PunctFixer
-from transformers.pipelines import Pipeline, pipeline
+from transformers.pipelines import Pipeline
 
-from .speech_recognition import transcribe_speech
-from .speech_recording import calibrate_audio_threshold, record_speech
-from .speech_synthesis import synthesise_speech
+from .audio_output import get_sound_bank
+from .calibration import load_calibration_profile
+from .ctc_decoding import BeamSearchTranscriber
+from .noise_floor import NoiseFloorTracker
+from .resources import apply_resources
+from .speech_recognition import (
+    get_device,
+    load_punct_fixer,
+    load_transcriber,
+    punctuate,
+    transcribe_speech,
+)
+from .speech_recording import (
+    SAMPLE_RATE,
+    BargeInListener,
+    calibrate_audio_threshold,
+    listen_for_wake_word,
+    record_speech,
+)
+from .speech_synthesis import load_synthesiser, synthesise_speech
 from .text_engine import TextEngine
+from .tools.news import start_background_refresh as start_news_refresh
+from .tools.timer import get_timer_scheduler
+from .turn_capture import TurnCaptureWriter
+from .utils import connectivity_monitor
+from .wake_word import WakeWordDetector
+from .warm_up import warm_up_models
+from .workers import InferenceWorker, SpeechRecognitionHandler
 
 logger = logging.getLogger(__name__)
 
@@ -32,52 +59,273 @@ class VoiceBot:
                 The Hydra configuration.
         """
         self.cfg = cfg
+        apply_resources(resources=cfg.resources.main)
         hf_logging.set_verbosity_error()
+        connectivity_monitor.start()
+        if cfg.news_background_refresh:
+            start_news_refresh()
 
-        if cfg.calibrate:
+        # The timer scheduler is created right away rather than on the first use of a
+        # timer tool, so that the timers persisted before a restart ring on time
+        get_timer_scheduler()
+
+        # A calibration profile created offline with `evaluate_thresholds.py` takes
+        # precedence over calibrating interactively. With the noise floor tracker
+        # enabled, the threshold adapts to the room instead, so no calibration is needed
+        calibration_profile = load_calibration_profile(path=cfg.calibration_profile)
+        self.noise_floor: NoiseFloorTracker | None = None
+        if cfg.noise_floor.enabled:
+            self.noise_floor = NoiseFloorTracker(
+                path=cfg.noise_floor.path,
+                percentile=cfg.noise_floor.percentile,
+                step_size_db=cfg.noise_floor.step_size_db,
+                margin_db=cfg.noise_floor.margin_db,
+            )
+        if calibration_profile is not None:
+            self.audio_threshold = calibration_profile.audio_threshold
+        elif cfg.calibrate and self.noise_floor is None:
             self.audio_threshold = calibrate_audio_threshold(cfg=self.cfg)
         else:
             self.audio_threshold = cfg.audio_threshold
 
+        logger.info("Loading the sound effects...")
+        get_sound_bank()
+
         logger.info("Loading the wake word model...")
-        ort.set_default_logger_severity(3)
-        download_wakeword_models(model_names=["hey_jarvis"])
-        self.wake_word_model = oww.Model(
-            wakeword_models=["hey_jarvis"], inference_framework="onnx"
+        self.wake_word_detector = WakeWordDetector(
+            cfg=self.cfg, noise_floor=self.noise_floor
         )
+        if calibration_profile is not None:
+            self.wake_word_detector.thresholds.update(
+                calibration_profile.wake_word_thresholds
+            )
 
-        # logger.info("Loading the speech synthesis model...")
-        # self.synthesiser = ChatterboxMultilingualTTS.from_pretrained(
-        #     device=self.device, repo_id="CoRal-project/tts-base-compatible"
-        # )
         self.synthesiser = None
+        if cfg.speech_synthesis.enabled:
+            self.synthesiser = load_synthesiser(cfg=self.cfg, device=self.device)
 
         logger.info("Loading the text engine model...")
         self.text_engine = TextEngine(cfg=self.cfg)
         self.text_engine.state["synthesiser"] = self.synthesiser
 
-        logger.info("Loading the speech recognition model...")
-        self.transcriber: Pipeline = pipeline(
-            model=self.cfg.asr_model_id,
-            device=self.device,
-            task="automatic-speech-recognition",
-        )
+        # With barge-in enabled we listen for the wake word whenever the bot is busy, so
+        # the tools can reuse that listener rather than starting their own
+        self.barge_in: BargeInListener | None = None
+        if cfg.barge_in:
+            self.barge_in = BargeInListener(
+                wake_word_detector=self.wake_word_detector, cfg=self.cfg
+            )
+            self.text_engine.interrupt = self.barge_in.detected
+            self.text_engine.state["wake_word_listener"] = partial(
+                nullcontext, self.barge_in.detected
+            )
+        else:
+            self.text_engine.state["wake_word_listener"] = partial(
+                listen_for_wake_word,
+                wake_word_detector=self.wake_word_detector,
+                cfg=self.cfg,
+            )
+        if cfg.warm_up_text_engine:
+            self.text_engine.warm_up()
+
+        # With inference workers enabled, the speech recognition and punctuation models
+        # are loaded and run in a separate process instead
+        self.transcriber: Pipeline | BeamSearchTranscriber | None = None
+        self.punct_fixer: PunctFixer | None = None
+        self.speech_recognition_worker: InferenceWorker[str] | None = None
+        if cfg.inference_workers.enabled:
+            self.speech_recognition_worker = InferenceWorker(
+                name="speech recognition",
+                load_handler=SpeechRecognitionHandler,
+                cfg=self.cfg,
+                max_num_samples=int(
+                    (cfg.max_seconds_audio + cfg.num_seconds_per_chunk) * SAMPLE_RATE
+                ),
+            ).start()
+        else:
+            self.transcriber = load_transcriber(cfg=self.cfg, device=self.device)
+            self.punct_fixer = load_punct_fixer(cfg=self.cfg, device=self.device)
 
-        logger.info("Loading the punctfix model...")
-        self.punct_fixer = PunctFixer(language="da", device=self.device)
+        self.punctuation_strategy = str(cfg.punctuation.strategy)
+        self.punctuation_executor: ThreadPoolExecutor | None = None
+        if self.punctuation_strategy == "async":
+            self.punctuation_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="punctuation"
+            )
+
+        # With speculation enabled, the speech so far is transcribed and sent to the
+        # text engine as soon as the user pauses, and both are used if the user does
+        # not resume speaking before the end of the recording
+        self.speculation_executor: ThreadPoolExecutor | None = None
+        self.speculative_prompt: Future[str] | None = None
+        self.speculation_id = 0
+        self.speculation_lock = threading.Lock()
+        if cfg.speculation.enabled:
+            self.speculation_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="speculation"
+            )
+
+        self.turn_capture: TurnCaptureWriter | None = None
+        if cfg.turn_capture.enabled:
+            self.turn_capture = TurnCaptureWriter(
+                directory=cfg.turn_capture.directory,
+                audio_format=cfg.turn_capture.audio_format,
+                max_turns_per_session=cfg.turn_capture.max_turns_per_session,
+                max_sessions=cfg.turn_capture.max_sessions,
+                max_queue_size=cfg.turn_capture.max_queue_size,
+            )
+
+        # With inference workers enabled, the worker warms up its own models, so only
+        # the speech synthesis is warmed up here
+        if cfg.warm_up.enabled:
+            warm_up_models(
+                transcriber=self.transcriber,
+                punct_fixer=self.punct_fixer,
+                synthesiser=self.synthesiser,
+                cfg=self.cfg,
+            )
 
     @cached_property
     def device(self) -> torch.device:
         """Return the device on which the bot is running."""
-        if torch.cuda.is_available():
-            device = torch.device("cuda")
-        elif torch.backends.mps.is_available():
-            device = torch.device("mps")
-        else:
-            device = torch.device("cpu")
+        device = get_device()
         logger.info(f"Using device: {device}")
         return device
 
+    def transcribe(self, speech: np.ndarray, punctuate: bool) -> str:
+        """Transcribe speech, in the inference worker if enabled.
+
+        Args:
+            speech:
+                The speech to transcribe.
+            punctuate:
+                Whether to punctuate the transcription.
+
+        Returns:
+            The transcription.
+
+        Raises:
+            RuntimeError:
+                If the inference worker failed.
+        """
+        if self.speech_recognition_worker is not None:
+            return self.speech_recognition_worker.call(
+                method="transcribe", audio=speech, punctuate=punctuate
+            )
+        assert self.transcriber is not None
+        return transcribe_speech(
+            speech=speech,
+            transcriber=self.transcriber,
+            punct_fixer=self.punct_fixer if punctuate else None,
+            manual_fixes=self.cfg.manual_fixes,
+            min_punctuation_words=self.cfg.punctuation.min_words,
+        )
+
+    def punctuate(self, text: str) -> str:
+        """Punctuate a transcription, in the inference worker if enabled.
+
+        Args:
+            text:
+                The transcription to punctuate.
+
+        Returns:
+            The punctuated transcription, or the transcription itself if the inference
+            worker failed.
+        """
+        if self.speech_recognition_worker is not None:
+            try:
+                return self.speech_recognition_worker.call(
+                    method="punctuate", text=text
+                )
+            except RuntimeError as e:
+                logger.error(f"Could not punctuate the transcription: {e}")
+                return text
+        return punctuate(
+            text=text,
+            punct_fixer=self.punct_fixer,
+            min_words=self.cfg.punctuation.min_words,
+        )
+
+    def start_speculation(
+        self,
+        speech: np.ndarray,
+        audio_start: dt.datetime,
+        last_response_time: dt.datetime,
+    ) -> None:
+        """Start transcribing and responding to the speech so far in the background.
+
+        Args:
+            speech:
+                The speech so far.
+            audio_start:
+                The time the recording started.
+            last_response_time:
+                Time of the last response.
+        """
+        assert self.speculation_executor is not None
+        self.speculative_prompt = self.speculation_executor.submit(
+            self.speculate,
+            speech=speech,
+            audio_start=audio_start,
+            last_response_time=last_response_time,
+            speculation_id=self.speculation_id,
+        )
+
+    def speculate(
+        self,
+        speech: np.ndarray,
+        audio_start: dt.datetime,
+        last_response_time: dt.datetime,
+        speculation_id: int,
+    ) -> str:
+        """Transcribe the speech so far and start the speculative response to it.
+
+        Args:
+            speech:
+                The speech so far.
+            audio_start:
+                The time the recording started.
+            last_response_time:
+                Time of the last response.
+            speculation_id:
+                The identifier of the speculation, which is outdated if the user has
+                resumed speaking since it started.
+
+        Returns:
+            The prompt, transcribed and punctuated as it would be after the recording,
+            or an empty string if the speculation was cancelled.
+        """
+        # A cancelled speculation is dropped as soon as possible, so that it does not
+        # compete with the transcription of the full recording
+        if speculation_id != self.speculation_id:
+            return ""
+        text = self.transcribe(
+            speech=speech, punctuate=self.punctuation_strategy == "sync"
+        )
+        if speculation_id != self.speculation_id:
+            return ""
+        if self.punctuation_strategy == "async":
+            text = self.punctuate(text=text)
+
+        # The check and the start of the response are done under the lock, so that a
+        # speculation cancelled in between cannot start a request
+        with self.speculation_lock:
+            if speculation_id != self.speculation_id:
+                return ""
+            self.text_engine.speculate(
+                prompt=text,
+                last_response_time=last_response_time,
+                current_response_time=audio_start,
+            )
+        return text
+
+    def cancel_speculation(self) -> None:
+        """Discard the speculative transcription and response."""
+        with self.speculation_lock:
+            self.speculation_id += 1
+            self.speculative_prompt = None
+            self.text_engine.cancel_speculation()
+
     def run(self) -> None:
         """Run the bot."""
         last_response_time = dt.datetime(year=1900, month=1, day=1)
@@ -85,29 +333,80 @@ class VoiceBot:
         logger.info("Playing welcome message...")
         synthesise_speech(text=self.cfg.starting_phrase, synthesiser=self.synthesiser)
 
+        wake_word_detected = False
         while True:
+            on_pause: Callable[[np.ndarray, dt.datetime], None] | None = None
+            on_resume: Callable[[], None] | None = None
+            if self.speculation_executor is not None:
+                on_pause = partial(
+                    self.start_speculation, last_response_time=last_response_time
+                )
+                on_resume = self.cancel_speculation
+
             speech, audio_start = record_speech(
                 last_response_time=last_response_time,
                 audio_threshold=self.audio_threshold,
                 cfg=self.cfg,
                 synthesiser=self.synthesiser,
-                wake_word_model=self.wake_word_model,
+                wake_word_detector=self.wake_word_detector,
+                wake_word_detected=wake_word_detected,
+                noise_floor=self.noise_floor,
+                on_pause=on_pause,
+                on_resume=on_resume,
             )
+            wake_word_detected = False
+            speculative_prompt, self.speculative_prompt = self.speculative_prompt, None
             if audio_start is None:
+                self.cancel_speculation()
                 continue
 
-            text = transcribe_speech(
-                speech=speech,
-                transcriber=self.transcriber,
-                punct_fixer=self.punct_fixer,
-                manual_fixes=self.cfg.manual_fixes,
-            )
-            if text:
+            # If the user paused and did not resume speaking, then the speech after the
+            # pause is silence, so the speculative transcription can be used as is
+            turn_start = perf_counter()
+            try:
+                if speculative_prompt is not None:
+                    text = speculative_prompt.result()
+                    logger.info("Using the speculative transcription.")
+                else:
+                    text = self.transcribe(
+                        speech=speech, punctuate=self.punctuation_strategy == "sync"
+                    )
+            except RuntimeError as e:
+                logger.error(f"Could not transcribe the speech: {e}")
+                continue
+            if not text:
+                continue
+            timings = dict(transcription=perf_counter() - turn_start)
+
+            prompt: str | Future[str] = text
+            if self.punctuation_executor is not None and speculative_prompt is None:
+                prompt = self.punctuation_executor.submit(self.punctuate, text=text)
+
+            if self.barge_in is not None:
+                self.barge_in.start()
+            try:
+                start = perf_counter()
                 response = self.text_engine.generate_response(
-                    prompt=text,
+                    prompt=prompt,
                     last_response_time=last_response_time,
                     current_response_time=audio_start,
                 )
+                timings["response"] = perf_counter() - start
                 if response:
+                    start = perf_counter()
                     synthesise_speech(text=response, synthesiser=self.synthesiser)
+                    timings["synthesis"] = perf_counter() - start
                     last_response_time = dt.datetime.now()
+            finally:
+                if self.barge_in is not None:
+                    self.barge_in.stop()
+                    wake_word_detected = self.barge_in.detected.is_set()
+
+            if self.turn_capture is not None:
+                self.turn_capture.capture(
+                    speech=speech,
+                    audio_start=audio_start,
+                    transcript=prompt,
+                    response=response,
+                    timings=timings,
+                )
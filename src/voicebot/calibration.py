@@ -0,0 +1,45 @@
+"""Calibrated thresholds for speech and wake word detection."""
+
+import logging
+from pathlib import Path
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+class CalibrationProfile(BaseModel):
+    """Thresholds calibrated offline on labelled recordings."""
+
+    audio_threshold: int
+    wake_word_thresholds: dict[str, float]
+
+    def save(self, path: str | Path) -> None:
+        """Save the profile.
+
+        Args:
+            path:
+                The path to save the profile to.
+        """
+        path = Path(path)
+        path.parent.mkdir(exist_ok=True, parents=True)
+        path.write_text(self.model_dump_json(indent=2))
+        logger.info(f"Saved the calibration profile to {path}.")
+
+
+def load_calibration_profile(path: str | Path) -> CalibrationProfile | None:
+    """Load a calibration profile, if it exists.
+
+    Args:
+        path:
+            The path to the profile.
+
+    Returns:
+        The profile, or None if there is no profile at the path.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    profile = CalibrationProfile.model_validate_json(path.read_text())
+    logger.info(f"Loaded the calibration profile from {path}: {profile}")
+    return profile
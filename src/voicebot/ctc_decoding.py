@@ -0,0 +1,160 @@
+"""Beam search decoding of the speech recognition model with a language model."""
+
+import logging
+from pathlib import Path
+
+import kenlm
+import numpy as np
+import torch
+from omegaconf import DictConfig
+from pyctcdecode import Alphabet, BeamSearchDecoderCTC, LanguageModel
+from transformers.pipelines import Pipeline
+
+from .speech_recording import SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+class BeamSearchTranscriber:
+    """Transcribes speech with a CTC beam search over the logits of a wav2vec2 model.
+
+    The beam search is scored with a KenLM language model, and can boost hotwords such
+    as the vocabulary of the tools. It is called in the same way as the speech
+    recognition pipeline, so the two can be used interchangeably.
+    """
+
+    def __init__(self, transcriber: Pipeline, cfg: DictConfig) -> None:
+        """Initialise the transcriber.
+
+        Args:
+            transcriber:
+                The speech recognition pipeline of a CTC model, whose feature extractor,
+                model and vocabulary are used.
+            cfg:
+                Hydra configuration object.
+        """
+        self.transcriber = transcriber
+        self.beam_width = int(cfg.asr_decoder.beam_width)
+        self.hotwords = list(cfg.asr_decoder.hotwords)
+        self.hotword_weight = float(cfg.asr_decoder.hotword_weight)
+
+        assert transcriber.tokenizer is not None
+        vocab = transcriber.tokenizer.get_vocab()
+        labels = [token for token, _ in sorted(vocab.items(), key=lambda item: item[1])]
+        alphabet = Alphabet.build_alphabet(labels=labels)
+
+        language_model: LanguageModel | None = None
+        if cfg.asr_decoder.kenlm_path is not None:
+            language_model = LanguageModel(
+                kenlm_model=load_kenlm_model(path=cfg.asr_decoder.kenlm_path),
+                unigrams=load_unigrams(path=cfg.asr_decoder.unigrams_path),
+                alpha=float(cfg.asr_decoder.alpha),
+                beta=float(cfg.asr_decoder.beta),
+            )
+        else:
+            logger.warning("No language model given, so the beam search is unscored.")
+        self.decoder = BeamSearchDecoderCTC(
+            alphabet=alphabet, language_model=language_model
+        )
+
+    def __call__(self, inputs: np.ndarray) -> dict[str, str]:
+        """Transcribe speech.
+
+        Args:
+            inputs:
+                The float speech, sampled at 16 kHz.
+
+        Returns:
+            A dictionary with the transcription under the "text" key, as with the
+            speech recognition pipeline.
+        """
+        return dict(text=self.decode(log_probabilities=self.log_probabilities(inputs)))
+
+    def log_probabilities(self, speech: np.ndarray) -> np.ndarray:
+        """Compute the log-probabilities of the tokens in every frame.
+
+        Args:
+            speech:
+                The float speech, sampled at 16 kHz.
+
+        Returns:
+            The log-probabilities, of shape (num_frames, vocab_size).
+        """
+        assert self.transcriber.feature_extractor is not None
+        features = self.transcriber.feature_extractor(
+            speech, sampling_rate=SAMPLE_RATE, return_tensors="pt"
+        )
+        model = self.transcriber.model
+        input_values = features.input_values.to(
+            device=self.transcriber.device, dtype=model.dtype
+        )
+        with torch.inference_mode():
+            logits = model(input_values=input_values).logits[0]
+        return torch.log_softmax(logits.float(), dim=-1).cpu().numpy()
+
+    def decode(
+        self, log_probabilities: np.ndarray, beam_width: int | None = None
+    ) -> str:
+        """Decode the log-probabilities with a beam search.
+
+        Args:
+            log_probabilities:
+                The log-probabilities, of shape (num_frames, vocab_size).
+            beam_width (optional):
+                The beam width. If None then the configured beam width is used.
+                Defaults to None.
+
+        Returns:
+            The transcription.
+        """
+        return self.decoder.decode(
+            logits=log_probabilities,
+            beam_width=beam_width or self.beam_width,
+            hotwords=self.hotwords or None,
+            hotword_weight=self.hotword_weight,
+        )
+
+
+def load_kenlm_model(path: str | Path) -> kenlm.Model:
+    """Load a KenLM language model.
+
+    Binary models are memory-mapped lazily, so only the parts of the model which are
+    used are read into memory, and the pages are shared between processes.
+
+    Args:
+        path:
+            The path to the model, preferably in the binary format created by KenLM's
+            `build_binary`.
+
+    Returns:
+        The model.
+    """
+    path = Path(path)
+    if path.suffix == ".arpa":
+        logger.warning(
+            f"The language model {path} is an ARPA file, which is parsed into memory. "
+            "Convert it with `build_binary` to memory-map it instead."
+        )
+    config = kenlm.Config()
+    config.load_method = kenlm.LoadMethod.LAZY
+    logger.info(f"Loading the language model from {path}...")
+    return kenlm.Model(str(path), config)
+
+
+def load_unigrams(path: str | Path | None) -> list[str] | None:
+    """Load the unigrams of a language model.
+
+    Binary KenLM models do not contain their vocabulary in a readable form, so the beam
+    search needs the unigrams separately to score partial words.
+
+    Args:
+        path:
+            The path to a text file with the unigrams separated by whitespace, or None
+            if there are no unigrams.
+
+    Returns:
+        The unigrams, or None if there are no unigrams.
+    """
+    if path is None:
+        return None
+    return Path(path).read_text().split()
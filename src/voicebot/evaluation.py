@@ -0,0 +1,112 @@
+"""Loading of recordings and scoring of transcriptions for the evaluation scripts."""
+
+from pathlib import Path
+
+import numpy as np
+from pydub import AudioSegment
+
+from .response_cache import normalise_prompt
+from .speech_recording import SAMPLE_RATE
+
+AUDIO_SUFFIXES = {".wav", ".flac", ".mp3", ".ogg"}
+
+
+def list_audio_files(directory: Path) -> list[Path]:
+    """List the audio files in a directory, recursively.
+
+    Args:
+        directory:
+            The directory.
+
+    Returns:
+        The audio files, sorted by path.
+    """
+    if not directory.exists():
+        return list()
+    return sorted(
+        path for path in directory.rglob("*") if path.suffix.lower() in AUDIO_SUFFIXES
+    )
+
+
+def load_samples(path: Path) -> np.ndarray:
+    """Load a recording as 16 kHz mono int16 audio.
+
+    Args:
+        path:
+            The path to the recording.
+
+    Returns:
+        The audio.
+    """
+    audio = (
+        AudioSegment.from_file(str(path))
+        .set_frame_rate(SAMPLE_RATE)
+        .set_channels(1)
+        .set_sample_width(2)
+    )
+    return np.asarray(audio.get_array_of_samples(), dtype=np.int16)
+
+
+def load_audio(path: Path) -> np.ndarray:
+    """Load a recording as 16 kHz mono float audio.
+
+    Args:
+        path:
+            The path to the recording.
+
+    Returns:
+        The audio.
+    """
+    samples = load_samples(path=path)
+    return samples.astype(np.float32) / np.iinfo(np.int16).max
+
+
+def load_frames(path: Path, chunk_size: int) -> np.ndarray:
+    """Load a recording as 16 kHz mono int16 frames.
+
+    Args:
+        path:
+            The path to the recording.
+        chunk_size:
+            The number of samples per frame.
+
+    Returns:
+        The frames, of shape (num_frames, chunk_size). Any trailing partial frame is
+        padded with silence, so that recordings shorter than a frame are kept.
+    """
+    samples = load_samples(path=path)
+    num_frames = -(-len(samples) // chunk_size)
+    samples = np.pad(samples, (0, num_frames * chunk_size - len(samples)))
+    return samples.reshape(num_frames, chunk_size)
+
+
+def word_error_rate(references: list[str], hypotheses: list[str]) -> float:
+    """Compute the word error rate, ignoring casing and punctuation.
+
+    Args:
+        references:
+            The reference transcriptions.
+        hypotheses:
+            The predicted transcriptions.
+
+    Returns:
+        The number of word edits divided by the number of reference words.
+    """
+    num_edits = 0
+    num_words = 0
+    for reference, hypothesis in zip(references, hypotheses):
+        reference_words = normalise_prompt(prompt=reference).split()
+        hypothesis_words = normalise_prompt(prompt=hypothesis).split()
+        distances = np.arange(len(hypothesis_words) + 1)
+        for i, reference_word in enumerate(reference_words, start=1):
+            previous_distances = distances.copy()
+            distances[0] = i
+            for j, hypothesis_word in enumerate(hypothesis_words, start=1):
+                distances[j] = min(
+                    previous_distances[j] + 1,
+                    distances[j - 1] + 1,
+                    previous_distances[j - 1] + (reference_word != hypothesis_word),
+                )
+        num_edits += int(distances[-1])
+        num_words += len(reference_words)
+    return num_edits / max(num_words, 1)
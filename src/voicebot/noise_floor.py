@@ -0,0 +1,98 @@
+"""Tracking of the background noise level."""
+
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class NoiseFloorTracker:
+    """Continuously updated estimate of the background noise level.
+
+    The noise floor is a running percentile of the RMS level of the frames in decibels,
+    estimated with a stochastic quantile update. This costs a single RMS computation per
+    frame, and adapts to changes in the room noise while ignoring the louder frames
+    containing speech.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        percentile: float = 0.2,
+        step_size_db: float = 0.5,
+        margin_db: float = 10.0,
+    ) -> None:
+        """Initialise the tracker, loading the persisted noise floor if it exists.
+
+        Args:
+            path:
+                The path to persist the noise floor to.
+            percentile (optional):
+                The percentile of the frame levels to track, between 0 and 1. Defaults
+                to 0.2.
+            step_size_db (optional):
+                The step size of the update, in decibels. The noise floor rises by at
+                most `percentile * step_size_db` and falls by at most `(1 - percentile)
+                * step_size_db` per frame. Defaults to 0.5.
+            margin_db (optional):
+                The margin above the noise floor at which a frame counts as speech, in
+                decibels. Defaults to 10.
+        """
+        self.path = Path(path)
+        self.percentile = percentile
+        self.step_size_db = step_size_db
+        self.margin_db = margin_db
+        self.noise_floor_db: float | None = None
+        if self.path.exists():
+            self.noise_floor_db = json.loads(self.path.read_text())["noise_floor_db"]
+            logger.info(f"Loaded the noise floor: {self.noise_floor_db:.1f} dB")
+
+    def update(self, frame: np.ndarray) -> float:
+        """Update the noise floor with a new frame.
+
+        Args:
+            frame:
+                The int16 audio frame.
+
+        Returns:
+            The RMS level of the frame.
+        """
+        samples = frame.astype(np.float32)
+        rms = float(np.sqrt(np.mean(samples * samples)))
+        level_db = 20 * np.log10(max(rms, 1.0))
+        if self.noise_floor_db is None:
+            self.noise_floor_db = level_db
+        elif level_db < self.noise_floor_db:
+            self.noise_floor_db -= (1 - self.percentile) * self.step_size_db
+        else:
+            self.noise_floor_db += self.percentile * self.step_size_db
+        return rms
+
+    @property
+    def threshold(self) -> float:
+        """The RMS level above which a frame counts as speech."""
+        return self.level(margin_db=self.margin_db)
+
+    def level(self, margin_db: float = 0.0) -> float:
+        """The RMS level a number of decibels above the noise floor.
+
+        Args:
+            margin_db (optional):
+                The margin above the noise floor, in decibels. Defaults to 0.
+
+        Returns:
+            The RMS level, or 0 if the noise floor has not been estimated yet.
+        """
+        if self.noise_floor_db is None:
+            return 0.0
+        return float(10 ** ((self.noise_floor_db + margin_db) / 20))
+
+    def save(self) -> None:
+        """Persist the noise floor."""
+        if self.noise_floor_db is None:
+            return
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        self.path.write_text(json.dumps(dict(noise_floor_db=self.noise_floor_db)))
@@ -0,0 +1,41 @@
+"""Allocation of the CPU resources to the inference engines."""
+
+import logging
+import os
+
+import torch
+from omegaconf import DictConfig
+
+logger = logging.getLogger(__name__)
+
+
+def apply_resources(resources: DictConfig) -> None:
+    """Apply the thread counts and CPU affinity of a process.
+
+    The torch thread pools are global to the process, so all the torch models in a
+    process share them. By default both torch and onnxruntime size their thread pools to
+    all the cores, which oversubscribes the CPU when several models run at once.
+
+    Args:
+        resources:
+            The resources of the process, with the number of torch intra-op and
+            inter-op threads and the CPUs to run on, each of which can be None to keep
+            the default.
+    """
+    if resources.torch_num_threads is not None:
+        torch.set_num_threads(int(resources.torch_num_threads))
+    if resources.torch_num_interop_threads is not None:
+        # This can only be set before any inter-op parallel work has been started
+        try:
+            torch.set_num_interop_threads(int(resources.torch_num_interop_threads))
+        except RuntimeError as e:
+            logger.warning(f"Could not set the number of inter-op threads: {e}")
+    if resources.cpu_affinity is not None:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, set(resources.cpu_affinity))
+        else:
+            logger.warning("CPU affinity is not supported on this platform, ignoring.")
+    logger.info(
+        f"Using {torch.get_num_threads()} intra-op and "
+        f"{torch.get_num_interop_threads()} inter-op torch threads."
+    )
@@ -0,0 +1,182 @@
+"""Caching of responses from the text engine."""
+
+import datetime as dt
+import json
+import logging
+import re
+from collections import OrderedDict
+from pathlib import Path
+
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry(BaseModel):
+    """A cached response."""
+
+    response: str
+    created_at: float
+
+
+class ResponseCache:
+    """An exact-match cache of responses, with TTL and LRU eviction.
+
+    The cache is keyed on the normalised prompt, and entries expire after a fixed time
+    to live. Prompts about the current time or date are never cached, as their
+    responses go stale within minutes. Responses that required tools are not cached
+    either, as the tools would have to be called again to check whether their outputs
+    have changed, saving little.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path,
+        ttl_seconds: float,
+        max_entries: int,
+        uncacheable_patterns: list[str],
+    ) -> None:
+        """Initialise the cache.
+
+        Args:
+            cache_dir:
+                The directory in which to persist the cache.
+            ttl_seconds:
+                The number of seconds that an entry is valid.
+            max_entries:
+                The maximum number of entries in the cache, after which the least
+                recently used entries are evicted.
+            uncacheable_patterns:
+                Regular expressions matching the normalised prompts which should never
+                be cached, such as questions about the current time.
+        """
+        self.path = Path(cache_dir) / "responses.json"
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.uncacheable_patterns = [
+            re.compile(pattern) for pattern in uncacheable_patterns
+        ]
+        self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.load()
+
+    def get(self, prompt: str, now: dt.datetime | None = None) -> CacheEntry | None:
+        """Get a cached response.
+
+        Args:
+            prompt:
+                The prompt to get the response for.
+            now (optional):
+                The current time. If None then the current time is used. Defaults to
+                None.
+
+        Returns:
+            The cache entry, or None if the prompt is not cached.
+        """
+        if now is None:
+            now = dt.datetime.now()
+        key = normalise_prompt(prompt=prompt)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if now.timestamp() - entry.created_at > self.ttl_seconds:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def is_cacheable(self, prompt: str) -> bool:
+        """Check whether the response to a prompt may be cached.
+
+        Args:
+            prompt:
+                The prompt.
+
+        Returns:
+            Whether the prompt does not match any of the uncacheable patterns.
+        """
+        normalised_prompt = normalise_prompt(prompt=prompt)
+        return not any(
+            pattern.search(normalised_prompt) for pattern in self.uncacheable_patterns
+        )
+
+    def put(self, prompt: str, response: str, now: dt.datetime | None = None) -> None:
+        """Store a response in the cache.
+
+        Args:
+            prompt:
+                The prompt that was responded to.
+            response:
+                The response, which must not depend on any tools.
+            now (optional):
+                The current time. If None then the current time is used. Defaults to
+                None.
+        """
+        if not self.is_cacheable(prompt=prompt):
+            return
+        if now is None:
+            now = dt.datetime.now()
+        self.purge_expired(now=now)
+        key = normalise_prompt(prompt=prompt)
+        self.entries[key] = CacheEntry(response=response, created_at=now.timestamp())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.save()
+
+    def purge_expired(self, now: dt.datetime) -> None:
+        """Remove the expired entries from the cache.
+
+        Args:
+            now:
+                The current time.
+        """
+        expired_keys = [
+            key
+            for key, entry in self.entries.items()
+            if now.timestamp() - entry.created_at > self.ttl_seconds
+        ]
+        for key in expired_keys:
+            del self.entries[key]
+
+    def load(self) -> None:
+        """Load the cache from disk, discarding expired entries."""
+        if not self.path.exists():
+            return
+        try:
+            raw_entries = json.loads(self.path.read_text(encoding="utf-8"))
+            entries = {
+                key: CacheEntry.model_validate(raw_entry)
+                for key, raw_entry in raw_entries.items()
+            }
+        except (json.JSONDecodeError, AttributeError, ValidationError):
+            logger.warning(f"Could not read the response cache at {self.path}.")
+            return
+        now = dt.datetime.now().timestamp()
+        for key, entry in entries.items():
+            if now - entry.created_at <= self.ttl_seconds:
+                self.entries[key] = entry
+
+    def save(self) -> None:
+        """Persist the cache to disk."""
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        self.path.write_text(
+            json.dumps(
+                {key: entry.model_dump() for key, entry in self.entries.items()},
+                ensure_ascii=False,
+            ),
+            encoding="utf-8",
+        )
+
+
+def normalise_prompt(prompt: str) -> str:
+    """Normalise a prompt, removing casing, punctuation and redundant whitespace.
+
+    Args:
+        prompt:
+            The prompt to normalise.
+
+    Returns:
+        The normalised prompt.
+    """
+    prompt = re.sub(r"[^\w\s]", " ", prompt.lower())
+    return re.sub(r"\s+", " ", prompt).strip()
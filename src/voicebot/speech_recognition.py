@@ -1,22 +1,119 @@
 """Transcription of speech."""
 
 import logging
+import os
+from pathlib import Path
 
 import numpy as np
 import torch
 import torch_audiomentations as ta
+from omegaconf import DictConfig
 from punctfix.inference import PunctFixer
-from transformers.pipelines import Pipeline
+from transformers.pipelines import Pipeline, pipeline
+
+from .ctc_decoding import BeamSearchTranscriber
 
 logger = logging.getLogger(__name__)
 logging.getLogger("torch._dynamo.output_graph").setLevel(logging.CRITICAL)
 
 
+def get_device() -> torch.device:
+    """Get the device to run the models on.
+
+    Returns:
+        The device.
+    """
+    if torch.cuda.is_available():
+        return torch.device("cuda")
+    elif torch.backends.mps.is_available():
+        return torch.device("mps")
+    return torch.device("cpu")
+
+
+def load_transcriber(
+    cfg: DictConfig, device: torch.device
+) -> Pipeline | BeamSearchTranscriber:
+    """Load the speech recognition model.
+
+    Args:
+        cfg:
+            Hydra configuration object.
+        device:
+            The device to load the model on.
+
+    Returns:
+        The speech recognition pipeline, or a beam search transcriber wrapping it.
+    """
+    logger.info("Loading the speech recognition model...")
+    asr_pipeline = pipeline(
+        model=cfg.asr_model_id, device=device, task="automatic-speech-recognition"
+    )
+    if cfg.warm_up.compile:
+        compile_transcriber(
+            transcriber=asr_pipeline, cache_dir=cfg.warm_up.compile_cache_dir
+        )
+    if cfg.asr_decoder.beam_search:
+        return BeamSearchTranscriber(transcriber=asr_pipeline, cfg=cfg)
+    return asr_pipeline
+
+
+def load_punct_fixer(cfg: DictConfig, device: torch.device) -> PunctFixer | None:
+    """Load the punctuation model, unless the punctuation is disabled.
+
+    Args:
+        cfg:
+            Hydra configuration object.
+        device:
+            The device to load the model on.
+
+    Returns:
+        The punctuation model, or None if the punctuation strategy is "none".
+
+    Raises:
+        ValueError:
+            If the punctuation strategy is unknown.
+    """
+    # The punctuation is either added before responding ("sync"), in parallel with the
+    # preparation of the prompt ("async"), or not at all ("none"), where the latter is
+    # meant for ASR models that punctuate themselves
+    strategy = str(cfg.punctuation.strategy)
+    if strategy not in {"sync", "async", "none"}:
+        raise ValueError(f"Unknown punctuation strategy {strategy!r}.")
+    if strategy == "none":
+        return None
+    logger.info("Loading the punctfix model...")
+    return PunctFixer(language="da", device=device)
+
+
+def compile_transcriber(transcriber: Pipeline, cache_dir: str | Path) -> None:
+    """Compile the speech recognition model with `torch.compile`.
+
+    The compiled kernels are stored in the cache directory, so only the first run after
+    a model or torch upgrade pays the full compilation cost.
+
+    Args:
+        transcriber:
+            The speech recognition pipeline. Its model is replaced in place.
+        cache_dir:
+            The directory to cache the compiled kernels in.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(exist_ok=True, parents=True)
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(cache_dir.resolve()))
+    os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+
+    # The utterances vary in length, so we compile with dynamic shapes to avoid
+    # recompiling for every new length
+    transcriber.model = torch.compile(transcriber.model, dynamic=True)
+    logger.info(f"Compiling the speech recognition model, cached in {cache_dir}.")
+
+
 def transcribe_speech(
     speech: np.ndarray,
-    transcriber: Pipeline,
-    punct_fixer: PunctFixer,
+    transcriber: Pipeline | BeamSearchTranscriber,
+    punct_fixer: PunctFixer | None,
     manual_fixes: dict[str, str],
+    min_punctuation_words: int = 0,
 ) -> str:
     """Transcribe speech.
 
@@ -24,11 +121,16 @@ def transcribe_speech(
         speech:
             Speech to transcribe.
         transcriber:
-            Pipeline for automatic speech recognition.
+            Pipeline for automatic speech recognition, or a beam search transcriber
+            wrapping it.
         punct_fixer:
-            Punctuator to fix punctuation in the transcription.
+            Punctuator to fix punctuation in the transcription, or None to skip the
+            punctuation.
         manual_fixes:
             Manual fixes for the transcription output.
+        min_punctuation_words (optional):
+            The minimum number of words in the transcription for it to be punctuated.
+            Defaults to 0.
 
     Returns:
         Transcribed speech.
@@ -51,6 +153,32 @@ def transcribe_speech(
         if before in transcription:
             logger.info(f"Fixing {before!r} to {after!r} in the transcription.")
             transcription = transcription.replace(before, after)
-    transcription = punct_fixer.punctuate(text=transcription)
+    transcription = punctuate(
+        text=transcription, punct_fixer=punct_fixer, min_words=min_punctuation_words
+    )
     logger.info(f"Heard the following: {transcription!r}")
     return transcription
+
+
+def punctuate(text: str, punct_fixer: PunctFixer | None, min_words: int = 0) -> str:
+    """Punctuate a transcription.
+
+    Short transcriptions, such as follow-up answers, are left as they are, as the
+    punctuation rarely changes how the text engine understands them.
+
+    Args:
+        text:
+            The transcription to punctuate.
+        punct_fixer:
+            Punctuator to fix punctuation in the transcription, or None to skip the
+            punctuation.
+        min_words (optional):
+            The minimum number of words in the transcription for it to be punctuated.
+            Defaults to 0.
+
+    Returns:
+        The punctuated transcription.
+    """
+    if punct_fixer is None or len(text.split()) < min_words or not text.strip():
+        return text
+    return punct_fixer.punctuate(text=text)
@@ -2,20 +2,25 @@
 
 import datetime as dt
 import logging
-from collections.abc import Generator
+import threading
+from collections.abc import Callable, Generator
 from contextlib import contextmanager
 from time import sleep
+from typing import TYPE_CHECKING
 
 import numpy as np
-import onnxruntime as ort
-import openwakeword as oww
 import sounddevice
-from chatterbox.mtl_tts import ChatterboxMultilingualTTS
+from numpy.lib.stride_tricks import sliding_window_view
 from omegaconf import DictConfig
-from openwakeword.utils import download_models as download_wakeword_models
 from pvrecorder import PvRecorder
 
+from .audio_output import get_audio_output, get_sound_bank
+from .noise_floor import NoiseFloorTracker
 from .speech_synthesis import synthesise_speech
+from .wake_word import WakeWordDetector
+
+if TYPE_CHECKING:
+    from chatterbox.mtl_tts import ChatterboxMultilingualTTS
 
 logger = logging.getLogger(__name__)
 
@@ -23,19 +28,16 @@ logger = logging.getLogger(__name__)
 SAMPLE_RATE = 16_000
 
 
-# Load the wake word model. This usually produces logs from `onnxruntime`, so we
-# suppress them.
-ort.set_default_logger_severity(3)
-download_wakeword_models(model_names=["hey_jarvis"])
-wake_word_model = oww.Model(wakeword_models=["hey_jarvis"], inference_framework="onnx")
-
-
 def record_speech(
     last_response_time: dt.datetime,
     audio_threshold: int,
-    wake_word_model: oww.Model,
-    synthesiser: ChatterboxMultilingualTTS | None,
+    wake_word_detector: WakeWordDetector,
+    synthesiser: "ChatterboxMultilingualTTS | None",
     cfg: DictConfig,
+    wake_word_detected: bool = False,
+    noise_floor: NoiseFloorTracker | None = None,
+    on_pause: Callable[[np.ndarray, dt.datetime], None] | None = None,
+    on_resume: Callable[[], None] | None = None,
 ) -> tuple[np.ndarray, dt.datetime | None]:
     """Record speech and return it as text.
 
@@ -44,74 +46,115 @@ def record_speech(
             Time of the last response.
         audio_threshold:
             The minimum audio threshold.
-        wake_word_model:
-            The wake word detection model.
+        wake_word_detector:
+            The wake word detector.
         synthesiser:
             The speech synthesiser, or None to use the MacOS `say` command.
         cfg:
             Hydra configuration object.
+        wake_word_detected (optional):
+            Whether the wake word has already been detected, e.g. while the bot was
+            speaking, in which case we start recording right away. Defaults to False.
+        noise_floor (optional):
+            A tracker of the background noise level. If given, then a frame counts as
+            speech if its RMS level is above the tracked threshold, instead of if its
+            peak is above `audio_threshold`. Defaults to None.
+        on_pause (optional):
+            A function called with the speech so far and the time the recording started
+            when the user pauses for `cfg.speculation.pause_seconds`, which is shorter
+            than the silence ending the recording. It is called from the recording
+            loop, so it must not block. Defaults to None.
+        on_resume (optional):
+            A function called when the user resumes speaking after such a pause.
+            Defaults to None.
 
     Returns:
         Recorded speech, and the time at which the recording started (or None if no
         speech was recorded).
     """
-    rng = np.random.default_rng()
     chunk_size = int(SAMPLE_RATE * cfg.num_seconds_per_chunk)
 
-    logger.info("Listening for wakeword...")
+    # Any previous interruption of the audio output is over now
+    get_audio_output().resume()
 
     has_begun_talking: bool = False
     audio_start: dt.datetime | None = None
     num_silent_frames: int = 0
     frames_left_to_ignore: int = 0
     frames: list[np.ndarray] = list()
+    has_spoken: bool = False
+    num_pause_frames = int(cfg.speculation.pause_seconds // cfg.num_seconds_per_chunk)
+
+    if wake_word_detected:
+        logger.info("Wakeword detected while speaking!")
+        acknowledge_wake_word(synthesiser=synthesiser, cfg=cfg)
+        frames_left_to_ignore = int(cfg.wake_word_seconds // cfg.num_seconds_per_chunk)
+        audio_start = dt.datetime.now()
+        has_begun_talking = True
+    else:
+        logger.info("Listening for wakeword...")
 
     with record(chunk_size=chunk_size) as recorder:
         while num_silent_frames < cfg.max_seconds_silence // cfg.num_seconds_per_chunk:
             frame = np.asarray(recorder.read(), dtype=np.int16)
-            max_value = frame[~np.isnan(frame)].max()
             if frames_left_to_ignore > 0:
                 frames_left_to_ignore -= 1
                 continue
 
+            if noise_floor is not None:
+                is_loud = noise_floor.update(frame=frame) >= noise_floor.threshold
+            else:
+                is_loud = frame[~np.isnan(frame)].max() >= audio_threshold
+
             if not has_begun_talking:
                 # Check if it hasn't been too long since the last response
-                if max_value >= audio_threshold:
+                if is_loud:
                     response_delay = dt.datetime.now() - last_response_time
                     seconds_since_last_response = response_delay.total_seconds()
                     if seconds_since_last_response < cfg.follow_up_max_seconds:
                         logger.info("Follow-up detected!")
                         audio_start = dt.datetime.now()
                         has_begun_talking = True
+                        has_spoken = True
                         num_silent_frames = 0
                         frames.append(frame)
-                        wake_word_model.reset()
+                        wake_word_detector.reset()
                         continue
 
                 # Check if the wake_word is triggered
-                wake_word_prediction_dict = wake_word_model.predict(x=frame)
-                assert isinstance(wake_word_prediction_dict, dict)
-                wake_word_probability = wake_word_prediction_dict["hey_jarvis"]
-                if wake_word_probability >= cfg.wake_word_probability_threshold:
-                    logger.info("Wakeword detected!")
-                    wake_word_response = rng.choice(cfg.wake_word_responses)
-                    synthesise_speech(text=wake_word_response, synthesiser=synthesiser)
+                wake_word = wake_word_detector.process(frame=frame)
+                if wake_word is not None:
+                    logger.info(f"Wakeword {wake_word!r} detected!")
+                    acknowledge_wake_word(synthesiser=synthesiser, cfg=cfg)
                     frames_left_to_ignore = (
                         cfg.wake_word_seconds // cfg.num_seconds_per_chunk
                     )
                     audio_start = dt.datetime.now()
                     has_begun_talking = True
                     num_silent_frames = 0
-                    wake_word_model.reset()
+                    wake_word_detector.reset()
             else:
                 frames.append(frame)
                 if len(frames) * cfg.num_seconds_per_chunk >= cfg.max_seconds_audio:
                     logger.info("Max audio length reached, stopping.")
                     break
-                if max_value < audio_threshold:
-                    num_silent_frames += 1
-                else:
+                if is_loud:
+                    if on_resume is not None and num_silent_frames >= num_pause_frames:
+                        on_resume()
                     num_silent_frames = 0
+                    has_spoken = True
+                else:
+                    num_silent_frames += 1
+                    if (
+                        on_pause is not None
+                        and has_spoken
+                        and num_silent_frames == num_pause_frames
+                    ):
+                        assert audio_start is not None
+                        on_pause(np.concatenate(frames, axis=0), audio_start)
+
+    if noise_floor is not None:
+        noise_floor.save()
 
     audio_arr = np.concatenate(frames, axis=0)
 
@@ -122,6 +165,24 @@ def record_speech(
     return audio_arr, audio_start
 
 
+def acknowledge_wake_word(
+    synthesiser: "ChatterboxMultilingualTTS | None", cfg: DictConfig
+) -> None:
+    """Let the user know that the wake word has been detected.
+
+    Args:
+        synthesiser:
+            The speech synthesiser, or None to use the MacOS `say` command.
+        cfg:
+            Hydra configuration object.
+    """
+    if cfg.wake_word_beep:
+        get_sound_bank().play(name="wake_word")
+    else:
+        wake_word_response = np.random.default_rng().choice(cfg.wake_word_responses)
+        synthesise_speech(text=wake_word_response, synthesiser=synthesiser)
+
+
 def calibrate_audio_threshold(cfg: DictConfig) -> int:
     """Calibrate the audio threshold.
 
@@ -164,6 +225,149 @@ def calibrate_audio_threshold(cfg: DictConfig) -> int:
     return audio_threshold
 
 
+class EchoCanceller:
+    """Acoustic echo canceller, removing the bot's own speech from the microphone.
+
+    This is a block normalised least mean squares (NLMS) adaptive filter, estimating
+    the echo of the played audio in the recorded audio.
+    """
+
+    def __init__(
+        self, num_taps: int, step_size: float = 0.1, block_size: int = 160
+    ) -> None:
+        """Initialise the echo canceller.
+
+        Args:
+            num_taps:
+                The length of the adaptive filter, in samples. This should cover the
+                echo path, i.e., the delay and reverberation of the room.
+            step_size (optional):
+                The step size of the filter adaptation. Defaults to 0.1.
+            block_size (optional):
+                The number of samples per filter update. Defaults to 160, i.e., 10 ms.
+        """
+        self.num_taps = num_taps
+        self.step_size = step_size
+        self.block_size = block_size
+        self.weights = np.zeros(num_taps, dtype=np.float32)
+
+    def cancel(self, frame: np.ndarray, reference: np.ndarray) -> np.ndarray:
+        """Remove the echo of the reference signal from a recorded frame.
+
+        Args:
+            frame:
+                The recorded int16 frame.
+            reference:
+                The played float32 audio, aligned such that its last sample coincides
+                with the last sample of the frame. Must have `num_taps - 1` more samples
+                than the frame.
+
+        Returns:
+            The int16 frame with the echo removed.
+        """
+        if not reference.any():
+            return frame
+
+        recorded = frame.astype(np.float32) / np.iinfo(np.int16).max
+        windows = sliding_window_view(reference, window_shape=self.num_taps)[:, ::-1]
+        cleaned = np.empty_like(recorded)
+        for start in range(0, len(recorded), self.block_size):
+            block_windows = windows[start : start + self.block_size]
+            error = recorded[start : start + self.block_size] - (
+                block_windows @ self.weights
+            )
+            power = np.sum(block_windows * block_windows) + 1e-6
+            self.weights += self.step_size * (block_windows.T @ error) / power
+            cleaned[start : start + self.block_size] = error
+
+        cleaned *= np.iinfo(np.int16).max
+        return np.clip(cleaned, -32768, 32767).astype(np.int16)
+
+
+class BargeInListener:
+    """Listens for the wake word in the background while the bot is busy.
+
+    The microphone keeps streaming while the bot is speaking, with the bot's own speech
+    removed by an echo canceller. When the wake word is detected, all playback is
+    interrupted and the `detected` event is set.
+    """
+
+    def __init__(self, wake_word_detector: WakeWordDetector, cfg: DictConfig) -> None:
+        """Initialise the listener.
+
+        Args:
+            wake_word_detector:
+                The wake word detector.
+            cfg:
+                Hydra configuration object.
+        """
+        self.wake_word_detector = wake_word_detector
+        self.cfg = cfg
+        self.detected = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.echo_canceller = EchoCanceller(num_taps=cfg.echo_canceller_taps)
+
+    def start(self) -> "BargeInListener":
+        """Start listening."""
+        self.detected.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._listen, name="barge-in-listener", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop listening, releasing the microphone."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.wake_word_detector.reset()
+
+    def _listen(self) -> None:
+        """Listen for the wake word until stopped or detected."""
+        chunk_size = int(SAMPLE_RATE * self.cfg.num_seconds_per_chunk)
+        audio_output = get_audio_output()
+        with record(chunk_size=chunk_size) as recorder:
+            while not self._stop.is_set():
+                frame = np.asarray(recorder.read(), dtype=np.int16)
+                reference = audio_output.get_reference(
+                    num_samples=chunk_size + self.echo_canceller.num_taps - 1,
+                    delay_seconds=self.cfg.echo_delay_seconds,
+                )
+                frame = self.echo_canceller.cancel(frame=frame, reference=reference)
+                wake_word = self.wake_word_detector.process(frame=frame)
+                if wake_word is not None:
+                    logger.info(f"Wakeword {wake_word!r} detected, interrupting!")
+                    audio_output.interrupt()
+                    self.detected.set()
+                    break
+
+
+@contextmanager
+def listen_for_wake_word(
+    wake_word_detector: WakeWordDetector, cfg: DictConfig
+) -> Generator[threading.Event, None, None]:
+    """Listen for the wake word in the background, e.g. while audio is playing.
+
+    Args:
+        wake_word_detector:
+            The wake word detector.
+        cfg:
+            Hydra configuration object.
+
+    Yields:
+        An event which is set when the wake word has been detected.
+    """
+    listener = BargeInListener(wake_word_detector=wake_word_detector, cfg=cfg).start()
+    try:
+        yield listener.detected
+    finally:
+        listener.stop()
+
+
 @contextmanager
 def record(chunk_size: int) -> Generator[PvRecorder, None, None]:
     """Context manager for recording audio.
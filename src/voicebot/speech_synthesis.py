@@ -1,17 +1,121 @@
 """Generation of Danish speech."""
 
-import os
+import logging
+import queue
+import shutil
+import subprocess
 import tempfile
+import threading
+from collections.abc import Callable
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import torchaudio
-from chatterbox.mtl_tts import ChatterboxMultilingualTTS
+from omegaconf import DictConfig
 from pydub import AudioSegment
-from pydub.playback import play
+
+from .audio_output import audio_segment_to_array, get_audio_output
+
+if TYPE_CHECKING:
+    import torch
+    from chatterbox.mtl_tts import ChatterboxMultilingualTTS
+
+logger = logging.getLogger(__name__)
+
+
+SYNTHESIS_PRECISIONS = {"float32", "bfloat16", "int8"}
+
+
+def load_synthesiser(
+    cfg: DictConfig, device: "torch.device"
+) -> "ChatterboxMultilingualTTS":
+    """Load the speech synthesis model.
+
+    The voice of the audio prompt is encoded once when loading, rather than on every
+    call to the model. The autoregressive T3 stage, which dominates the synthesis time,
+    runs in the precision in `cfg.speech_synthesis.precision`, which is either
+    "float32", "bfloat16" or "int8". With "bfloat16" the T3 stage runs under autocast
+    if the device supports it, and with "int8" its linear layers are dynamically
+    quantised, which is only supported on CPU. Otherwise it falls back to float32.
+
+    Args:
+        cfg:
+            Hydra configuration object.
+        device:
+            The device to load the model on.
+
+    Returns:
+        The speech synthesiser.
+
+    Raises:
+        ValueError:
+            If the precision is unknown.
+    """
+    # Only imported when the synthesiser is used, as they pull in torch
+    import torch
+    from chatterbox.mtl_tts import ChatterboxMultilingualTTS
+
+    precision = str(cfg.speech_synthesis.precision)
+    if precision not in SYNTHESIS_PRECISIONS:
+        raise ValueError(f"Unknown speech synthesis precision {precision!r}.")
+
+    logger.info("Loading the speech synthesis model...")
+    synthesiser = ChatterboxMultilingualTTS.from_pretrained(
+        device=device, repo_id=cfg.speech_synthesis.repo_id
+    )
+    synthesiser.prepare_conditionals(
+        wav_fpath=str(cfg.speech_synthesis.audio_prompt_path)
+    )
+
+    if precision == "int8" and device.type != "cpu":
+        logger.warning(
+            f"Dynamic int8 quantisation is not supported on {device.type}, using "
+            "float32 instead."
+        )
+    elif precision == "int8":
+        synthesiser.t3 = torch.ao.quantization.quantize_dynamic(
+            synthesiser.t3, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    elif precision == "bfloat16" and not is_bfloat16_supported(device=device):
+        logger.warning(
+            f"bfloat16 is not supported on this {device.type}, using float32 instead."
+        )
+    elif precision == "bfloat16":
+        # Only the T3 stage is autocast, as it outputs speech tokens, whereas the later
+        # stages output the audio, which has to stay in float32
+        synthesiser.t3.inference = torch.autocast(
+            device_type=device.type, dtype=torch.bfloat16
+        )(synthesiser.t3.inference)
+    return synthesiser
+
+
+def is_bfloat16_supported(device: "torch.device") -> bool:
+    """Check whether a device has native support for bfloat16 operations.
+
+    Args:
+        device:
+            The device to check.
+
+    Returns:
+        Whether bfloat16 is supported.
+    """
+    import torch
+
+    match device.type:
+        case "cuda":
+            return torch.cuda.is_bf16_supported()
+        case "cpu":
+            # The CPU needs the AVX-512 bfloat16 or AMX instructions to run bfloat16
+            # faster than float32
+            return bool(
+                torch.backends.mkldnn.is_available()
+                and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+            )
+        case _:
+            return False
 
 
 def synthesise_speech(
-    text: str, synthesiser: ChatterboxMultilingualTTS | None = None
+    text: str, synthesiser: "ChatterboxMultilingualTTS | None" = None
 ) -> None:
     """Synthesise speech from text.
 
@@ -22,21 +126,155 @@ def synthesise_speech(
             The speech synthesiser to use. Can be None to just use the MacOS `say`
             command.
     """
-    if synthesiser is None:
-        cleaned_text = text.replace('"', "'")
-        os.system(f'say "{cleaned_text}"')
+    # If the playback has been interrupted, e.g. by the user saying the wake word, then
+    # we skip the synthesis altogether
+    if get_audio_output().interrupted.is_set():
         return
+    audio = generate_speech(text=text, synthesiser=synthesiser)
+    if audio is not None:
+        play_audio(audio=audio)
 
-    generated_speech = synthesiser.generate(
-        text=text, language_id="da", audio_prompt_path="mic.wav"
-    )
-    with tempfile.NamedTemporaryFile(suffix=".wav") as temp_wav_file:
+
+def synthesise_speech_pipelined(
+    texts: list[str],
+    synthesiser: "ChatterboxMultilingualTTS | None" = None,
+    before_each: Callable[[], None] | None = None,
+    interrupt: threading.Event | None = None,
+) -> bool:
+    """Synthesise and play several texts, synthesising the next while playing.
+
+    All the texts are submitted to a synthesis worker up front, and playback consumes
+    the synthesised audio as soon as it is ready, so the gap between consecutive texts
+    is only the time it takes to run `before_each`.
+
+    Args:
+        texts:
+            The texts to be spoken, in order.
+        synthesiser (optional):
+            The speech synthesiser to use. Can be None to use the MacOS `say` command.
+            Defaults to None.
+        before_each (optional):
+            A function to call before playing each text, such as a chime. Defaults to
+            None.
+        interrupt (optional):
+            An event which stops the playback and synthesis when set. If None then the
+            interruption event of the audio output is used. Defaults to None.
+
+    Returns:
+        Whether all the texts were played without being interrupted.
+    """
+    if interrupt is None:
+        interrupt = get_audio_output().interrupted
+    audio_queue: queue.Queue[AudioSegment | None] = queue.Queue()
+
+    # Set when the playback has stopped, as the interruption event may be cleared by the
+    # caller before the worker has noticed it
+    stopped = threading.Event()
+
+    def synthesise_all() -> None:
+        for text in texts:
+            if stopped.is_set() or interrupt.is_set():
+                break
+            try:
+                audio = generate_speech(text=text, synthesiser=synthesiser)
+                if audio is not None:
+                    audio_queue.put(audio)
+            except Exception as e:
+                logger.error(f"Could not synthesise {text!r}: {e}")
+        audio_queue.put(None)
+
+    worker = threading.Thread(target=synthesise_all, name="synthesis", daemon=True)
+    worker.start()
+
+    try:
+        while not interrupt.is_set():
+            try:
+                audio = audio_queue.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            if audio is None:
+                return True
+            if before_each is not None:
+                before_each()
+            play_audio(audio=audio, interrupt=interrupt)
+    finally:
+        stopped.set()
+
+    # Discard the audio which has already been synthesised, so that it can be freed
+    while not audio_queue.empty():
+        audio_queue.get_nowait()
+    logger.info("The playback was interrupted.")
+    return False
+
+
+def generate_speech(
+    text: str, synthesiser: "ChatterboxMultilingualTTS | None" = None
+) -> AudioSegment | None:
+    """Generate speech from text, without playing it.
+
+    Args:
+        text:
+            Text to be spoken.
+        synthesiser (optional):
+            The speech synthesiser to use. Can be None to use the MacOS `say` command.
+            Defaults to None.
+
+    Returns:
+        The generated speech, or None if the `say` command is not available or failed.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if synthesiser is None:
+            # The `say` command only exists on MacOS, and elsewhere the speech is
+            # skipped rather than crashing the bot
+            if shutil.which("say") is None:
+                logger.warning(
+                    f"The `say` command is not available, not saying {text!r}."
+                )
+                return None
+            audio_path = Path(temp_dir, "speech.aiff")
+            try:
+                subprocess.run(["say", "-o", str(audio_path), text], check=True)
+            except (OSError, subprocess.CalledProcessError) as e:
+                logger.error(f"Could not say {text!r}: {e}")
+                return None
+            return AudioSegment.from_file(str(audio_path), format="aiff")
+
+        # Only imported when the synthesiser is used, as it pulls in torch
+        import torchaudio
+
+        # The voice of the audio prompt has already been encoded when loading the model
+        generated_speech = synthesiser.generate(text=text, language_id="da")
+        audio_path = Path(temp_dir, "speech.wav")
         torchaudio.save(
-            uri=temp_wav_file.name,
-            src=generated_speech.cpu(),
-            sample_rate=synthesiser.sr,
+            uri=str(audio_path), src=generated_speech.cpu(), sample_rate=synthesiser.sr
         )
-        play_sound(path=temp_wav_file.name)
+        return AudioSegment.from_wav(str(audio_path))
+
+
+def play_audio(audio: AudioSegment, interrupt: threading.Event | None = None) -> bool:
+    """Play audio, stopping early if interrupted.
+
+    Args:
+        audio:
+            The audio to play.
+        interrupt (optional):
+            An event which stops the playback when set. If None then the interruption
+            event of the audio output is used. Defaults to None.
+
+    Returns:
+        Whether the audio was played without being interrupted.
+    """
+    audio_output = get_audio_output()
+    if interrupt is None:
+        interrupt = audio_output.interrupted
+    voice = audio_output.play(
+        samples=audio_segment_to_array(audio=audio), sample_rate=audio.frame_rate
+    )
+    while not voice.done.wait(timeout=0.02):
+        if interrupt.is_set():
+            voice.stop()
+            return False
+    return not interrupt.is_set()
 
 
 def play_sound(path: str | Path) -> None:
@@ -53,4 +291,4 @@ def play_sound(path: str | Path) -> None:
             audio = AudioSegment.from_mp3(str(path))
         case _:
             raise ValueError(f"Unknown file extension: {path.suffix!r}")
-    play(audio)
+    play_audio(audio=audio)
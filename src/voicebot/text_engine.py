@@ -5,11 +5,15 @@ import json
 import logging
 import os
 import re
+import threading
+from concurrent.futures import Future
+from time import perf_counter
 
 import openai
 from dotenv import load_dotenv
 from omegaconf import DictConfig, OmegaConf
 from openai.types.responses import (
+    Response,
     ResponseInputItemParam,
     ResponseOutputMessage,
     ResponseOutputRefusal,
@@ -17,6 +21,7 @@ from openai.types.responses import (
 )
 
 from . import tools as tool_module
+from .response_cache import ResponseCache
 from .utils import MONTHS, WEEKDAYS
 
 load_dotenv()
@@ -41,9 +46,76 @@ class TextEngine:
         self.tools: list[dict] = OmegaConf.to_object(self.cfg.tools)  # type: ignore[bad-assignment]
         self.state: dict = dict()
 
+        # Set when the user interrupts the bot, which aborts the current generation
+        self.interrupt = threading.Event()
+
+        # The speculative first request, started before the user has finished speaking
+        self.speculation: Speculation | None = None
+        self.num_speculations = 0
+        self.num_speculation_hits = 0
+        self.speculation_seconds_saved = 0.0
+
+        self.response_cache: ResponseCache | None = None
+        if cfg.response_cache.enabled:
+            self.response_cache = ResponseCache(
+                cache_dir=cfg.response_cache.cache_dir,
+                ttl_seconds=cfg.response_cache.ttl_seconds,
+                max_entries=cfg.response_cache.max_entries,
+                uncacheable_patterns=list(cfg.response_cache.uncacheable_patterns),
+            )
+
+    def build_system_messages(
+        self, now: dt.datetime | None = None
+    ) -> list[ResponseInputItemParam]:
+        """Build the system messages that start a new conversation.
+
+        The static system prompt comes first and never changes, so that the inference
+        server can reuse its prefix cache across conversations. The current date and
+        time is put in a separate message after it.
+
+        Args:
+            now (optional):
+                The current time. If None then the current time is used. Defaults to
+                None.
+
+        Returns:
+            The system messages.
+        """
+        if now is None:
+            now = dt.datetime.now()
+        dynamic_system_prompt = self.cfg.dynamic_system_prompt.strip().format(
+            weekday=WEEKDAYS[now.weekday()],
+            day=now.day,
+            month=MONTHS[now.month - 1],
+            year=now.year,
+            time=now.strftime("%H:%M"),
+        )
+        return [
+            dict(role="system", content=self.cfg.system_prompt.strip()),
+            dict(role="system", content=dynamic_system_prompt),
+        ]
+
+    def warm_up(self) -> None:
+        """Prime the prefix cache of the inference server.
+
+        This sends a minimal request consisting of the static system prompt and the
+        tools, so that the first real conversation does not have to process these.
+        """
+        logger.info("Warming up the text engine...")
+        try:
+            self.client.responses.create(  # pyrefly: ignore[no-matching-overload]
+                model=str(self.cfg.text_model_id),
+                input=[dict(role="system", content=self.cfg.system_prompt.strip())],
+                temperature=float(self.cfg.temperature),
+                tools=self.tools,
+                max_output_tokens=16,
+            )
+        except openai.OpenAIError as e:
+            logger.warning(f"Could not warm up the text engine: {e}")
+
     def generate_response(
         self,
-        prompt: str,
+        prompt: str | Future[str],
         last_response_time: dt.datetime,
         current_response_time: dt.datetime,
     ) -> str | None:
@@ -51,7 +123,9 @@ class TextEngine:
 
         Args:
             prompt:
-                Prompt to generate a response from.
+                Prompt to generate a response from. This can also be a future of the
+                prompt, such as when the transcription is still being punctuated, in
+                which case the rest of the request is prepared while waiting for it.
             last_response_time:
                 Time of the last response.
             current_response_time:
@@ -60,38 +134,62 @@ class TextEngine:
         Returns:
             Generated response, or None if prompt should not be responded to.
         """
+        is_new_conversation = self.is_new_conversation(
+            last_response_time=last_response_time,
+            current_response_time=current_response_time,
+        )
+
+        # The time in the system messages is when the user started speaking, which is
+        # the same for the speculative request, so that the speculation is not
+        # discarded just because the time crossed a minute in between
+        system_messages = (
+            self.build_system_messages(now=current_response_time)
+            if is_new_conversation
+            else list()
+        )
+
+        if isinstance(prompt, Future):
+            prompt = prompt.result()
+
         if len(prompt.strip()) <= self.cfg.min_prompt_length:
             logger.info("The prompt is too short, ignoring it.")
+            self.cancel_speculation()
             return None
 
         logger.info(f"Generating a response from the prompt: {prompt!r}...")
+        if is_new_conversation:
+            self.conversation = system_messages
 
-        response_delay = current_response_time - last_response_time
-        seconds_since_last_response = response_delay.total_seconds()
-        if seconds_since_last_response > self.cfg.follow_up_max_seconds:
-            system_prompt = self.cfg.system_prompt.strip().format(
-                weekday=WEEKDAYS[dt.datetime.now().weekday()],
-                day=dt.datetime.now().day,
-                month=MONTHS[dt.datetime.now().month - 1],
-                year=dt.datetime.now().year,
-                time=dt.datetime.now().strftime("%H:%M"),
-            )
-            self.conversation = [dict(role="system", content=system_prompt)]
+        # Follow-up prompts depend on the conversation, so we only use the cache for
+        # new conversations
+        use_cache = self.response_cache is not None and is_new_conversation
+        if use_cache:
+            cached_answer = self.get_cached_response(prompt=prompt)
+            if cached_answer is not None:
+                self.conversation.append(dict(role="user", content=prompt))
+                self.conversation.append(
+                    self.build_assistant_message(text=cached_answer)  # pyrefly: ignore
+                )
+                logger.info(f"Using the cached response: {cached_answer!r}")
+                self.cancel_speculation()
+                return cached_answer
 
+        # If the user interrupts the bot then the unanswered turn is removed from the
+        # conversation again
+        turn_start = len(self.conversation)
         self.conversation.append(dict(role="user", content=prompt))
 
-        llm_answer = (
-            self.client.responses.create(  # pyrefly: ignore[no-matching-overload]
-                model=str(self.cfg.text_model_id),
-                input=self.conversation,
-                temperature=float(self.cfg.temperature),
-                tools=self.tools,
-            )
-        )
+        llm_answer = self.take_speculative_response(conversation=self.conversation)
+        if llm_answer is None:
+            llm_answer = self.create_response(conversation=self.conversation)
+        if llm_answer is None:
+            del self.conversation[turn_start:]
+            return None
         self.conversation.extend(llm_answer.output)
 
         # Call any tools that were requested
         needs_followup = False
+        used_tools = False
         for item in llm_answer.output:
             if item.type == "function_call":
                 arguments = {
@@ -99,21 +197,8 @@ class TextEngine:
                     for key, value in json.loads(item.arguments).items()
                     if key != ""
                 }
-                logger.info(
-                    f"Using the tool {item.name!r} with parameters {arguments!r}..."
-                )
-                try:
-                    tool_response, self.state = getattr(tool_module, item.name)(
-                        state=self.state, **arguments
-                    )
-                except TypeError as e:
-                    logger.error(f"Error calling tool {item.name!r}: {e}")
-                    logger.info(
-                        f"Trying to use the tool {item.name!r} without arguments..."
-                    )
-                    tool_response, self.state = getattr(tool_module, item.name)(
-                        state=self.state
-                    )
+                tool_response = self.call_tool(name=item.name, arguments=arguments)
+                used_tools = True
 
                 if tool_response:
                     logger.info(f"Tool {item.name!r} response: {tool_response!r}")
@@ -126,33 +211,21 @@ class TextEngine:
                         )
                     )
                 else:
-                    final_response = ResponseOutputMessage(
-                        id="",
-                        role="assistant",
-                        type="message",
-                        status="completed",
-                        content=[
-                            ResponseOutputText(
-                                type="output_text", annotations=[], logprobs=[], text=""
-                            )
-                        ],
-                    )
+                    final_response = self.build_assistant_message(text="")
                     self.conversation.append(final_response)  # pyrefly: ignore
 
         # If we called a tool, we need to call the LLM again to get the final response
         if needs_followup:
-            llm_answer = (
-                self.client.responses.create(  # pyrefly: ignore[no-matching-overload]
-                    model=self.cfg.text_model_id,
-                    input=self.conversation,
-                    instructions=(
-                        "Respond only with an answer to the user's question, based on "
-                        "the information provided by the tools."
-                    ),
-                    temperature=self.cfg.temperature,
-                    tools=self.tools,
-                )
+            # We add the instructions at the end rather than using the `instructions`
+            # argument, as the latter is prepended to the conversation and would thus
+            # invalidate the prefix cache
+            llm_answer = self.create_response(
+                conversation=self.conversation
+                + [dict(role="system", content=self.cfg.follow_up_instructions.strip())]
             )
+            if llm_answer is None:
+                del self.conversation[turn_start:]
+                return None
             self.conversation.extend(llm_answer.output)
 
         # Extract the final answer
@@ -180,5 +253,270 @@ class TextEngine:
 
         if final_answer:
             logger.info(f"Generated the response: {final_answer!r}")
+            if use_cache and not used_tools and self.response_cache is not None:
+                self.response_cache.put(prompt=prompt, response=final_answer)
 
         return final_answer
+
+    def is_new_conversation(
+        self, last_response_time: dt.datetime, current_response_time: dt.datetime
+    ) -> bool:
+        """Check whether a prompt starts a new conversation rather than following up.
+
+        Args:
+            last_response_time:
+                Time of the last response.
+            current_response_time:
+                Time of the current response.
+
+        Returns:
+            Whether the prompt starts a new conversation.
+        """
+        response_delay = current_response_time - last_response_time
+        return response_delay.total_seconds() > self.cfg.follow_up_max_seconds
+
+    def speculate(
+        self,
+        prompt: str,
+        last_response_time: dt.datetime,
+        current_response_time: dt.datetime,
+    ) -> None:
+        """Start the first request for a prompt before the user has finished speaking.
+
+        Only the first request is sent speculatively, as the tools can have side
+        effects, and the conversation is left untouched. If `generate_response` is later
+        called with the same conversation, then it uses the speculative response
+        instead of sending the request again.
+
+        Args:
+            prompt:
+                The prompt so far.
+            last_response_time:
+                Time of the last response.
+            current_response_time:
+                Time of the current response.
+        """
+        self.cancel_speculation()
+        if len(prompt.strip()) <= self.cfg.min_prompt_length:
+            return
+        is_new_conversation = self.is_new_conversation(
+            last_response_time=last_response_time,
+            current_response_time=current_response_time,
+        )
+        conversation = (
+            self.build_system_messages(now=current_response_time)
+            if is_new_conversation
+            else list(self.conversation)
+        )
+        conversation.append(dict(role="user", content=prompt))
+        logger.info(f"Speculatively generating a response to {prompt!r}...")
+        self.speculation = Speculation(text_engine=self, conversation=conversation)
+        self.num_speculations += 1
+
+    def cancel_speculation(self) -> None:
+        """Cancel the speculative request, if any."""
+        if self.speculation is not None:
+            self.speculation.cancel()
+            self.speculation = None
+
+    def take_speculative_response(
+        self, conversation: list[ResponseInputItemParam]
+    ) -> Response | None:
+        """Get the speculative response to a conversation, if there is one.
+
+        Args:
+            conversation:
+                The conversation to respond to.
+
+        Returns:
+            The speculative response, or None if there is no speculative request for
+            the conversation or it failed.
+        """
+        speculation = self.speculation
+        self.speculation = None
+        if speculation is None:
+            return None
+        if speculation.conversation != conversation:
+            speculation.cancel()
+            return None
+
+        needed_at = perf_counter()
+        while not speculation.done.wait(timeout=0.02):
+            if self.interrupt.is_set():
+                speculation.cancel()
+                return None
+        if speculation.response is None:
+            return None
+
+        self.num_speculation_hits += 1
+        seconds_saved = min(needed_at, speculation.finished_at) - speculation.started_at
+        self.speculation_seconds_saved += seconds_saved
+        logger.info(
+            f"Used the speculative response, saving {seconds_saved:.2f} seconds. "
+            f"{self.num_speculation_hits}/{self.num_speculations} speculations have "
+            f"been used, saving {self.speculation_seconds_saved:.2f} seconds in total."
+        )
+        return speculation.response
+
+    def create_response(
+        self,
+        conversation: list[ResponseInputItemParam],
+        interrupt: threading.Event | None = None,
+    ) -> Response | None:
+        """Get a response from the LLM, aborting if the engine is interrupted.
+
+        The response is streamed in a background thread, so that an interruption can
+        close the connection right away, even while waiting for the first token.
+
+        Args:
+            conversation:
+                The conversation to respond to.
+            interrupt (optional):
+                An event which aborts the request when set. If None then the interrupt
+                event of the engine is used. Defaults to None.
+
+        Returns:
+            The response, or None if the engine was interrupted.
+
+        Raises:
+            openai.OpenAIError:
+                If the request failed.
+        """
+        stream = self.client.responses.create(  # pyrefly: ignore[no-matching-overload]
+            model=str(self.cfg.text_model_id),
+            input=conversation,
+            temperature=float(self.cfg.temperature),
+            tools=self.tools,
+            stream=True,
+        )
+        responses: list[Response] = list()
+        errors: list[Exception] = list()
+        done = threading.Event()
+
+        def consume() -> None:
+            try:
+                for event in stream:
+                    if event.type == "response.completed":
+                        responses.append(event.response)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                done.set()
+
+        if interrupt is None:
+            interrupt = self.interrupt
+        threading.Thread(target=consume, name="llm-stream", daemon=True).start()
+        while not done.wait(timeout=0.02):
+            if interrupt.is_set():
+                logger.info("Interrupted, aborting the response generation.")
+                stream.close()
+                return None
+
+        if errors:
+            raise errors[0]
+        if not responses:
+            raise openai.OpenAIError("The response stream ended without a response.")
+        return responses[0]
+
+    def call_tool(self, name: str, arguments: dict) -> str:
+        """Call a tool, updating the state of the engine.
+
+        Args:
+            name:
+                The name of the tool.
+            arguments:
+                The arguments to call the tool with.
+
+        Returns:
+            The response from the tool, or an empty string if the tool has already
+            responded to the user directly.
+        """
+        logger.info(f"Using the tool {name!r} with parameters {arguments!r}...")
+        try:
+            tool_response, self.state = getattr(tool_module, name)(
+                state=self.state, **arguments
+            )
+        except TypeError as e:
+            logger.error(f"Error calling tool {name!r}: {e}")
+            logger.info(f"Trying to use the tool {name!r} without arguments...")
+            tool_response, self.state = getattr(tool_module, name)(state=self.state)
+        return tool_response
+
+    def get_cached_response(self, prompt: str) -> str | None:
+        """Get a cached response to a prompt, if it is still valid.
+
+        Args:
+            prompt:
+                The prompt to get the response for.
+
+        Returns:
+            The cached response, or None if there is no valid cached response.
+        """
+        if self.response_cache is None:
+            return None
+        cache_entry = self.response_cache.get(prompt=prompt)
+        if cache_entry is None:
+            return None
+        return cache_entry.response
+
+    @staticmethod
+    def build_assistant_message(text: str) -> ResponseOutputMessage:
+        """Build an assistant message to add to the conversation.
+
+        Args:
+            text:
+                The text of the message.
+
+        Returns:
+            The assistant message.
+        """
+        return ResponseOutputMessage(
+            id="",
+            role="assistant",
+            type="message",
+            status="completed",
+            content=[
+                ResponseOutputText(
+                    type="output_text", annotations=[], logprobs=[], text=text
+                )
+            ],
+        )
+
+
+class Speculation:
+    """A request to the LLM sent in the background, before it is known to be needed."""
+
+    def __init__(
+        self, text_engine: TextEngine, conversation: list[ResponseInputItemParam]
+    ) -> None:
+        """Start the request.
+
+        Args:
+            text_engine:
+                The text engine to send the request with.
+            conversation:
+                The conversation to respond to.
+        """
+        self.conversation = conversation
+        self.response: Response | None = None
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        self.started_at = perf_counter()
+        self.finished_at = float("inf")
+
+        def request() -> None:
+            try:
+                self.response = text_engine.create_response(
+                    conversation=conversation, interrupt=self.cancelled
+                )
+            except openai.OpenAIError as e:
+                logger.warning(f"The speculative request failed: {e}")
+            finally:
+                self.finished_at = perf_counter()
+                self.done.set()
+
+        threading.Thread(target=request, name="llm-speculation", daemon=True).start()
+
+    def cancel(self) -> None:
+        """Cancel the request."""
+        self.cancelled.set()
@@ -1,7 +1,36 @@
 """Tools that the text engine can use."""
 
-from .cat import meow
-from .news import get_news
-from .timer import list_timers, set_timer, stop_timer
-from .weather import get_weather
-from .web_search import search_web
+import importlib
+
+# The tools are imported lazily, as they depend on a wide range of packages, which would
+# otherwise all be imported when using a single tool
+TOOL_MODULES = dict(
+    meow="cat",
+    get_news="news",
+    list_timers="timer",
+    set_timer="timer",
+    stop_timer="timer",
+    get_weather="weather",
+    search_web="web_search",
+)
+__all__ = list(TOOL_MODULES)
+
+
+def __getattr__(name: str) -> object:
+    """Import a tool lazily.
+
+    Args:
+        name:
+            The name of the tool.
+
+    Returns:
+        The tool.
+
+    Raises:
+        AttributeError:
+            If there is no such tool.
+    """
+    if name not in TOOL_MODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(f".{TOOL_MODULES[name]}", package=__name__)
+    return getattr(module, name)
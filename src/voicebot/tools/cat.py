@@ -1,9 +1,7 @@
 """Cat noises tool."""
 
-from pathlib import Path
-
-import httpx
-from playsound3 import playsound
+from ..audio_output import MEOW_PATH, download_meow, get_sound_bank
+from ..utils import is_internet_available
 
 
 def meow(state: dict) -> tuple[str, dict]:
@@ -17,19 +15,17 @@ def meow(state: dict) -> tuple[str, dict]:
         A tuple (message, state) where message is a message indicating the sound has
         been played and state is information that the text engine should store.
     """
-    cache_dir = Path(".cache", "cat")
-    cache_dir.mkdir(exist_ok=True, parents=True)
-    cache_path = cache_dir / "cat-sound.mp3"
-
-    if not cache_path.exists():
-        response = httpx.get("https://filedn.com/lRBwPhPxgV74tO0rDoe8SpH/cat-meow.mp3")
-        if response.status_code != 200:
-            return (
-                "Kunne desværre ikke miaue rigtigt, men her kommer et forsøg: Miaauu!",
-                state,
+    sound_bank = get_sound_bank()
+
+    # The meow sound is usually loaded at startup, but if it could not be downloaded
+    # then we try again here
+    if "meow" not in sound_bank.sounds:
+        if not is_internet_available() or not download_meow():
+            message = (
+                "Kunne desværre ikke miaue rigtigt, men her kommer et forsøg: Miaauu!"
             )
-        with open(cache_path, "wb") as f:
-            f.write(response.content)
+            return message, state
+        sound_bank.add_file(name="meow", path=MEOW_PATH)
 
-    playsound(sound=cache_path)
+    sound_bank.play(name="meow")
     return "", state
@@ -2,20 +2,30 @@
 
 import datetime as dt
 import logging
-from time import sleep
-from typing import Literal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import cache
+from time import sleep, time
 from xml.etree import ElementTree
 
-import chime
 import httpx
 from pydantic.main import BaseModel
 
-from ..speech_synthesis import synthesise_speech
+from ..audio_output import get_sound_bank
+from ..speech_synthesis import synthesise_speech, synthesise_speech_pipelined
+from ..utils import is_internet_available, report_request_outcome
 
 logger = logging.getLogger(__name__)
 
 
-def get_news(state: dict) -> tuple[Literal[""], dict]:
+NEWS_FEED_URL = "https://www.dr.dk/nyheder/service/feeds/{}"
+NEWS_CATEGORIES = ["indland", "udland", "politik"]
+NEWS_CACHE_SECONDS = 120
+NEWS_TIMEOUT_SECONDS = 5.0
+
+
+def get_news(state: dict) -> tuple[str, dict]:
     """Get the current news headlines from DR.
 
     Args:
@@ -23,67 +33,48 @@ def get_news(state: dict) -> tuple[Literal[""], dict]:
             The current state of the text engine.
 
     Returns:
-        A tuple (message, state) where message is a message indicating the news
-        have been read and state is information that the text engine should store.
+        A tuple (message, state) where message is empty if the news have been read,
+        and otherwise an error message, and state is information that the text engine
+        should store.
     """
-    all_news_items: list[NewsItem] = list()
-
-    base_url = "https://www.dr.dk/nyheder/service/feeds/{}"
-    for category in ["indland", "udland", "politik"]:
-        rss_feed = httpx.get(base_url.format(category)).text
-        root = ElementTree.fromstring(rss_feed)
-        channel = root.find("channel")
-        if channel is None:
-            continue
-
-        for item in channel.findall("item"):
-            title = item.find("title")
-            description = item.find("description")
-            pub_date = item.find("pubDate")
-            if (
-                title is None
-                or description is None
-                or pub_date is None
-                or pub_date.text is None
-            ):
-                continue
-            published_at = dt.datetime.strptime(
-                pub_date.text, "%a, %d %b %Y %H:%M:%S GMT"
-            )
-            news_item = NewsItem(
-                title=title.text or "",
-                description=description.text or "",
-                published_at=published_at,
-            )
-            all_news_items.append(news_item)
+    all_news_items = fetch_news_items()
+    if not all_news_items:
+        if not is_internet_available():
+            return "Ingen nyheder, da internettet ikke er tilgængeligt.", state
+        return "Ingen nyheder tilgængelige.", state
 
     all_news_items.sort(key=lambda x: x.published_at, reverse=True)
 
     # Take the top-5 news items, ignoring duplicates
-    top_news_items = []
+    top_news_items: list[NewsItem] = list()
+    seen_titles: set[str] = set()
     for news in all_news_items:
-        if news.title not in [item.title for item in top_news_items]:
+        if news.title not in seen_titles:
+            seen_titles.add(news.title)
             top_news_items.append(news)
         if len(top_news_items) >= 5:
             break
 
     logger.info("Reading out the latest news headlines...")
-    synthesise_speech(text="Her er seneste nyt.", synthesiser=state.get("synthesiser"))
+    synthesiser = state.get("synthesiser")
+    synthesise_speech(text="Her er seneste nyt.", synthesiser=synthesiser)
 
-    for news in top_news_items:
-        chime.theme("pokemon")
-        chime.info()
+    def play_chime() -> None:
+        get_sound_bank().play(name="news")
         sleep(0.5)
-        logger.info(f"Reading news item: {news.title!r}...")
-        synthesise_speech(
-            text=news.title + ". " + news.description,
-            synthesiser=state.get("synthesiser"),
+
+    wake_word_listener = state.get("wake_word_listener", nullcontext)
+    with wake_word_listener() as interrupt:
+        completed = synthesise_speech_pipelined(
+            texts=[news.title + ". " + news.description for news in top_news_items],
+            synthesiser=synthesiser,
+            before_each=play_chime,
+            interrupt=interrupt,
         )
 
-    synthesise_speech(
-        text="Det var alt for denne gang.", synthesiser=state.get("synthesiser")
-    )
-    logger.info("Finished reading the news.")
+    if completed:
+        synthesise_speech(text="Det var alt for denne gang.", synthesiser=synthesiser)
+        logger.info("Finished reading the news.")
 
     return "", state
 
@@ -94,3 +85,158 @@ class NewsItem(BaseModel):
     title: str
     description: str
     published_at: dt.datetime
+
+
+class CachedFeed(BaseModel):
+    """A cached news feed."""
+
+    items: list[NewsItem]
+    etag: str | None
+    last_modified: str | None
+    fetched_at: float
+
+
+feed_cache: dict[str, CachedFeed] = dict()
+
+
+@cache
+def get_http_client() -> httpx.Client:
+    """Get the HTTP client, shared across all news feed requests.
+
+    Returns:
+        The HTTP client.
+    """
+    return httpx.Client(timeout=NEWS_TIMEOUT_SECONDS, follow_redirects=True)
+
+
+def fetch_news_items(force: bool = False) -> list[NewsItem]:
+    """Fetch the news items from all the news feeds concurrently.
+
+    Args:
+        force (optional):
+            Whether to ignore the TTL of the cached feeds. Conditional requests are
+            still used. Defaults to False.
+
+    Returns:
+        The news items from all the feeds.
+    """
+    with ThreadPoolExecutor(max_workers=len(NEWS_CATEGORIES)) as executor:
+        feeds = executor.map(
+            lambda category: fetch_feed(category=category, force=force), NEWS_CATEGORIES
+        )
+    return [news_item for feed in feeds for news_item in feed]
+
+
+def fetch_feed(category: str, force: bool = False) -> list[NewsItem]:
+    """Fetch the news items from a news feed, using a conditional request if cached.
+
+    Args:
+        category:
+            The category of the news feed.
+        force (optional):
+            Whether to ignore the TTL of the cached feed. Defaults to False.
+
+    Returns:
+        The news items in the feed. If the feed could not be fetched then the cached
+        news items are returned, if any.
+    """
+    cached_feed = feed_cache.get(category)
+    if cached_feed is not None and not force:
+        if time() - cached_feed.fetched_at < NEWS_CACHE_SECONDS:
+            return cached_feed.items
+    cached_items = cached_feed.items if cached_feed is not None else list()
+
+    if not is_internet_available():
+        return cached_items
+
+    headers: dict[str, str] = dict()
+    if cached_feed is not None and cached_feed.etag is not None:
+        headers["If-None-Match"] = cached_feed.etag
+    if cached_feed is not None and cached_feed.last_modified is not None:
+        headers["If-Modified-Since"] = cached_feed.last_modified
+
+    try:
+        response = get_http_client().get(
+            NEWS_FEED_URL.format(category), headers=headers
+        )
+    except httpx.HTTPError as e:
+        logger.error(f"Could not fetch the {category!r} news feed: {e}")
+        report_request_outcome(success=False)
+        return cached_items
+    report_request_outcome(success=True)
+
+    if response.status_code == 304 and cached_feed is not None:
+        cached_feed.fetched_at = time()
+        return cached_feed.items
+    if response.status_code != 200:
+        logger.error(
+            f"Could not fetch the {category!r} news feed, got status code "
+            f"{response.status_code}."
+        )
+        return cached_items
+
+    news_items = parse_feed(rss_feed=response.text)
+    feed_cache[category] = CachedFeed(
+        items=news_items,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+        fetched_at=time(),
+    )
+    return news_items
+
+
+def parse_feed(rss_feed: str) -> list[NewsItem]:
+    """Parse an RSS news feed.
+
+    Args:
+        rss_feed:
+            The RSS feed.
+
+    Returns:
+        The news items in the feed.
+    """
+    root = ElementTree.fromstring(rss_feed)
+    channel = root.find("channel")
+    if channel is None:
+        return list()
+
+    news_items: list[NewsItem] = list()
+    for item in channel.findall("item"):
+        title = item.find("title")
+        description = item.find("description")
+        pub_date = item.find("pubDate")
+        if (
+            title is None
+            or description is None
+            or pub_date is None
+            or pub_date.text is None
+        ):
+            continue
+        published_at = dt.datetime.strptime(pub_date.text, "%a, %d %b %Y %H:%M:%S GMT")
+        news_items.append(
+            NewsItem(
+                title=title.text or "",
+                description=description.text or "",
+                published_at=published_at,
+            )
+        )
+    return news_items
+
+
+def start_background_refresh() -> None:
+    """Keep the news feeds fresh in a background thread.
+
+    This ensures that the news can be read out immediately when requested.
+    """
+
+    def refresh() -> None:
+        while True:
+            # A single failed refresh must not stop the refreshing for the rest of the
+            # session
+            try:
+                fetch_news_items(force=True)
+            except Exception as e:
+                logger.error(f"Could not refresh the news: {e}")
+            sleep(NEWS_CACHE_SECONDS)
+
+    threading.Thread(target=refresh, name="news-refresh", daemon=True).start()
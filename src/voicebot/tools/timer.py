@@ -1,19 +1,30 @@
 """Timer tool."""
 
 import datetime as dt
+import heapq
+import itertools
+import json
 import logging
-import multiprocessing as mp
-from time import sleep
+import threading
+from collections import defaultdict
+from functools import cache
+from pathlib import Path
+from time import time
 from typing import Literal
 
-import chime
-
+from ..audio_output import get_sound_bank
 from ..speech_synthesis import synthesise_speech
 
 logger = logging.getLogger(__name__)
 
 
-def set_timer(state: dict, duration_seconds: int) -> tuple[Literal[""], dict]:
+TIMER_CACHE_DIR = Path(".cache", "timers")
+ALARM_INTERVAL_SECONDS = 3.0
+
+
+def set_timer(
+    state: dict, duration_seconds: int, label: str | None = None
+) -> tuple[Literal[""], dict]:
     """Set a timer for the given duration.
 
     Args:
@@ -21,74 +32,68 @@ def set_timer(state: dict, duration_seconds: int) -> tuple[Literal[""], dict]:
             The current state of the text engine.
         duration_seconds:
             The duration of the timer in seconds.
+        label (optional):
+            A label for the timer, such as "kartofler". Defaults to None.
 
     Returns:
         A pair (message, state) where message is a message indicating the timer
         was set and state is information that the text engine should store.
     """
-    running_timers = state.get("running_timers", [])
-    timer = Timer(duration_seconds=duration_seconds).start()
-    running_timers.append(timer)
+    timer = get_timer_scheduler().add(duration_seconds=duration_seconds, label=label)
     synthesise_speech(
         text=f"Startet timer på {timer.pretty_duration}.",
         synthesiser=state.get("synthesiser"),
     )
-    return "", dict(running_timers=[timer for timer in running_timers])
+    return "", state
 
 
-def stop_timer(state: dict, duration: str | None = None) -> tuple[Literal[""], dict]:
+def stop_timer(
+    state: dict, duration: str | None = None, label: str | None = None
+) -> tuple[Literal[""], dict]:
     """Stop a timer.
 
     Args:
         state:
             The current state of the text engine.
         duration (optional):
-            The duration of the timer to stop. If None, stop the timer with the
-            shortest duration. Defaults to None.
+            The duration of the timer to stop, in the format 'HH:MM:SS'. If None, stop
+            the timer with the shortest duration. Defaults to None.
+        label (optional):
+            The label of the timer to stop. Takes precedence over the duration if
+            given. Defaults to None.
 
     Returns:
         A pair (message, state) where message is a message indicating the timer
         was stopped and state is information that the text engine should store.
     """
-    running_timers = state.get("running_timers", [])
+    scheduler = get_timer_scheduler()
 
-    if not running_timers:
+    if not scheduler.timers:
         logger.info("No running timers to stop.")
         synthesise_speech(
             text="Der er ingen kørende timere.", synthesiser=state.get("synthesiser")
         )
-        return ("", dict(running_timers=[]))
-
-    timer_to_stop: Timer
-    if duration is None:
-        timer_to_stop = min(running_timers, key=lambda t: t.duration)
-    else:
-        valid_timers = [
-            timer
-            for timer in running_timers
-            if str(timer.duration).replace("00:", "0:") == duration.replace("00:", "0:")
-        ]
-        if not valid_timers and running_timers:
-            timer_to_stop = min(running_timers, key=lambda t: t.duration)
-        elif not valid_timers:
-            logger.info(f"No timer found with duration {duration}.")
-            synthesise_speech(
-                text=f"Der var ingen timer med varighed {duration}.",
-                synthesiser=state.get("synthesiser"),
-            )
-            return ("", dict(running_timers=[timer for timer in running_timers]))
-        else:
-            timer_to_stop = valid_timers[0]
+        return "", state
 
-    timer_to_stop.stop()
-    running_timers.remove(timer_to_stop)
+    timer_to_stop: Timer | None = None
+    if label is not None:
+        timer_to_stop = scheduler.find(label=label)
+    if timer_to_stop is None and duration is not None:
+        duration_seconds = parse_duration(duration=duration)
+        if duration_seconds is not None:
+            timer_to_stop = scheduler.find(duration_seconds=duration_seconds)
+    if timer_to_stop is None:
+        timer_to_stop = scheduler.shortest()
+    assert timer_to_stop is not None
+
+    scheduler.cancel(timer_id=timer_to_stop.timer_id)
 
     logger.info(f"Stopped timer: {timer_to_stop!r}")
     synthesise_speech(
         text=f"Stoppet timer på {timer_to_stop.pretty_duration}.",
         synthesiser=state.get("synthesiser"),
     )
-    return "", dict(running_timers=[timer for timer in running_timers])
+    return "", state
 
 
 def list_timers(state: dict) -> tuple[Literal[""], dict]:
@@ -102,7 +107,9 @@ def list_timers(state: dict) -> tuple[Literal[""], dict]:
         A pair (message, state) where message is a message listing the running
         timers and state is information that the text engine should store.
     """
-    running_timers = state.get("running_timers", [])
+    running_timers = sorted(
+        get_timer_scheduler().timers.values(), key=lambda timer: timer.deadline
+    )
     if not running_timers:
         logger.info("No running timers to list.")
         synthesise_speech(
@@ -124,39 +131,59 @@ def list_timers(state: dict) -> tuple[Literal[""], dict]:
     return "", state
 
 
+def parse_duration(duration: str) -> int | None:
+    """Parse a duration in the format 'HH:MM:SS' to seconds.
+
+    Args:
+        duration:
+            The duration to parse. Shorter formats such as 'MM:SS' are also accepted.
+
+    Returns:
+        The duration in seconds, or None if the duration could not be parsed.
+    """
+    try:
+        parts = [int(part) for part in duration.strip().split(":")]
+    except ValueError:
+        return None
+    if not 1 <= len(parts) <= 3:
+        return None
+    seconds = 0
+    for part in parts:
+        seconds = seconds * 60 + part
+    return seconds
+
+
 class Timer:
     """A timer."""
 
-    def __init__(self, duration_seconds: int) -> None:
+    def __init__(
+        self,
+        timer_id: int,
+        duration_seconds: int,
+        deadline: float,
+        label: str | None = None,
+    ) -> None:
         """Initialise the timer.
 
         Args:
+            timer_id:
+                The unique ID of the timer.
             duration_seconds:
                 The duration of the timer in seconds.
+            deadline:
+                The UNIX timestamp at which the timer finishes.
+            label (optional):
+                A label for the timer. Defaults to None.
         """
+        self.timer_id = timer_id
         self.duration: dt.timedelta = dt.timedelta(seconds=duration_seconds)
-        self.process = mp.Process(target=self._run_timer, args=(duration_seconds,))
-        self.start_time: dt.datetime | None = None
-
-    def start(self) -> "Timer":
-        """Start the timer."""
-        self.process.start()
-        self.start_time = dt.datetime.now()
-        return self
-
-    def stop(self) -> "Timer":
-        """Stop the timer."""
-        self.process.terminate()
-        return self
+        self.deadline = deadline
+        self.label = label
 
     @property
     def remaining(self) -> dt.timedelta:
         """Return the remaining seconds of the timer."""
-        if self.start_time is None:
-            remaining_seconds = 0
-        else:
-            remaining = self.start_time + self.duration - dt.datetime.now()
-            remaining_seconds = max(int(remaining.total_seconds()), 0)
+        remaining_seconds = max(int(self.deadline - time()), 0)
         return dt.timedelta(seconds=remaining_seconds)
 
     @property
@@ -171,9 +198,9 @@ class Timer:
 
     def __repr__(self) -> str:
         """Return the representation of the timer."""
-        out = f"Timer(duration={self.duration}"
-        if self.start_time is not None:
-            out += f", remaining={self.remaining}"
+        out = f"Timer(duration={self.duration}, remaining={self.remaining}"
+        if self.label is not None:
+            out += f", label={self.label!r}"
         return out + ")"
 
     @staticmethod
@@ -197,23 +224,270 @@ class Timer:
             time_strings.append(f"{minutes} minutter")
         if seconds > 0:
             time_strings.append(f"{seconds} sekunder")
+        if not time_strings:
+            return "0 sekunder"
         return (
             ", ".join(time_strings[:-1]) + " og " + time_strings[-1]
             if len(time_strings) > 1
             else time_strings[0]
         )
 
-    @staticmethod
-    def _run_timer(duration_seconds: int) -> None:
-        """Run a timer for the given duration.
+
+class TimerScheduler:
+    """A scheduler running all timers from a single thread.
+
+    The deadlines are kept in a heap, so adding a timer is O(log n). Cancelled timers
+    are removed from the heap lazily when they reach the top, so cancelling is O(1)
+    amortised. Timers are indexed by duration and label for fast lookup. Finished
+    timers keep ringing until they are cancelled.
+
+    The timers are persisted as an append-only log with a line per added or cancelled
+    timer, which is written outside the lock of the scheduler and compacted on load, so
+    persisting a timer does not depend on the number of timers.
+    """
+
+    def __init__(self, cache_dir: str | Path = TIMER_CACHE_DIR) -> None:
+        """Initialise the scheduler.
+
+        Args:
+            cache_dir (optional):
+                The directory in which to persist the timers. Defaults to
+                `.cache/timers`.
+        """
+        self.path = Path(cache_dir) / "timers.jsonl"
+        self.timers: dict[int, Timer] = dict()
+        self.timers_by_duration: defaultdict[int, set[int]] = defaultdict(set)
+        self.timers_by_label: defaultdict[str, set[int]] = defaultdict(set)
+        self.deadlines: list[tuple[float, int]] = list()
+        self.ringing: set[int] = set()
+        self.ids = itertools.count()
+        self.condition = threading.Condition()
+        self.log_lock = threading.Lock()
+        self.load()
+        threading.Thread(target=self._run, name="timer-scheduler", daemon=True).start()
+
+    def add(self, duration_seconds: int, label: str | None = None) -> Timer:
+        """Add a new timer.
 
         Args:
             duration_seconds:
-                The duration to wait in seconds.
+                The duration of the timer in seconds.
+            label (optional):
+                A label for the timer. Defaults to None.
+
+        Returns:
+            The new timer.
         """
-        sleep(duration_seconds)
-        logging.info("Timer finished! Announcing it...")
+        timer = Timer(
+            timer_id=next(self.ids),
+            duration_seconds=int(duration_seconds),
+            deadline=time() + duration_seconds,
+            label=label,
+        )
+        with self.condition:
+            self._insert(timer=timer)
+            self.condition.notify()
+        self._append(record=self._add_record(timer=timer))
+        return timer
+
+    def cancel(self, timer_id: int) -> Timer | None:
+        """Cancel a timer, stopping its alarm if it is ringing.
+
+        Args:
+            timer_id:
+                The ID of the timer.
+
+        Returns:
+            The cancelled timer, or None if there was no such timer.
+        """
+        with self.condition:
+            timer = self.timers.pop(timer_id, None)
+            if timer is None:
+                return None
+            self.ringing.discard(timer_id)
+            duration_seconds = int(timer.duration.total_seconds())
+            self.timers_by_duration[duration_seconds].discard(timer_id)
+            if not self.timers_by_duration[duration_seconds]:
+                del self.timers_by_duration[duration_seconds]
+            if timer.label is not None:
+                label = timer.label.lower()
+                self.timers_by_label[label].discard(timer_id)
+                if not self.timers_by_label[label]:
+                    del self.timers_by_label[label]
+            self.condition.notify()
+        self._append(record=dict(event="cancel", timer_id=timer_id))
+        return timer
+
+    def find(
+        self, duration_seconds: int | None = None, label: str | None = None
+    ) -> Timer | None:
+        """Find a timer by its duration or label.
+
+        Args:
+            duration_seconds (optional):
+                The duration of the timer, in seconds. Defaults to None.
+            label (optional):
+                The label of the timer. Defaults to None.
+
+        Returns:
+            The timer finishing first among the matching timers, or None if no timers
+            match.
+        """
+        with self.condition:
+            if label is not None:
+                timer_ids = self.timers_by_label.get(label.lower(), set())
+            elif duration_seconds is not None:
+                timer_ids = self.timers_by_duration.get(duration_seconds, set())
+            else:
+                timer_ids = set()
+            matching_timers = [self.timers[timer_id] for timer_id in timer_ids]
+        return min(matching_timers, key=lambda timer: timer.deadline, default=None)
+
+    def shortest(self) -> Timer | None:
+        """Get the timer with the shortest duration.
+
+        Returns:
+            The timer with the shortest duration, or None if there are no timers.
+        """
+        with self.condition:
+            if not self.timers_by_duration:
+                return None
+            shortest_duration = min(self.timers_by_duration)
+        return self.find(duration_seconds=shortest_duration)
+
+    def load(self) -> None:
+        """Load the persisted timers and compact their log.
+
+        Timers that finished while offline ring. Lines of the log which cannot be
+        parsed, such as a line truncated by a crash, are skipped.
+        """
+        if not self.path.exists():
+            return
+        try:
+            lines = self.path.read_text().splitlines()
+        except (OSError, UnicodeDecodeError) as e:
+            logger.error(f"Could not load the persisted timers, starting empty: {e}")
+            return
+
+        # Appends happen outside the lock, so a cancellation can be logged before the
+        # addition of its timer
+        raw_timers: dict[int, dict] = dict()
+        cancelled_ids: set[int] = set()
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                timer_id = int(record["timer_id"])
+                if record["event"] == "cancel":
+                    cancelled_ids.add(timer_id)
+                    raw_timers.pop(timer_id, None)
+                elif timer_id not in cancelled_ids:
+                    raw_timers[timer_id] = dict(
+                        duration_seconds=int(record["duration_seconds"]),
+                        deadline=float(record["deadline"]),
+                        label=record["label"],
+                    )
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+                logger.warning(
+                    f"Skipping line {line_number} of the persisted timers: {e}"
+                )
+
+        for raw_timer in raw_timers.values():
+            self._insert(timer=Timer(timer_id=next(self.ids), **raw_timer))
+        self.compact()
+        logger.info(f"Loaded {len(self.timers)} persisted timers.")
+
+    def compact(self) -> None:
+        """Rewrite the log of the persisted timers with only the running timers."""
+        with self.condition:
+            records = [self._add_record(timer=timer) for timer in self.timers.values()]
+        with self.log_lock:
+            self.path.parent.mkdir(exist_ok=True, parents=True)
+            temporary_path = self.path.with_suffix(".tmp")
+            temporary_path.write_text(
+                "".join(json.dumps(record) + "\n" for record in records)
+            )
+            temporary_path.replace(self.path)
+
+    def _append(self, record: dict) -> None:
+        """Append a record to the log of the persisted timers.
+
+        Args:
+            record:
+                The record to append.
+        """
+        with self.log_lock:
+            self.path.parent.mkdir(exist_ok=True, parents=True)
+            with self.path.open("a") as f:
+                f.write(json.dumps(record) + "\n")
+
+    @staticmethod
+    def _add_record(timer: Timer) -> dict:
+        """Get the log record of an added timer.
+
+        Args:
+            timer:
+                The timer.
+
+        Returns:
+            The record.
+        """
+        return dict(
+            event="add",
+            timer_id=timer.timer_id,
+            duration_seconds=int(timer.duration.total_seconds()),
+            deadline=timer.deadline,
+            label=timer.label,
+        )
+
+    def _insert(self, timer: Timer) -> None:
+        """Insert a timer into the heap and the indices.
+
+        Args:
+            timer:
+                The timer to insert.
+        """
+        self.timers[timer.timer_id] = timer
+        self.timers_by_duration[int(timer.duration.total_seconds())].add(timer.timer_id)
+        if timer.label is not None:
+            self.timers_by_label[timer.label.lower()].add(timer.timer_id)
+        heapq.heappush(self.deadlines, (timer.deadline, timer.timer_id))
+
+    def _run(self) -> None:
+        """Wait for the next deadline, and ring while any timers have finished."""
         while True:
-            chime.theme("material")
-            chime.info()
-            sleep(3)
+            with self.condition:
+                now = time()
+                while self.deadlines and self.deadlines[0][0] <= now:
+                    _, timer_id = heapq.heappop(self.deadlines)
+                    timer = self.timers.get(timer_id)
+                    if timer is not None:
+                        logger.info(f"Timer finished: {timer!r}. Announcing it...")
+                        self.ringing.add(timer_id)
+
+                is_ringing = bool(self.ringing)
+                if is_ringing:
+                    timeout = ALARM_INTERVAL_SECONDS
+                elif self.deadlines:
+                    timeout = self.deadlines[0][0] - now
+                else:
+                    timeout = None
+
+                if not is_ringing:
+                    self.condition.wait(timeout=timeout)
+                    continue
+
+            get_sound_bank().play(name="timer")
+            with self.condition:
+                self.condition.wait(timeout=timeout)
+
+
+@cache
+def get_timer_scheduler() -> TimerScheduler:
+    """Get the timer scheduler, shared across all the timer tools.
+
+    Returns:
+        The timer scheduler.
+    """
+    return TimerScheduler()
@@ -1,17 +1,21 @@
 """Weather forecast tool."""
 
+import json
 import logging
 import os
 import re
+from functools import cache
 from pathlib import Path
+from time import time
 
 import geocoder
 import numpy as np
+import requests
 import requests_cache
 from openmeteo_requests import Client
 from retry_requests import retry
 
-from ..utils import is_internet_available
+from ..utils import is_internet_available, report_request_outcome
 
 logging.getLogger("geocoder.base").setLevel(logging.WARNING)
 
@@ -19,6 +23,30 @@ logging.getLogger("geocoder.base").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 
+WEATHER_CACHE_DIR = Path(".cache", "weather")
+FORECAST_EXPIRE_SECONDS = 3600
+IP_LOCATION_EXPIRE_SECONDS = 6 * 3600
+
+# Coordinates are rounded to this many decimals (roughly 1 km), so that forecasts for
+# nearby coordinates share the same cache entry
+COORDINATE_DECIMALS = 2
+
+# The hourly variables of the forecast, and the periods they are summarised over
+FORECAST_VARIABLES = [
+    "weather_code",
+    "temperature_2m",
+    "precipitation",
+    "wind_speed_10m",
+]
+HOURS_PER_PERIOD = 12
+FORECAST_PERIODS = [
+    "I dag kl. 1-12",
+    "I dag kl. 13-24",
+    "I morgen kl. 1-12",
+    "I morgen kl. 13-24",
+]
+
+
 WEATHER_CODES = {
     0: "Klar himmel",
     1: "Næsten klar himmel",
@@ -66,85 +94,274 @@ def get_weather(state: dict, location: str) -> tuple[str, dict]:
         information that the text engine should store.
     """
     if not is_internet_available():
-        return "Ingen vejrudsigt, da internettet ikke er tilgængeligt.", dict()
+        return "Ingen vejrudsigt, da internettet ikke er tilgængeligt.", state
+
+    try:
+        if location == "":
+            location, coordinates = get_ip_location()
+            logger.info(
+                f"No location provided, using the current IP location: {location!r}"
+            )
+        else:
+            coordinates = get_coordinates(location=location)
+
+        if coordinates is None:
+            return f"Kunne ikke finde lokationen {location!r}.", state
+        latitude, longitude = coordinates
+
+        forecast = fetch_forecast(latitude=latitude, longitude=longitude)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Could not get the weather forecast: {e}")
+        report_request_outcome(success=False)
+        return "Ingen vejrudsigt, da internettet ikke er tilgængeligt.", state
+    report_request_outcome(success=True)
+    if forecast is None:
+        return "Ingen vejrudsigt tilgængelig.", state
+
+    return summarise_forecast(location=location, forecast=forecast), state
 
-    if location == "":
-        location = geocoder.ip("me").address
-        logger.info(
-            f"No location provided, using the current IP location: {location!r}"
+
+def fetch_forecast(
+    latitude: float, longitude: float
+) -> dict[str, np.ndarray | None] | None:
+    """Fetch the hourly forecast for today and tomorrow.
+
+    Args:
+        latitude:
+            The latitude of the location.
+        longitude:
+            The longitude of the location.
+
+    Returns:
+        A mapping from each of the variables in `FORECAST_VARIABLES` to its hourly
+        values, or None for the variables without data. If there is no forecast at all
+        then None is returned.
+
+    Raises:
+        requests.exceptions.RequestException:
+            If the forecast could not be fetched.
+    """
+    response = (
+        get_openmeteo_client()
+        .weather_api(
+            url="https://api.open-meteo.com/v1/forecast",
+            params=dict(
+                latitude=round(latitude, COORDINATE_DECIMALS),
+                longitude=round(longitude, COORDINATE_DECIMALS),
+                wind_speed_unit="ms",
+                hourly=FORECAST_VARIABLES,
+                forecast_days=2,
+            ),
+        )[0]
+        .Hourly()
+    )
+    if response is None:
+        return None
+
+    forecast: dict[str, np.ndarray | None] = dict()
+    for index, variable_name in enumerate(FORECAST_VARIABLES):
+        variable = response.Variables(index)
+        if variable is None:
+            forecast[variable_name] = None
+            continue
+        values = variable.ValuesAsNumpy()
+        assert isinstance(values, np.ndarray), "Values should be a NumPy array."
+        forecast[variable_name] = values
+    return forecast
+
+
+def summarise_forecast(location: str, forecast: dict[str, np.ndarray | None]) -> str:
+    """Summarise an hourly forecast per period of the day.
+
+    Rather than listing every hourly value, every period gets the dominant weather type,
+    the temperature range and mean, the total precipitation and the mean and maximum
+    wind speed, which is all the text engine needs to answer with.
+
+    Args:
+        location:
+            The name of the location.
+        forecast:
+            The hourly forecast, as returned by `fetch_forecast`.
+
+    Returns:
+        The summary, with a line per period.
+    """
+    # All the variables are reshaped into (num_periods, hours_per_period) arrays, so the
+    # statistics of all the periods are computed at once
+    num_hours = min(
+        (len(values) for values in forecast.values() if values is not None), default=0
+    )
+    num_periods = min(num_hours // HOURS_PER_PERIOD, len(FORECAST_PERIODS))
+    periods = {
+        variable_name: values[: num_periods * HOURS_PER_PERIOD].reshape(
+            num_periods, HOURS_PER_PERIOD
         )
+        for variable_name, values in forecast.items()
+        if values is not None
+    }
+    if num_periods == 0:
+        return f"Ingen vejrdata tilgængelig for {location}."
+
+    summary: dict[str, list[str]] = {
+        period_name: list() for period_name in FORECAST_PERIODS[:num_periods]
+    }
+    if "weather_code" in periods:
+        for period_name, weather_code in zip(
+            summary, dominant_weather_codes(weather_codes=periods["weather_code"])
+        ):
+            summary[period_name].append(WEATHER_CODES.get(weather_code, "Ukendt vejr"))
+    if "temperature_2m" in periods:
+        temperatures = np.rint(
+            np.stack(
+                [
+                    periods["temperature_2m"].min(axis=1),
+                    periods["temperature_2m"].max(axis=1),
+                    periods["temperature_2m"].mean(axis=1),
+                ],
+                axis=1,
+            )
+        ).astype(int)
+        for period_name, (minimum, maximum, mean) in zip(summary, temperatures):
+            summary[period_name].append(
+                f"{minimum} til {maximum} grader (gennemsnit {mean})"
+            )
+    if "precipitation" in periods:
+        precipitation = np.round(periods["precipitation"].sum(axis=1), 1)
+        for period_name, total in zip(summary, precipitation):
+            summary[period_name].append(f"{total:.1f} mm nedbør".replace(".", ","))
+    if "wind_speed_10m" in periods:
+        wind_speeds = np.rint(
+            np.stack(
+                [
+                    periods["wind_speed_10m"].mean(axis=1),
+                    periods["wind_speed_10m"].max(axis=1),
+                ],
+                axis=1,
+            )
+        ).astype(int)
+        for period_name, (mean, maximum) in zip(summary, wind_speeds):
+            summary[period_name].append(f"vind {mean} m/s (op til {maximum} m/s)")
 
-    # Ensure that the weather cache directory exists
-    weather_cache = Path(".cache", "weather")
-    weather_cache.mkdir(exist_ok=True, parents=True)
+    lines = [
+        f"{period_name}: {', '.join(values)}" for period_name, values in summary.items()
+    ]
+    return f"Vejret i {location}:\n" + "\n".join(lines)
 
-    # Create the cache path
-    cache_name = re.sub(r"[ ,_]+", "-", location).lower()
-    cache_path = weather_cache / cache_name
 
-    openmeteo = Client(
+def dominant_weather_codes(weather_codes: np.ndarray) -> list[int]:
+    """Find the most frequent weather code in every period.
+
+    Ties are broken in favour of the higher weather code, as the codes are ordered by
+    severity, and e.g. rain is more relevant to mention than clouds.
+
+    Args:
+        weather_codes:
+            The hourly weather codes, of shape (num_periods, hours_per_period).
+
+    Returns:
+        The dominant weather code of every period.
+    """
+    codes, inverse = np.unique(weather_codes.astype(int), return_inverse=True)
+    inverse = inverse.reshape(weather_codes.shape)
+    counts = (inverse[:, :, None] == np.arange(len(codes))).sum(axis=1)
+
+    # Reversing the codes makes `argmax` pick the highest of the most frequent codes
+    dominant_indices = len(codes) - 1 - counts[:, ::-1].argmax(axis=1)
+    return codes[dominant_indices].tolist()
+
+
+@cache
+def get_openmeteo_client() -> Client:
+    """Get the Open-Meteo client, shared across all weather lookups.
+
+    Returns:
+        The Open-Meteo client, with a cached and retrying session.
+    """
+    WEATHER_CACHE_DIR.mkdir(exist_ok=True, parents=True)
+    return Client(
         session=retry(  # pyrefly: ignore[bad-argument-type]
             session=requests_cache.CachedSession(
-                cache_name=cache_path.as_posix(), expire_after=3600
+                cache_name=(WEATHER_CACHE_DIR / "forecasts").as_posix(),
+                expire_after=FORECAST_EXPIRE_SECONDS,
             ),
             retries=5,
             backoff_factor=0.2,
         )
     )
 
-    coordinates = geocoder.geonames(
-        location=location, key=os.getenv("GEONAMES_USERNAME")
-    ).json
-
-    response = openmeteo.weather_api(
-        url="https://api.open-meteo.com/v1/forecast",
-        params=dict(
-            latitude=coordinates["lat"],
-            longitude=coordinates["lng"],
-            wind_speed_unit="ms",
-            hourly=[
-                "weather_code",
-                "temperature_2m",
-                "precipitation",
-                "wind_speed_10m",
-            ],
-            forecast_days=2,
-        ),
-    )[0].Hourly()
-    if response is None:
-        return "Ingen vejrudsigt tilgængelig.", dict()
 
-    forecast = {
-        "Vejrtype": response.Variables(0),
-        "Temperatur (i celcius)": response.Variables(1),
-        "Nedbør (i millimeter)": response.Variables(2),
-        "Vindhastighed (i meter per sekund)": response.Variables(3),
+def get_coordinates(location: str) -> tuple[float, float] | None:
+    """Get the coordinates of a location, using a persistent cache.
+
+    Args:
+        location:
+            The name of the location.
+
+    Returns:
+        The pair (latitude, longitude), or None if the location could not be found.
+    """
+    geocodes = load_geocodes()
+    cache_key = re.sub(r"[ ,_]+", "-", location.strip()).lower()
+    if cache_key in geocodes:
+        latitude, longitude = geocodes[cache_key]
+        return latitude, longitude
+
+    geocoding = geocoder.geonames(location=location, key=os.getenv("GEONAMES_USERNAME"))
+    if not geocoding.ok:
+        logger.info(f"Could not geocode the location {location!r}.")
+        return None
+
+    coordinates = (float(geocoding.lat), float(geocoding.lng))
+    geocodes[cache_key] = coordinates
+    geocodes_path = WEATHER_CACHE_DIR / "geocodes.json"
+    geocodes_path.write_text(json.dumps(geocodes, ensure_ascii=False, indent=2))
+    return coordinates
+
+
+@cache
+def load_geocodes() -> dict[str, tuple[float, float]]:
+    """Load the persistent geocode cache.
+
+    Returns:
+        A mapping from location names to (latitude, longitude) pairs. This dictionary
+        is shared across calls, so new geocodes can be added to it directly.
+    """
+    WEATHER_CACHE_DIR.mkdir(exist_ok=True, parents=True)
+    geocodes_path = WEATHER_CACHE_DIR / "geocodes.json"
+    if not geocodes_path.exists():
+        return dict()
+    return {
+        location: (latitude, longitude)
+        for location, (latitude, longitude) in json.loads(
+            geocodes_path.read_text()
+        ).items()
     }
 
-    out = f"Vejrdata for {location}:\n\n"
-    for variable_name, variable in forecast.items():
-        out += f"{variable_name}:\n"
-        if variable is None:
-            out += "Ingen data tilgængelig.\n\n"
-            continue
 
-        values_arr = variable.ValuesAsNumpy()
-        assert isinstance(values_arr, np.ndarray), "Values should be a NumPy array."
+def get_ip_location() -> tuple[str, tuple[float, float] | None]:
+    """Get the current location based on the IP address, using a persistent cache.
 
-        if variable_name == "Vejrtype":
-            values = [WEATHER_CODES.get(value, "Ukendt vejr") for value in values_arr]
-        else:
-            values = [str(int(round(value, 0))) for value in values_arr]
-
-        intervals = {
-            "I dag kl. 1-12": (0, 12),
-            "I dag kl. 13-24": (12, 24),
-            "I morgen kl. 1-12": (24, 36),
-            "I morgen kl. 13-24": (36, 48),
-        }
-        for interval_name, (start, end) in intervals.items():
-            interval_values = ", ".join(str(value) for value in values[start:end])
-            out += f"{interval_name}: {interval_values}\n"
-        out += "\n"
-
-    return out, state
+    Returns:
+        A pair (address, coordinates), where coordinates is a pair (latitude,
+        longitude), or None if the location could not be found.
+    """
+    WEATHER_CACHE_DIR.mkdir(exist_ok=True, parents=True)
+    ip_location_path = WEATHER_CACHE_DIR / "ip-location.json"
+    if ip_location_path.exists():
+        ip_location = json.loads(ip_location_path.read_text())
+        if time() - ip_location["fetched_at"] < IP_LOCATION_EXPIRE_SECONDS:
+            latitude, longitude = ip_location["coordinates"]
+            return ip_location["address"], (latitude, longitude)
+
+    geocoding = geocoder.ip("me")
+    if not geocoding.ok:
+        return geocoding.address or "", None
+
+    coordinates = (float(geocoding.lat), float(geocoding.lng))
+    ip_location_path.write_text(
+        json.dumps(
+            dict(address=geocoding.address, coordinates=coordinates, fetched_at=time()),
+            ensure_ascii=False,
+        )
+    )
+    return geocoding.address, coordinates
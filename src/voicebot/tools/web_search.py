@@ -1,9 +1,30 @@
 """Search the web for a given query."""
 
 import json
+import logging
+import re
+from time import time
+from typing import Protocol
 
+from pydantic import BaseModel
 from webscout import DuckDuckGoSearch, TextResult
 
+from ..response_cache import normalise_prompt
+from ..utils import is_internet_available, report_request_outcome
+
+logger = logging.getLogger(__name__)
+
+
+SEARCH_CACHE_SECONDS = 3600
+SEARCH_CACHE_MAX_ENTRIES = 256
+SEARCH_TIMEOUT_SECONDS = 5
+SEARCH_MAX_RESULTS = 10
+
+# The approximate number of tokens of search results to pass on to the text engine,
+# where we estimate four characters per token
+SEARCH_TOKEN_BUDGET = 400
+CHARACTERS_PER_TOKEN = 4
+
 
 def search_web(state: dict, keywords: str) -> tuple[str, dict]:
     """Search the web for a given query.
@@ -15,10 +36,212 @@ def search_web(state: dict, keywords: str) -> tuple[str, dict]:
             The keywords to search for.
 
     Returns:
-        A tuple (message, state) where message is a message with all the web results and
-        state is information that the text engine should store.
+        A tuple (message, state) where message is a message with the most relevant web
+        results and state is information that the text engine should store.
+    """
+    normalised_keywords = normalise_prompt(prompt=keywords)
+    cached = search_cache.get(normalised_keywords)
+    if cached is not None and time() - cached[0] < SEARCH_CACHE_SECONDS:
+        logger.info(f"Using cached search results for {keywords!r}.")
+        return cached[1], state
+
+    if not is_internet_available():
+        return "Ingen søgeresultater, da internettet ikke er tilgængeligt.", state
+
+    try:
+        results = search_backend.search(
+            keywords=keywords, max_results=SEARCH_MAX_RESULTS
+        )
+    except Exception as e:
+        logger.error(f"Could not search the web for {keywords!r}: {e}")
+        report_request_outcome(success=False)
+        return "Ingen søgeresultater, da søgningen fejlede.", state
+    report_request_outcome(success=True)
+
+    compacted_results = compact_results(
+        results=results, keywords=keywords, token_budget=SEARCH_TOKEN_BUDGET
+    )
+    message = json.dumps(
+        [result.model_dump() for result in compacted_results], ensure_ascii=False
+    )
+    search_cache[normalised_keywords] = (time(), message)
+    if len(search_cache) > SEARCH_CACHE_MAX_ENTRIES:
+        del search_cache[next(iter(search_cache))]
+    return message, state
+
+
+class SearchResult(BaseModel):
+    """A web search result."""
+
+    title: str
+    body: str
+    href: str
+
+
+class SearchBackend(Protocol):
+    """A web search backend."""
+
+    def search(self, keywords: str, max_results: int) -> list[SearchResult]:
+        """Search for the given keywords.
+
+        Args:
+            keywords:
+                The keywords to search for.
+            max_results:
+                The maximum number of results.
+
+        Returns:
+            The search results.
+        """
+        ...
+
+
+class DuckDuckGoBackend:
+    """A web search backend using DuckDuckGo."""
+
+    def __init__(self, timeout_seconds: int = SEARCH_TIMEOUT_SECONDS) -> None:
+        """Initialise the backend.
+
+        Args:
+            timeout_seconds (optional):
+                The timeout of the search, in seconds. Defaults to 5.
+        """
+        self.client = DuckDuckGoSearch(timeout=timeout_seconds)
+
+    def search(self, keywords: str, max_results: int) -> list[SearchResult]:
+        """Search for the given keywords.
+
+        Args:
+            keywords:
+                The keywords to search for.
+            max_results:
+                The maximum number of results.
+
+        Returns:
+            The search results.
+        """
+        results: list[TextResult] = self.client.text(
+            keywords=keywords, max_results=max_results
+        )
+        return [SearchResult.model_validate(result.to_dict()) for result in results]
+
+
+class LocalBackend:
+    """A web search backend searching a local index, e.g. for testing."""
+
+    def __init__(self, documents: list[SearchResult]) -> None:
+        """Initialise the backend.
+
+        Args:
+            documents:
+                The documents in the index.
+        """
+        self.documents = documents
+
+    def search(self, keywords: str, max_results: int) -> list[SearchResult]:
+        """Search for the given keywords.
+
+        Args:
+            keywords:
+                The keywords to search for.
+            max_results:
+                The maximum number of results.
+
+        Returns:
+            The documents matching any of the keywords.
+        """
+        terms = set(normalise_prompt(prompt=keywords).split())
+        scored_documents = [
+            (score_result(result=document, terms=terms), document)
+            for document in self.documents
+        ]
+        return [
+            document
+            for score, document in sorted(
+                scored_documents, key=lambda pair: pair[0], reverse=True
+            )
+            if score > 0
+        ][:max_results]
+
+
+def compact_results(
+    results: list[SearchResult], keywords: str, token_budget: int
+) -> list[SearchResult]:
+    """Rank search results and trim them to fit within a token budget.
+
+    The results are ranked by keyword overlap, and the snippets are trimmed to their
+    most relevant sentences.
+
+    Args:
+        results:
+            The search results.
+        keywords:
+            The keywords that were searched for.
+        token_budget:
+            The approximate maximum number of tokens of the compacted results.
+
+    Returns:
+        The compacted results.
     """
-    results: list[TextResult] = DuckDuckGoSearch().text(
-        keywords=keywords, max_results=10
+    terms = set(normalise_prompt(prompt=keywords).split())
+    ranked_results = sorted(
+        results,
+        key=lambda result: score_result(result=result, terms=terms),
+        reverse=True,
     )
-    return json.dumps([result.to_dict() for result in results]), state
+
+    character_budget = token_budget * CHARACTERS_PER_TOKEN
+    compacted_results: list[SearchResult] = list()
+    for result in ranked_results:
+        remaining_budget = character_budget - len(result.title) - len(result.href)
+        if remaining_budget <= 0:
+            break
+
+        # Keep the sentences mentioning the keywords, in their original order
+        sentences = re.split(r"(?<=[.!?])\s+", result.body.strip())
+        relevant_sentences = [
+            sentence
+            for sentence in sentences
+            if terms & set(normalise_prompt(prompt=sentence).split())
+        ] or sentences[:1]
+        body = " ".join(relevant_sentences)
+        if len(body) > remaining_budget:
+            body = body[:remaining_budget].rsplit(" ", maxsplit=1)[0] + "..."
+
+        compacted_results.append(
+            SearchResult(title=result.title, body=body, href=result.href)
+        )
+        character_budget -= len(result.title) + len(result.href) + len(body)
+    return compacted_results
+
+
+def score_result(result: SearchResult, terms: set[str]) -> int:
+    """Score a search result by the number of occurrences of the search terms.
+
+    Args:
+        result:
+            The search result.
+        terms:
+            The normalised search terms.
+
+    Returns:
+        The score.
+    """
+    words = normalise_prompt(prompt=f"{result.title} {result.body}").split()
+    return sum(word in terms for word in words)
+
+
+search_backend: SearchBackend = DuckDuckGoBackend()
+search_cache: dict[str, tuple[float, str]] = dict()
+
+
+def set_search_backend(backend: SearchBackend) -> None:
+    """Set the backend used by the web search tool, clearing the cache.
+
+    Args:
+        backend:
+            The backend to use.
+    """
+    global search_backend
+    search_backend = backend
+    search_cache.clear()
@@ -0,0 +1,211 @@
+"""Capture of the turns of the conversations, for building replay corpora."""
+
+import datetime as dt
+import logging
+import queue
+import shutil
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+
+import numpy as np
+from pydantic import BaseModel
+from pydub import AudioSegment
+
+from .speech_recording import SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+# The audio formats, with their file suffixes and the arguments to the export
+AUDIO_FORMATS = dict(
+    flac=(".flac", dict(format="flac")),
+    opus=(".ogg", dict(format="ogg", codec="libopus")),
+)
+
+# The speech, the start of the recording, the transcript, the response and the timings
+Turn = tuple[np.ndarray, dt.datetime, str | Future[str], str | None, dict[str, float]]
+
+
+class CapturedTurn(BaseModel):
+    """The metadata of a captured turn."""
+
+    turn_id: str
+    audio_start: dt.datetime
+    audio_path: str
+    transcript: str
+    response: str | None
+    timings: dict[str, float]
+
+
+class TurnCaptureWriter:
+    """Writes the audio, transcript, response and timings of turns in the background.
+
+    Every session is a directory of the capture directory, which is never modified after
+    the session has been rotated. For every turn, the session contains the compressed
+    audio and a text file with the transcript with the same name, so that a session can
+    be used directly as the corpus of the benchmark scripts, along with a `turns.jsonl`
+    file with a line of metadata per turn. A new session is started after a number of
+    turns, and only the newest sessions are kept.
+
+    The turns are written by a background thread. If the writer falls behind then new
+    turns are dropped rather than waited for, so the capture never delays a response.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        audio_format: str,
+        max_turns_per_session: int,
+        max_sessions: int,
+        max_queue_size: int,
+    ) -> None:
+        """Initialise the writer.
+
+        Args:
+            directory:
+                The directory in which to store the sessions.
+            audio_format:
+                The format of the audio, either "flac" or "opus".
+            max_turns_per_session:
+                The number of turns after which a new session is started.
+            max_sessions:
+                The maximum number of sessions to keep, after which the oldest are
+                deleted.
+            max_queue_size:
+                The maximum number of turns waiting to be written, after which new turns
+                are dropped.
+
+        Raises:
+            ValueError:
+                If the audio format is unknown.
+        """
+        if audio_format not in AUDIO_FORMATS:
+            raise ValueError(f"Unknown audio format {audio_format!r}.")
+        self.directory = Path(directory)
+        self.audio_suffix, self.export_kwargs = AUDIO_FORMATS[audio_format]
+        self.max_turns_per_session = max_turns_per_session
+        self.max_sessions = max_sessions
+        self.turns: queue.Queue[Turn] = queue.Queue(maxsize=max_queue_size)
+        self.num_dropped_turns = 0
+        self.session_dir: Path | None = None
+        self.num_session_turns = 0
+        self.worker = threading.Thread(
+            target=self.write_turns, name="turn-capture", daemon=True
+        )
+        self.worker.start()
+
+    def capture(
+        self,
+        speech: np.ndarray,
+        audio_start: dt.datetime,
+        transcript: str | Future[str],
+        response: str | None,
+        timings: dict[str, float],
+    ) -> None:
+        """Queue a turn for writing, without waiting for it to be written.
+
+        Args:
+            speech:
+                The recorded speech.
+            audio_start:
+                The time the recording started.
+            transcript:
+                The transcript of the speech. If it is being punctuated in the
+                background, then this is the future of the punctuated transcript, which
+                is resolved by the writer.
+            response:
+                The response to the speech, or None if there was no response.
+            timings:
+                The durations of the stages of the turn, in seconds.
+        """
+        try:
+            self.turns.put_nowait((speech, audio_start, transcript, response, timings))
+        except queue.Full:
+            self.num_dropped_turns += 1
+            logger.warning(
+                "The turn capture is falling behind, dropped the turn "
+                f"({self.num_dropped_turns:,} dropped in total)."
+            )
+
+    def write_turns(self) -> None:
+        """Write the queued turns, forever."""
+        while True:
+            speech, audio_start, transcript, response, timings = self.turns.get()
+            try:
+                if isinstance(transcript, Future):
+                    transcript = transcript.result()
+                self.write_turn(
+                    speech=speech,
+                    audio_start=audio_start,
+                    transcript=transcript,
+                    response=response,
+                    timings=timings,
+                )
+            except Exception as e:
+                logger.error(f"Could not capture the turn: {e}")
+
+    def write_turn(
+        self,
+        speech: np.ndarray,
+        audio_start: dt.datetime,
+        transcript: str,
+        response: str | None,
+        timings: dict[str, float],
+    ) -> None:
+        """Write a turn to the current session.
+
+        Args:
+            speech:
+                The recorded speech.
+            audio_start:
+                The time the recording started.
+            transcript:
+                The transcript of the speech.
+            response:
+                The response to the speech, or None if there was no response.
+            timings:
+                The durations of the stages of the turn, in seconds.
+        """
+        if (
+            self.session_dir is None
+            or self.num_session_turns >= self.max_turns_per_session
+        ):
+            self.rotate()
+        assert self.session_dir is not None
+
+        turn_id = f"{self.num_session_turns:04d}"
+        audio_path = self.session_dir / f"{turn_id}{self.audio_suffix}"
+        AudioSegment(
+            data=speech.astype(np.int16).tobytes(),
+            sample_width=2,
+            frame_rate=SAMPLE_RATE,
+            channels=1,
+        ).export(str(audio_path), **self.export_kwargs)
+        audio_path.with_suffix(".txt").write_text(transcript)
+
+        turn = CapturedTurn(
+            turn_id=turn_id,
+            audio_start=audio_start,
+            audio_path=audio_path.name,
+            transcript=transcript,
+            response=response,
+            timings=timings,
+        )
+        with (self.session_dir / "turns.jsonl").open("a", encoding="utf-8") as f:
+            f.write(turn.model_dump_json() + "\n")
+        self.num_session_turns += 1
+
+    def rotate(self) -> None:
+        """Start a new session, deleting the oldest sessions if there are too many."""
+        session_name = dt.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        self.session_dir = self.directory / session_name
+        self.session_dir.mkdir(parents=True, exist_ok=True)
+        self.num_session_turns = 0
+        logger.info(f"Capturing the turns to {self.session_dir}.")
+
+        # The session names are timestamps, so they sort chronologically
+        sessions = sorted(path for path in self.directory.iterdir() if path.is_dir())
+        for session_dir in sessions[: -self.max_sessions]:
+            shutil.rmtree(session_dir, ignore_errors=True)
+            logger.info(f"Deleted the old turn capture session {session_dir}.")
@@ -1,6 +1,9 @@
 """Utility functions for the project."""
 
-import requests
+import logging
+import socket
+import threading
+from time import monotonic
 
 WEEKDAYS = ["mandag", "tirsdag", "onsdag", "torsdag", "fredag", "lørdag", "søndag"]
 MONTHS = [
@@ -19,14 +22,135 @@ MONTHS = [
 ]
 
 
+logger = logging.getLogger(__name__)
+
+
+# The hosts of the services that the tools use, along with a public DNS server, as some
+# networks block one or the other
+PROBE_ADDRESSES = [("api.open-meteo.com", 443), ("www.dr.dk", 443), ("1.1.1.1", 53)]
+
+
+class ConnectivityMonitor:
+    """Background monitor of the internet connectivity.
+
+    The status is kept up to date by cheap periodic probes in a background thread, as
+    well as by the outcomes of real requests reported by the tools, so checking the
+    status never blocks. We are online if any of the probed addresses can be reached,
+    or if a real request has succeeded since the previous probe.
+    """
+
+    def __init__(
+        self,
+        addresses: list[tuple[str, int]] | None = None,
+        online_interval_seconds: float = 30.0,
+        offline_interval_seconds: float = 5.0,
+        timeout_seconds: float = 2.0,
+    ) -> None:
+        """Initialise the monitor.
+
+        Args:
+            addresses (optional):
+                The host and port pairs to probe. If None then `PROBE_ADDRESSES` is
+                used. Defaults to None.
+            online_interval_seconds (optional):
+                The number of seconds between probes while online. Defaults to 30.
+            offline_interval_seconds (optional):
+                The number of seconds between probes while offline. Defaults to 5.
+            timeout_seconds (optional):
+                The timeout of each probe, in seconds. Defaults to 2.
+        """
+        self.addresses = PROBE_ADDRESSES if addresses is None else addresses
+        self.online_interval_seconds = online_interval_seconds
+        self.offline_interval_seconds = offline_interval_seconds
+        self.timeout_seconds = timeout_seconds
+
+        # We assume that we are online until a probe tells us otherwise
+        self.is_online: bool = True
+        self.last_success_time = float("-inf")
+
+        self._wake_up = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def start(self) -> "ConnectivityMonitor":
+        """Start the monitor, if it is not already running."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="connectivity-monitor", daemon=True
+                )
+                self._thread.start()
+        return self
+
+    def report(self, success: bool) -> None:
+        """Report the outcome of a real request.
+
+        A successful request marks us as online until the probes have failed for a whole
+        probing interval, whereas a failed request triggers an immediate probe to
+        confirm that we are offline.
+
+        Args:
+            success:
+                Whether the request succeeded.
+        """
+        if success:
+            self.last_success_time = monotonic()
+            self.is_online = True
+        else:
+            self._wake_up.set()
+
+    def probe(self) -> bool:
+        """Probe the internet connectivity.
+
+        Returns:
+            True if any of the addresses can be reached, False otherwise.
+        """
+        for address in self.addresses:
+            try:
+                with socket.create_connection(
+                    address=address, timeout=self.timeout_seconds
+                ):
+                    return True
+            except OSError:
+                continue
+        return False
+
+    def _run(self) -> None:
+        """Probe the connectivity periodically."""
+        while True:
+            is_online = self.probe() or (
+                monotonic() - self.last_success_time < self.online_interval_seconds
+            )
+            if is_online != self.is_online:
+                status = "online" if is_online else "offline"
+                logger.info(f"The internet connection is now {status}.")
+            self.is_online = is_online
+            interval = (
+                self.online_interval_seconds
+                if is_online
+                else self.offline_interval_seconds
+            )
+            self._wake_up.wait(timeout=interval)
+            self._wake_up.clear()
+
+
+connectivity_monitor = ConnectivityMonitor()
+
+
 def is_internet_available() -> bool:
-    """Check if the internet is available.
+    """Check if the internet is available, without blocking.
 
     Returns:
         True if the internet is available, False otherwise.
     """
-    try:
-        requests.get(url="https://www.google.com", timeout=5)
-        return True
-    except requests.exceptions.RequestException:
-        return False
+    return connectivity_monitor.start().is_online
+
+
+def report_request_outcome(success: bool) -> None:
+    """Report the outcome of a request to the connectivity monitor.
+
+    Args:
+        success:
+            Whether the request succeeded.
+    """
+    connectivity_monitor.start().report(success=success)
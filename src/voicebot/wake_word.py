@@ -0,0 +1,149 @@
+"""Detection of wake words."""
+
+import logging
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+import onnxruntime as ort
+import openwakeword as oww
+from omegaconf import DictConfig
+from openwakeword.utils import download_models as download_wakeword_models
+
+from .noise_floor import NoiseFloorTracker
+
+logger = logging.getLogger(__name__)
+
+
+class WakeWordDetector:
+    """Detects any of several wake words in a stream of audio frames.
+
+    All the wake word models share a single feature extractor, and with a frame stride
+    above one the frames are buffered and the features of all of them are computed in
+    one batched pass.
+
+    With the energy gate enabled, frames which are too quiet to contain a wake word are
+    not run through the models. They are kept in a pre-roll buffer instead, which is fed
+    to the models when the gate opens, so that the feature buffers of the models are the
+    same as without the gate by the time a wake word could be spoken.
+    """
+
+    def __init__(
+        self, cfg: DictConfig, noise_floor: NoiseFloorTracker | None = None
+    ) -> None:
+        """Initialise the detector.
+
+        Args:
+            cfg:
+                Hydra configuration object. The wake word models are either names of
+                pretrained openWakeWord models, such as "hey_jarvis", or paths to custom
+                ONNX models, in which case the wake word is the file name without
+                extension.
+            noise_floor (optional):
+                A tracker of the background noise level. If given, then the energy gate
+                is relative to the noise floor, and otherwise it is a fixed RMS level.
+                Defaults to None.
+        """
+        self.frame_stride = int(cfg.wake_word_frame_stride)
+        self.default_threshold = float(cfg.wake_word_probability_threshold)
+        self.noise_floor = noise_floor
+        self.gate_enabled = bool(cfg.wake_word_gate.enabled)
+        self.gate_margin_db = float(cfg.wake_word_gate.margin_db)
+        self.gate_rms_threshold = float(cfg.wake_word_gate.rms_threshold)
+        self.gate_hangover_frames = int(
+            cfg.wake_word_gate.hangover_seconds / cfg.num_seconds_per_chunk
+        )
+        self.gate_preroll: deque[np.ndarray] = deque(
+            maxlen=max(
+                int(cfg.wake_word_gate.preroll_seconds / cfg.num_seconds_per_chunk), 1
+            )
+        )
+        self.gate_hangover_left = 0
+
+        # This usually produces logs from `onnxruntime`, so we suppress them
+        ort.set_default_logger_severity(3)
+        model_names = list(cfg.wake_word_models)
+        pretrained_model_names = [
+            model_name for model_name in model_names if not model_name.endswith(".onnx")
+        ]
+        if pretrained_model_names:
+            download_wakeword_models(model_names=pretrained_model_names)
+        # The number of threads only applies to the shared feature extractor, as the
+        # wake word classifiers always run on a single thread
+        self.model = oww.Model(
+            wakeword_models=model_names,
+            inference_framework="onnx",
+            ncpu=int(cfg.resources.wake_word.num_threads),
+        )
+
+        self.wake_words = [Path(model_name).stem for model_name in model_names]
+        self.thresholds = {
+            wake_word: float(cfg.wake_word_thresholds.get(wake_word, 0.0))
+            or self.default_threshold
+            for wake_word in self.wake_words
+        }
+        self.buffer: list[np.ndarray] = list()
+
+    def process(self, frame: np.ndarray) -> str | None:
+        """Process an audio frame.
+
+        Args:
+            frame:
+                The int16 audio frame.
+
+        Returns:
+            The detected wake word, or None if no wake word was detected.
+        """
+        if self.gate_enabled:
+            samples = frame.astype(np.float32)
+            rms = float(np.sqrt(np.mean(samples * samples)))
+            if rms >= self.gate_threshold:
+                self.gate_hangover_left = self.gate_hangover_frames
+                self.buffer.extend(self.gate_preroll)
+                self.gate_preroll.clear()
+            elif self.gate_hangover_left > 0:
+                self.gate_hangover_left -= 1
+            else:
+                self.gate_preroll.append(frame)
+                return None
+
+        self.buffer.append(frame)
+        if len(self.buffer) < self.frame_stride:
+            return None
+        probabilities = self.predict(audio=np.concatenate(self.buffer))
+        self.buffer.clear()
+        for wake_word, probability in probabilities.items():
+            if probability >= self.thresholds[wake_word]:
+                return wake_word
+        return None
+
+    def predict(self, audio: np.ndarray) -> dict[str, float]:
+        """Compute the wake word probabilities of some audio.
+
+        Args:
+            audio:
+                The int16 audio, consisting of one or more frames.
+
+        Returns:
+            A mapping from each wake word to its highest probability in the audio.
+        """
+        prediction_dict = self.model.predict(x=audio)
+        assert isinstance(prediction_dict, dict)
+        return {
+            wake_word: float(prediction_dict[wake_word])
+            for wake_word in self.wake_words
+        }
+
+    @property
+    def gate_threshold(self) -> float:
+        """The RMS level below which frames are not run through the models."""
+        if self.noise_floor is not None and self.noise_floor.noise_floor_db is not None:
+            return self.noise_floor.level(margin_db=self.gate_margin_db)
+        return self.gate_rms_threshold
+
+    def reset(self) -> None:
+        """Reset the internal state of the detector."""
+        self.model.reset()
+        self.buffer.clear()
+        self.gate_preroll.clear()
+        self.gate_hangover_left = 0
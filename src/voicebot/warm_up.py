@@ -0,0 +1,101 @@
+"""Warm-up of the models at startup."""
+
+import logging
+import statistics
+from collections.abc import Callable
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+import numpy as np
+from omegaconf import DictConfig
+from punctfix.inference import PunctFixer
+from transformers.pipelines import Pipeline
+
+from .speech_recognition import punctuate, transcribe_speech
+from .speech_recording import SAMPLE_RATE
+from .speech_synthesis import generate_speech
+
+if TYPE_CHECKING:
+    from chatterbox.mtl_tts import ChatterboxMultilingualTTS
+
+    from .ctc_decoding import BeamSearchTranscriber
+
+logger = logging.getLogger(__name__)
+
+
+WARM_UP_TEXT = "hej jarvis hvordan bliver vejret i morgen"
+
+
+def warm_up_models(
+    transcriber: "Pipeline | BeamSearchTranscriber | None",
+    punct_fixer: PunctFixer | None,
+    synthesiser: "ChatterboxMultilingualTTS | None",
+    cfg: DictConfig,
+) -> dict[str, tuple[float, float]]:
+    """Run dummy inputs through the models, so that the first turn is not slowed down.
+
+    The models, tokenisers and torch kernels are initialised lazily on their first
+    call, so this moves that cost to the startup. Each model is called once and then
+    `cfg.warm_up.num_steady_state_runs` more times, and the first-call and steady-state
+    latencies are logged.
+
+    Args:
+        transcriber:
+            The speech recognition pipeline, or a beam search transcriber wrapping it,
+            or None if it is loaded in an inference worker, in which case the speech
+            recognition is not warmed up.
+        punct_fixer:
+            The punctuation model, or None if the transcriptions are not punctuated or
+            it is loaded in an inference worker, in which case the punctuation is not
+            warmed up.
+        synthesiser:
+            The speech synthesiser, or None if the MacOS `say` command is used, in
+            which case the speech synthesis is not warmed up.
+        cfg:
+            Hydra configuration object.
+
+    Returns:
+        A mapping from each model to its first-call latency and median steady-state
+        latency, in seconds.
+    """
+    num_runs = int(cfg.warm_up.num_steady_state_runs)
+
+    # Low-level noise rather than silence, as the peak normalisation is undefined for
+    # silence
+    rng = np.random.default_rng(seed=4242)
+    dummy_speech = rng.normal(scale=300, size=2 * SAMPLE_RATE).astype(np.int16)
+
+    models: dict[str, Callable[[], object]] = dict()
+    if transcriber is not None:
+        models["speech_recognition"] = lambda: transcribe_speech(
+            speech=dummy_speech,
+            transcriber=transcriber,
+            punct_fixer=None,
+            manual_fixes=dict(),
+        )
+    if punct_fixer is not None:
+        models["punctuation"] = lambda: punctuate(
+            text=WARM_UP_TEXT, punct_fixer=punct_fixer
+        )
+
+    # Without a synthesiser the MacOS `say` command is used, which needs no warm-up
+    if synthesiser is not None:
+        models["speech_synthesis"] = lambda: generate_speech(
+            text=WARM_UP_TEXT, synthesiser=synthesiser
+        )
+
+    latencies: dict[str, tuple[float, float]] = dict()
+    for name, model in models.items():
+        logger.info(f"Warming up the {name.replace('_', ' ')} model...")
+        durations: list[float] = list()
+        for _ in range(1 + num_runs):
+            start = perf_counter()
+            model()
+            durations.append(perf_counter() - start)
+        steady_state = statistics.median(durations[1:]) if num_runs else float("nan")
+        latencies[name] = (durations[0], steady_state)
+        logger.info(
+            f"The {name.replace('_', ' ')} model took {durations[0]:.2f} seconds on "
+            f"the first call and {steady_state:.2f} seconds afterwards."
+        )
+    return latencies
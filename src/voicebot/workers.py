@@ -0,0 +1,338 @@
+"""Hosting of models in separate worker processes."""
+
+import atexit
+import itertools
+import logging
+import multiprocessing as mp
+import queue
+import threading
+from collections.abc import Callable
+from multiprocessing.process import BaseProcess
+from multiprocessing.queues import Queue as ProcessQueue
+from multiprocessing.shared_memory import SharedMemory
+from multiprocessing.synchronize import Event as ProcessEvent
+from time import sleep
+from typing import Any, Generic, TypeVar
+
+import numpy as np
+from omegaconf import DictConfig
+
+from .resources import apply_resources
+from .speech_recognition import (
+    get_device,
+    load_punct_fixer,
+    load_transcriber,
+    punctuate,
+    transcribe_speech,
+)
+from .warm_up import warm_up_models
+
+logger = logging.getLogger(__name__)
+
+
+# The largest item size of the audio, as the shared memory buffer is allocated in bytes
+MAX_AUDIO_ITEM_SIZE = np.dtype(np.float32).itemsize
+
+# The audio is not sent through the request queue, but copied to a shared memory buffer
+# which the worker reads from, so the request is only the method name, the dtype and
+# length of the audio, and any other keyword arguments
+Request = tuple[int, str, str | None, int, dict[str, Any]]
+Response = tuple[int, Any, str | None]
+
+# The type of the return values of the methods of the handler
+ResultType = TypeVar("ResultType")
+
+
+class InferenceWorker(Generic[ResultType]):
+    """A model hosted in a separate process, which is restarted if it crashes.
+
+    Running the models in a separate process means that the inference does not contend
+    with the audio recording and the text engine for the global interpreter lock. The
+    audio is passed to the worker through a shared memory buffer rather than being
+    pickled, and the requests are processed one at a time.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        load_handler: Callable[[DictConfig], Any],
+        cfg: DictConfig,
+        max_num_samples: int,
+    ) -> None:
+        """Initialise the worker.
+
+        Args:
+            name:
+                The name of the worker, used in logs.
+            load_handler:
+                A module-level function or class which loads the models in the worker
+                process, returning an object whose methods are called with the
+                requests.
+            cfg:
+                Hydra configuration object.
+            max_num_samples:
+                The maximum number of audio samples in a request.
+        """
+        self.name = name
+        self.load_handler = load_handler
+        self.cfg = cfg
+        self.request_timeout_seconds = float(cfg.inference_workers.timeout_seconds)
+        self.max_restarts = int(cfg.inference_workers.max_restarts)
+        self.context = mp.get_context(method=cfg.inference_workers.start_method)
+        self.shared_memory = SharedMemory(
+            create=True, size=max_num_samples * MAX_AUDIO_ITEM_SIZE
+        )
+        self.request_ids = itertools.count()
+        self.num_restarts = 0
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.process: BaseProcess | None = None
+        self.requests: ProcessQueue
+        self.responses: ProcessQueue
+        self.ready: ProcessEvent
+        self.supervisor: threading.Thread | None = None
+
+    def start(self) -> "InferenceWorker[ResultType]":
+        """Start the worker process and its supervisor.
+
+        Returns:
+            The worker itself.
+        """
+        self.start_process()
+        self.supervisor = threading.Thread(
+            target=self.supervise, name=f"{self.name}-supervisor", daemon=True
+        )
+        self.supervisor.start()
+        atexit.register(self.stop)
+        return self
+
+    def start_process(self) -> None:
+        """Start a new worker process, with fresh queues."""
+        self.requests = self.context.Queue()
+        self.responses = self.context.Queue()
+        self.ready = self.context.Event()
+        self.process = self.context.Process(
+            target=run_worker,
+            args=(
+                self.load_handler,
+                self.cfg,
+                self.shared_memory.name,
+                self.requests,
+                self.responses,
+                self.ready,
+            ),
+            name=f"{self.name}-worker",
+            daemon=True,
+        )
+        self.process.start()
+        logger.info(f"Started the {self.name} worker with PID {self.process.pid}.")
+
+    def supervise(self) -> None:
+        """Restart the worker process whenever it exits unexpectedly."""
+        while not self.stopping.is_set():
+            assert self.process is not None
+            self.process.join()
+            if self.stopping.is_set():
+                break
+            if self.num_restarts >= self.max_restarts:
+                logger.error(
+                    f"The {self.name} worker exited with code {self.process.exitcode} "
+                    f"and has been restarted {self.num_restarts} times, giving up."
+                )
+                break
+            self.num_restarts += 1
+            logger.error(
+                f"The {self.name} worker exited with code {self.process.exitcode}, "
+                f"restarting it (restart {self.num_restarts}/{self.max_restarts})..."
+            )
+            # Back off a bit, in case the worker crashes right away
+            sleep(min(2**self.num_restarts, 30))
+            with self.lock:
+                self.start_process()
+
+    def call(
+        self, method: str, audio: np.ndarray | None = None, **kwargs
+    ) -> ResultType:
+        """Call a method of the handler in the worker process.
+
+        Args:
+            method:
+                The name of the method to call.
+            audio (optional):
+                Audio to pass to the method as its `audio` argument, through the shared
+                memory buffer. Defaults to None.
+            **kwargs:
+                Other keyword arguments to the method, which must be picklable.
+
+        Returns:
+            The return value of the method.
+
+        Raises:
+            RuntimeError:
+                If the worker crashed, timed out or raised an error.
+        """
+        with self.lock:
+            if not self.ready.wait(timeout=self.request_timeout_seconds):
+                raise RuntimeError(f"The {self.name} worker is not ready.")
+
+            dtype: str | None = None
+            num_samples = 0
+            if audio is not None:
+                if audio.dtype.itemsize > MAX_AUDIO_ITEM_SIZE:
+                    audio = audio.astype(np.float32)
+                if audio.nbytes > self.shared_memory.size:
+                    raise ValueError(
+                        f"The audio of {audio.shape[0]:,} samples is too long for the "
+                        f"{self.name} worker."
+                    )
+                buffer = np.ndarray(
+                    shape=audio.shape, dtype=audio.dtype, buffer=self.shared_memory.buf
+                )
+                buffer[:] = audio
+                dtype, num_samples = audio.dtype.str, audio.shape[0]
+
+            request_id = next(self.request_ids)
+            self.requests.put((request_id, method, dtype, num_samples, kwargs))
+            waited_seconds = 0.0
+            while waited_seconds < self.request_timeout_seconds:
+                assert self.process is not None
+                try:
+                    response_id, result, error = self.responses.get(timeout=0.1)
+                except queue.Empty:
+                    waited_seconds += 0.1
+                    if not self.process.is_alive():
+                        raise RuntimeError(f"The {self.name} worker crashed.")
+                    continue
+
+                # Responses to earlier requests which timed out are discarded
+                if response_id != request_id:
+                    continue
+                if error is not None:
+                    raise RuntimeError(f"The {self.name} worker failed: {error}")
+                return result
+
+            raise RuntimeError(f"The {self.name} worker timed out.")
+
+    def stop(self) -> None:
+        """Stop the worker process and release the shared memory."""
+        if self.stopping.is_set():
+            return
+        self.stopping.set()
+        if self.process is not None and self.process.is_alive():
+            self.requests.put(None)
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+
+
+def run_worker(
+    load_handler: Callable[[DictConfig], Any],
+    cfg: DictConfig,
+    shared_memory_name: str,
+    requests: ProcessQueue,
+    responses: ProcessQueue,
+    ready: ProcessEvent,
+) -> None:
+    """Process requests in the worker process until told to stop.
+
+    Args:
+        load_handler:
+            The function loading the handler of the requests.
+        cfg:
+            Hydra configuration object.
+        shared_memory_name:
+            The name of the shared memory buffer containing the audio.
+        requests:
+            The queue of requests.
+        responses:
+            The queue of responses.
+        ready:
+            The event to set when the handler has been loaded.
+    """
+    logging.basicConfig(level=logging.INFO)
+    handler = load_handler(cfg)
+    shared_memory = SharedMemory(name=shared_memory_name)
+    ready.set()
+    try:
+        while True:
+            request: Request | None = requests.get()
+            if request is None:
+                break
+            request_id, method, dtype, num_samples, kwargs = request
+            if dtype is not None:
+                kwargs["audio"] = np.ndarray(
+                    shape=(num_samples,), dtype=dtype, buffer=shared_memory.buf
+                ).copy()
+            try:
+                response: Response = (
+                    request_id,
+                    getattr(handler, method)(**kwargs),
+                    None,
+                )
+            except Exception as e:
+                response = (request_id, None, f"{type(e).__name__}: {e}")
+            responses.put(response)
+    finally:
+        shared_memory.close()
+
+
+class SpeechRecognitionHandler:
+    """Transcribes and punctuates speech in a worker process."""
+
+    def __init__(self, cfg: DictConfig) -> None:
+        """Load the speech recognition and punctuation models.
+
+        Args:
+            cfg:
+                Hydra configuration object.
+        """
+        self.cfg = cfg
+        apply_resources(resources=cfg.resources.inference_worker)
+        device = get_device()
+        self.transcriber = load_transcriber(cfg=cfg, device=device)
+        self.punct_fixer = load_punct_fixer(cfg=cfg, device=device)
+        if cfg.warm_up.enabled:
+            warm_up_models(
+                transcriber=self.transcriber,
+                punct_fixer=self.punct_fixer,
+                synthesiser=None,
+                cfg=cfg,
+            )
+
+    def transcribe(self, audio: np.ndarray, punctuate: bool = True) -> str:
+        """Transcribe speech.
+
+        Args:
+            audio:
+                The speech to transcribe.
+            punctuate (optional):
+                Whether to punctuate the transcription. Defaults to True.
+
+        Returns:
+            The transcription.
+        """
+        return transcribe_speech(
+            speech=audio,
+            transcriber=self.transcriber,
+            punct_fixer=self.punct_fixer if punctuate else None,
+            manual_fixes=self.cfg.manual_fixes,
+            min_punctuation_words=self.cfg.punctuation.min_words,
+        )
+
+    def punctuate(self, text: str) -> str:
+        """Punctuate a transcription.
+
+        Args:
+            text:
+                The transcription to punctuate.
+
+        Returns:
+            The punctuated transcription.
+        """
+        return punctuate(
+            text=text,
+            punct_fixer=self.punct_fixer,
+            min_words=self.cfg.punctuation.min_words,
+        )